@@ -1,18 +1,25 @@
 """Module for converting a font file to a Lumina supported C file format"""
 
 from lfc_options import LFCOptions
-from lfc_rasterizer import LFCRasterizer
-from lfc_indexer import LFCIndexer
-from lfc_publisher import LFCPublisher
+from lfc_converter import LFCConverter
+from lfc_profiler import LFCProfiler
+from lfc_watcher import LFCWatcher
 
 if __name__ == '__main__':
     options = LFCOptions()
 
-    rasterizer = LFCRasterizer()
-    rasterizer.rasterize(options)
+    # Watching converts the font again after every change until it is interrupted
+    if options.watch:
+        LFCWatcher().watch(options)
+        raise SystemExit(0)
 
-    indexer = LFCIndexer()
-    indexer.index(rasterizer.glyphs)
+    profiler = LFCProfiler(enabled=options.stats is not None)
 
-    publisher = LFCPublisher()
-    publisher.publish(options, rasterizer.glyphs, indexer.indexing_mode, indexer.indices)
+    converter = LFCConverter(profiler)
+
+    if converter.convert(options) is None:
+        print(f'LFC::SUCCESS: Font {options.name} is up to date, skipping the conversion')
+        raise SystemExit(0)
+
+    if options.stats is not None:
+        profiler.write_report(options.stats, converter.options, len(converter.glyphs))
@@ -0,0 +1,181 @@
+"""Module for packing the glyph bitmaps of a Lumina supported font into atlas pages"""
+
+import math
+import numpy
+from lfc_glyph import pack_pixels
+
+def atlas_page_heights(glyphs, page_height=None):
+    """Function that returns the height of every atlas page the glyphs were packed into"""
+    packed_glyphs = [glyph for glyph in glyphs if glyph.duplicate_of is None and glyph.data.size]
+
+    page_count = max((glyph.atlas_page + 1 for glyph in packed_glyphs), default=1)
+
+    # Only the last page is cut to the rows in use, C does not allow empty arrays
+    last_page_height = max(
+        (glyph.atlas_y + glyph.height for glyph in packed_glyphs if glyph.atlas_page == page_count - 1),
+        default=1)
+
+    return [page_height] * (page_count - 1) + [last_page_height]
+
+
+def render_atlas_pages(glyphs, width, page_height=None):
+    """Function that draws the packed glyphs into their atlas pages and returns the packed pages"""
+    pages = [
+        numpy.zeros((height, width), numpy.uint8)
+        for height in atlas_page_heights(glyphs, page_height)
+    ]
+
+    for glyph in glyphs:
+        if glyph.duplicate_of is not None or glyph.data.size == 0:
+            continue
+
+        page = pages[glyph.atlas_page]
+        page[glyph.atlas_y : glyph.atlas_y + glyph.height,
+             glyph.atlas_x : glyph.atlas_x + glyph.width] = glyph.data
+
+    # The atlas width is a multiple of the pixels per byte, so every row starts on a byte
+    return [pack_pixels(page, glyphs[0].bpp) for page in pages]
+
+
+class LFCAtlas:
+    """Class for packing the glyph bitmaps of a Lumina supported font into atlas pages"""
+    def __init__(self, width, page_height=None):
+        self.width = width
+        self.page_height = page_height
+        self.page_heights = []
+        self.glyph_pixels = 0
+        self.atlas_bytes = 0
+        self.bitmap_bytes = 0
+
+
+    def pack(self, glyphs):
+        """Function that places every glyph bitmap in an atlas page with a skyline packer"""
+        bpp = glyphs[0].bpp
+        pixels_per_byte = 8 // bpp
+
+        # Glyphs are placed on whole byte columns, so they can be blitted without shifting pixels
+        page_columns = self.width // pixels_per_byte
+
+        # Deduplicated glyphs share the position of their original glyph
+        packed_glyphs = [glyph for glyph in glyphs if glyph.duplicate_of is None and glyph.data.size]
+
+        for glyph in packed_glyphs:
+            if math.ceil(glyph.width / pixels_per_byte) > page_columns:
+                raise ValueError(f'LFC::ERROR: Glyph {glyph.code:#x} is {glyph.width}px wide, '
+                                 f'which does not fit in an atlas {self.width}px wide')
+
+            if self.page_height is not None and glyph.height > self.page_height:
+                raise ValueError(f'LFC::ERROR: Glyph {glyph.code:#x} is {glyph.height}px high, '
+                                 f'which does not fit in an atlas page {self.page_height}px high')
+
+        page = 0
+        skyline = [(0, 0, page_columns)]
+
+        # Placing the tallest glyphs first keeps the skyline flat
+        for glyph in sorted(packed_glyphs, key=lambda glyph: (-glyph.height, -glyph.width, glyph.code)):
+            glyph_columns = math.ceil(glyph.width / pixels_per_byte)
+
+            position = self.find_position(skyline, glyph_columns, glyph.height)
+
+            # Start a new page when the glyph does not fit under the page height
+            if position is None:
+                page += 1
+                skyline = [(0, 0, page_columns)]
+                position = self.find_position(skyline, glyph_columns, glyph.height)
+
+            (column, y) = position
+
+            skyline = self.place(skyline, column, y + glyph.height, glyph_columns)
+
+            glyph.atlas_page = page
+            glyph.atlas_x = column * pixels_per_byte
+            glyph.atlas_y = y
+
+            self.glyph_pixels += glyph.width * glyph.height
+            self.bitmap_bytes += glyph.bitmap_size()
+
+        packed_glyph_codes = {glyph.code: glyph for glyph in packed_glyphs}
+
+        for glyph in glyphs:
+            if glyph.duplicate_of is not None:
+                original_glyph = packed_glyph_codes[glyph.duplicate_of]
+
+                glyph.atlas_page = original_glyph.atlas_page
+                glyph.atlas_x = original_glyph.atlas_x
+                glyph.atlas_y = original_glyph.atlas_y
+
+        self.page_heights = atlas_page_heights(glyphs, self.page_height)
+        self.atlas_bytes = page_columns * sum(self.page_heights)
+
+        print(f'LFC::INFO: Packed {len(packed_glyphs)} glyph bitmaps into {len(self.page_heights)} '
+              f'atlas pages {self.width}px wide: {self.packing_efficiency() * 100:.1f}% packing '
+              f'efficiency, {self.atlas_bytes} bytes of atlas for {self.bitmap_bytes} bytes of '
+              'glyph bitmaps')
+
+
+    def find_position(self, skyline, columns, height):
+        """Function that finds the lowest position on the skyline where a glyph fits"""
+        page_columns = sum(width for (_, _, width) in skyline)
+
+        best_position = None
+
+        for (i, (x, _, _)) in enumerate(skyline):
+            if x + columns > page_columns:
+                break
+
+            # The glyph rests on the highest segment below it
+            y = 0
+            covered_columns = 0
+
+            for (_, segment_y, segment_width) in skyline[i:]:
+                y = max(y, segment_y)
+                covered_columns += segment_width
+
+                if covered_columns >= columns:
+                    break
+
+            if self.page_height is not None and y + height > self.page_height:
+                continue
+
+            if best_position is None or (y, x) < best_position[::-1]:
+                best_position = (x, y)
+
+        return best_position
+
+
+    def place(self, skyline, x, y, columns):
+        """Function that raises the skyline under a placed glyph and returns the new skyline"""
+        segments = [(x, y, columns)]
+
+        for (segment_x, segment_y, segment_width) in skyline:
+            segment_end = segment_x + segment_width
+
+            # Keep the parts of the segment to the left and the right of the glyph
+            if segment_x < x:
+                segments.append((segment_x, segment_y, min(segment_end, x) - segment_x))
+
+            if segment_end > x + columns:
+                start = max(segment_x, x + columns)
+                segments.append((start, segment_y, segment_end - start))
+
+        segments.sort()
+
+        # Merge neighbouring segments at the same height
+        merged_segments = [segments[0]]
+
+        for (segment_x, segment_y, segment_width) in segments[1:]:
+            (last_x, last_y, last_width) = merged_segments[-1]
+
+            if segment_y == last_y:
+                merged_segments[-1] = (last_x, last_y, last_width + segment_width)
+            else:
+                merged_segments.append((segment_x, segment_y, segment_width))
+
+        return merged_segments
+
+
+    def packing_efficiency(self):
+        """Function that returns the share of the atlas pixels covered by glyph bitmaps"""
+        atlas_pixels = self.width * sum(self.page_heights)
+
+        return self.glyph_pixels / atlas_pixels if atlas_pixels else 0
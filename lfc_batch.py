@@ -0,0 +1,222 @@
+"""Module for converting a batch of fonts described in a manifest file"""
+
+import os
+import json
+import time
+import tomllib
+import argparse
+import concurrent.futures
+import freetype
+from lfc_options import LFCOptions
+from lfc_converter import LFCConverter
+
+MANIFEST_JOB_KEYS = ['name', 'bpp', 'height', 'font', 'characters']
+MANIFEST_OPTIONAL_JOB_KEYS = ['reproducible', 'deduplicate', 'compress', 'indexing',
+                              'binary', 'kerning', 'kerning_threshold', 'compact_metadata',
+                              'layout', 'atlas', 'atlas_height', 'labels', 'shards', 'max_bytes',
+                              'corpus']
+
+def convert_job_group(job_group, output_directory_name):
+    """Function that converts a group of jobs sharing the same font file in a worker process"""
+    results = []
+
+    # Open the font face once for all jobs of the group
+    face = freetype.Face(job_group[0].font)
+
+    for options in job_group:
+        start_time = time.perf_counter()
+
+        converter = LFCConverter()
+
+        try:
+            output_files = converter.convert(options, output_directory_name, face)
+
+            error = None
+            glyph_count = len(converter.glyphs)
+            output_size = sum(os.path.getsize(path) for path in output_files or ())
+
+        except Exception as exception: # pylint: disable=broad-exception-caught
+            output_files = ()
+            error = str(exception)
+            glyph_count = 0
+            output_size = 0
+
+        results.append({
+            'name': options.name,
+            'glyphs': glyph_count,
+            'seconds': time.perf_counter() - start_time,
+            'bytes': output_size,
+            'error': error,
+            'skipped': output_files is None,
+        })
+
+    return results
+
+
+class LFCBatch:
+    """Class for converting a batch of fonts described in a manifest file"""
+    def __init__(self, manifest_path):
+        self.jobs = []
+        self.results = []
+        self.elapsed_seconds = 0
+        self.output_directory_name = 'output'
+        self.load_manifest(manifest_path)
+
+
+    def load_manifest(self, manifest_path):
+        """Function that loads the conversion jobs from a JSON or TOML manifest"""
+        if manifest_path.endswith('.toml'):
+            with open(manifest_path, 'rb') as manifest_file:
+                manifest = tomllib.load(manifest_file)
+        else:
+            with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+
+        manifest_directory = os.path.dirname(os.path.abspath(manifest_path))
+
+        self.output_directory_name = manifest.get('output', self.output_directory_name)
+
+        defaults = manifest.get('defaults', {})
+
+        for job in manifest.get('jobs', []):
+            values = {**defaults, **job}
+
+            missing_keys = [key for key in MANIFEST_JOB_KEYS if key not in values]
+
+            if missing_keys:
+                raise ValueError(f'LFC::ERROR: Manifest job {values.get("name", "?")} is missing: '
+                                 f'{", ".join(missing_keys)}')
+
+            # Font, label and corpus paths are relative to the manifest file
+            values['font'] = os.path.join(manifest_directory, values['font'])
+
+            if 'labels' in values:
+                values['labels'] = os.path.join(manifest_directory, values['labels'])
+
+            if 'corpus' in values:
+                corpus = [values['corpus']] if isinstance(values['corpus'], str) else values['corpus']
+                values['corpus'] = [os.path.join(manifest_directory, path) for path in corpus]
+
+            self.jobs.append(LFCOptions(**{
+                key: values[key]
+                for key in MANIFEST_JOB_KEYS + MANIFEST_OPTIONAL_JOB_KEYS
+                if key in values
+            }))
+
+        names = [options.name for options in self.jobs]
+
+        if len(names) != len(set(names)):
+            raise ValueError('LFC::ERROR: Manifest job names must be unique')
+
+
+    def group_jobs(self, worker_count):
+        """Function that groups the jobs by font file and splits the groups to keep workers busy"""
+        groups = {}
+
+        for options in self.jobs:
+            groups.setdefault(os.path.realpath(options.font), []).append(options)
+
+        job_groups = list(groups.values())
+
+        # Split the largest group in half until every worker has a group to convert
+        while len(job_groups) < worker_count:
+            largest_group = max(job_groups, key=len)
+
+            if len(largest_group) < 2:
+                break
+
+            job_groups.remove(largest_group)
+            job_groups.append(largest_group[:len(largest_group) // 2])
+            job_groups.append(largest_group[len(largest_group) // 2:])
+
+        return job_groups
+
+
+    def run(self, worker_count=None):
+        """Function that converts all jobs of the manifest in a process pool"""
+        worker_count = worker_count or os.cpu_count() or 1
+
+        job_groups = self.group_jobs(worker_count)
+
+        print(f'LFC::INFO: Converting {len(self.jobs)} fonts from {len(job_groups)} job groups '
+              f'with {worker_count} workers')
+
+        start_time = time.perf_counter()
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=worker_count) as executor:
+            futures = [
+                executor.submit(convert_job_group, job_group, self.output_directory_name)
+                for job_group in job_groups
+            ]
+
+            for future in concurrent.futures.as_completed(futures):
+                self.results += future.result()
+
+        self.elapsed_seconds = time.perf_counter() - start_time
+
+        # Report the results in manifest order
+        order = {options.name: index for (index, options) in enumerate(self.jobs)}
+        self.results.sort(key=lambda result: order[result['name']])
+
+
+    def __str__(self):
+        name_width = max([len(result['name']) for result in self.results] + [len('Font')])
+
+        output = f'{"Font":<{name_width}}  {"Glyphs":>8}  {"Time":>9}  {"Size":>12}\n'
+
+        for result in self.results:
+            if result['error'] is not None:
+                output += f'{result["name"]:<{name_width}}  FAILED: {result["error"]}\n'
+                continue
+
+            if result['skipped']:
+                output += f'{result["name"]:<{name_width}}  up to date\n'
+                continue
+
+            output += f'{result["name"]:<{name_width}}  '
+            output += f'{result["glyphs"]:>8}  '
+            output += f'{result["seconds"]:>8.2f}s  '
+            output += f'{result["bytes"]:>10} B\n'
+
+        successful_results = [
+            result for result in self.results
+            if result['error'] is None and not result['skipped']
+        ]
+        skipped_results = [result for result in self.results if result['skipped']]
+
+        output += f'\nConverted {len(successful_results)}/{len(self.results)} fonts, '
+        output += f'{len(skipped_results)} up to date '
+        output += f'({sum(result["bytes"] for result in successful_results)} B) '
+        output += f'in {self.elapsed_seconds:.2f}s '
+        output += f'(sum of job times: {sum(result["seconds"] for result in self.results):.2f}s)\n'
+
+        return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Convert a batch of fonts described in a manifest file')
+
+    parser.add_argument(
+            'manifest',
+            type=str,
+            help='The path to a JSON or TOML manifest with a "jobs" list of conversions. '
+                 'Each job has a name, bpp, height, font, characters and optionally reproducible, '
+                 'deduplicate, compress, indexing, binary, kerning, kerning_threshold, '
+                 'compact_metadata, layout, atlas, atlas_height, labels, shards, max_bytes and corpus, '
+                 'shared values can be set in "defaults" and the output directory in "output"')
+
+    parser.add_argument(
+            '--jobs',
+            type=int,
+            default=None,
+            help='The number of worker processes. Defaults to the number of CPU cores')
+
+    arguments = parser.parse_args()
+
+    batch = LFCBatch(arguments.manifest)
+    batch.run(arguments.jobs)
+
+    print(f'\n{batch}')
+
+    if any(result['error'] is not None for result in batch.results):
+        raise SystemExit('LFC::ERROR: Some fonts failed to convert')
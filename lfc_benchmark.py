@@ -0,0 +1,417 @@
+"""Module for benchmarking the Lumina Font Converter"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import resource
+import tempfile
+import platform
+import contextlib
+import subprocess
+import concurrent.futures
+from lfc_constants import LFC_VERSION
+from lfc_options import LFCOptions
+from lfc_rasterizer import LFCRasterizer
+from lfc_compressor import LFCCompressor, decompress_bitmap
+from lfc_indexer import LFCIndexer, INDEXER_MAX_DENSE_GLYPHS
+from lfc_indexing_mode import IndexingMode
+from lfc_publisher import LFCPublisher
+from lfc_converter import LFCConverter
+from lfc_metadata import LFCMetadataPacker, metadata_fields, metadata_records, unpack_metadata_record
+from lfc_corpus import corpus_files, read_corpus_file
+from lfc_emulator import LFCEmulator
+
+# Fonts that are commonly available offline, the first one found is used by default
+BENCHMARK_FONTS = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/local/share/fonts/DejaVuSans.ttf',
+    '/Library/Fonts/DejaVuSans.ttf',
+]
+
+# Representative conversions measured by the stage benchmark
+BENCHMARK_WORKLOADS = {
+    'ascii_8px': {'bpp': 1, 'height': 8, 'characters': '32-126'},
+    'latin1_32px_8bpp': {'bpp': 8, 'height': 32, 'characters': '32-126,160-255'},
+    'bmp_16px_4bpp': {'bpp': 4, 'height': 16, 'characters': '0x20-0x7e,0xa0-0x17ff'},
+}
+
+BENCHMARK_STAGES = ['expand_characters', 'rasterize', 'index', 'publish', 'end_to_end']
+
+# Indexing modes emulated by the lookup benchmark, None is the default ASCII or UNICODE mode
+BENCHMARK_INDEXING_MODES = [None, 'dense', 'segmented', 'sorted']
+
+def benchmark_compression(options):
+    """Function that measures the compression ratio and the decoding cost of the glyph bitmaps"""
+    rasterizer = LFCRasterizer()
+    rasterizer.rasterize(options)
+
+    compressor = LFCCompressor()
+    compressor.compress(rasterizer.glyphs)
+
+    compressed_glyphs = [glyph for glyph in rasterizer.glyphs if glyph.compressed_bitmap is not None]
+
+    decode_seconds = 0
+    decoded_pixels = 0
+
+    # Round-trip every compressed glyph through the reference decoder
+    for glyph in compressed_glyphs:
+        pixels = glyph.data.ravel().tolist()
+
+        start_time = time.perf_counter()
+        decoded = decompress_bitmap(glyph.compressed_bitmap, glyph.bpp, len(pixels))
+        decode_seconds += time.perf_counter() - start_time
+
+        if decoded != pixels:
+            raise ValueError(f'LFC::ERROR: Compressed glyph {glyph.code:#x} does not round-trip')
+
+        decoded_pixels += len(pixels)
+
+    output = f'Glyphs: {len(rasterizer.glyphs)}, compressed: {len(compressed_glyphs)}\n'
+    output += f'Bitmap size: {compressor.uncompressed_size} -> {compressor.compressed_size} bytes '
+    output += f'({compressor.compression_ratio():.2f}x)\n'
+
+    if compressed_glyphs:
+        output += f'Reference decoder: {decode_seconds / len(compressed_glyphs) * 1e6:.1f} us per glyph, '
+        output += f'{decode_seconds / decoded_pixels * 1e9:.1f} ns per pixel\n'
+
+    return output
+
+
+def benchmark_metadata(options):
+    """Function that measures the size and the decoding cost of the compact glyph metadata"""
+    converter = LFCConverter()
+    converter.prepare(options)
+
+    packer = LFCMetadataPacker()
+    metadata = packer.pack(converter.glyphs, options.compress)
+
+    records = metadata_records(converter.glyphs, metadata_fields(options.compress))
+
+    start_time = time.perf_counter()
+
+    # Round-trip every record through the reference decoder
+    for (index, record) in enumerate(records):
+        if unpack_metadata_record(metadata, index, packer.layout, packer.record_size) != record:
+            raise ValueError(f'LFC::ERROR: Metadata record {index} does not round-trip')
+
+    decode_seconds = time.perf_counter() - start_time
+
+    output = f'Glyphs: {len(converter.glyphs)}, record size: {packer.record_size} bytes\n'
+    output += f'Metadata size: {packer.fixed_size} -> {packer.compact_size} bytes '
+    output += f'({packer.fixed_size / packer.compact_size:.2f}x)\n'
+    output += f'Reference decoder: {decode_seconds / len(records) * 1e6:.1f} us per record\n'
+
+    return output
+
+
+def benchmark_lookup(options, corpus_paths):
+    """Function that emulates the glyph lookups and unpacking of a text workload in every indexing mode"""
+    strings = [
+        text
+        for (path, corpus_format) in corpus_files(corpus_paths)
+        for text in read_corpus_file(path, corpus_format)
+    ]
+
+    converter = LFCConverter()
+    converter.prepare(options)
+
+    output = f'Glyphs: {len(converter.glyphs)}, workload: {sum(len(text) for text in strings)} characters\n'
+    output += 'Averages per drawn glyph:\n'
+    output += f'{"mode":<9}  {"lookup table":>12}  {"text bytes":>10}  {"lookup steps":>12}  '
+    output += f'{"reads":>8}  {"bytes read":>10}  {"steps":>8}  {"missing":>8}\n'
+
+    indexing_modes = set()
+
+    for indexing in BENCHMARK_INDEXING_MODES:
+        indexer = LFCIndexer()
+
+        # The progress output of the indexer and the metadata packer would repeat for every mode
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                indexer.index(converter.glyphs, indexing)
+            except ValueError:
+                continue
+
+            # UNICODE strings hold single byte glyph indices, so larger fonts can not be drawn
+            if indexer.indexing_mode in indexing_modes or (
+                    indexer.indexing_mode == IndexingMode.UNICODE and
+                    len(converter.glyphs) > INDEXER_MAX_DENSE_GLYPHS):
+                continue
+
+            indexing_modes.add(indexer.indexing_mode)
+
+            emulator = LFCEmulator(options, converter.glyphs, indexer.indexing_mode, indexer.indices)
+            emulator.emulate(strings)
+
+        output += f'{str(indexer.indexing_mode):<9}  '
+        output += f'{indexer.table_size():>12}  '
+        output += f'{emulator.per_glyph("text_bytes"):>10.2f}  '
+        output += f'{emulator.per_glyph("lookup_steps"):>12.2f}  '
+        output += f'{emulator.reads():>8.2f}  '
+        output += f'{emulator.bytes_read():>10.2f}  '
+        output += f'{emulator.steps():>8.2f}  '
+        output += f'{emulator.missing_count:>8}\n'
+
+    return output
+
+
+def peak_rss_kib():
+    """Function that returns the peak resident set size of the process in KiB"""
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS reports the peak resident set size in bytes instead of KiB
+    return peak_rss // 1024 if sys.platform == 'darwin' else peak_rss
+
+
+def measure_stage(stage, repeat, output_directory=None):
+    """Function that runs a stage repeatedly and returns its fastest wall time and last result"""
+    seconds = []
+
+    for _ in range(repeat):
+        # Files with unchanged content are not written again, so every repeat starts without them
+        if output_directory is not None:
+            shutil.rmtree(output_directory)
+            os.makedirs(output_directory)
+
+        start_time = time.perf_counter()
+        result = stage()
+        seconds.append(time.perf_counter() - start_time)
+
+    return {'seconds': min(seconds)}, result
+
+
+def benchmark_workload(font, workload, repeat):
+    """Function that measures every stage of a workload, run in a fresh process for its peak RSS"""
+    values = {'name': 'benchmark', 'font': font, **workload}
+    stages = {}
+
+    # Keep the progress output of the stages out of the report
+    with tempfile.TemporaryDirectory() as output_directory, \
+            contextlib.redirect_stdout(io.StringIO()):
+        options = LFCOptions(**values)
+
+        stages['expand_characters'], _ = measure_stage(
+                lambda: options.expand_characters(workload['characters']), repeat)
+
+        def rasterize():
+            rasterizer = LFCRasterizer()
+            rasterizer.rasterize(options)
+            return rasterizer.glyphs
+
+        stages['rasterize'], glyphs = measure_stage(rasterize, repeat)
+
+        def index():
+            indexer = LFCIndexer()
+            indexer.index(glyphs)
+            return indexer
+
+        stages['index'], indexer = measure_stage(index, repeat)
+
+        stages['publish'], output_files = measure_stage(
+                lambda: LFCPublisher().publish(
+                        options, glyphs, indexer.indexing_mode, indexer.indices, output_directory),
+                repeat,
+                output_directory)
+
+        output_size = sum(os.path.getsize(path) for path in output_files)
+
+        stages['end_to_end'], _ = measure_stage(
+                lambda: LFCConverter().convert(LFCOptions(**values), output_directory),
+                repeat,
+                output_directory)
+
+    # The peak RSS of a process only grows, so it is reported for the whole workload
+    return {
+        **workload,
+        'glyphs': len(glyphs),
+        'output_bytes': output_size,
+        'peak_rss_kib': peak_rss_kib(),
+        'stages': stages,
+    }
+
+
+def current_commit():
+    """Function that returns the git commit of the converter, if it is a git checkout"""
+    try:
+        return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                cwd=os.path.dirname(os.path.realpath(__file__)),
+                capture_output=True,
+                text=True,
+                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_stages(font, workload_names, repeat):
+    """Function that measures the conversion stages of every workload"""
+    report = {
+        'version': LFC_VERSION,
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'font': font,
+        'repeat': repeat,
+        'workloads': {},
+    }
+
+    for name in workload_names:
+        # Every workload gets a fresh process, so the peak RSS only covers that workload
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+            report['workloads'][name] = executor.submit(
+                    benchmark_workload, font, BENCHMARK_WORKLOADS[name], repeat).result()
+
+    return report
+
+
+def format_stages_report(report, baseline=None):
+    """Function that formats a stage benchmark report, compared to a baseline report if given"""
+    output = ''
+
+    for (name, workload) in report['workloads'].items():
+        output += f'{name}: {workload["glyphs"]} glyphs, {workload["output_bytes"]} bytes of output, '
+        output += f'{workload["peak_rss_kib"]} KiB peak RSS\n'
+
+        for stage in BENCHMARK_STAGES:
+            result = workload['stages'][stage]
+
+            output += f'  {stage:<18} {result["seconds"] * 1000:>10.2f} ms'
+
+            # Compare against the same stage of the baseline report
+            if baseline is not None and name in baseline['workloads']:
+                baseline_seconds = baseline['workloads'][name]['stages'][stage]['seconds']
+                output += f'  {baseline_seconds * 1000:>10.2f} ms before'
+                output += f' ({result["seconds"] / baseline_seconds:.2f}x)' if baseline_seconds else ''
+
+            output += '\n'
+
+    return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Benchmark the Lumina Font Converter')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    compression_parser = subparsers.add_parser(
+            'compression',
+            help='Measure the compression ratio and the decoding cost of the glyph bitmaps')
+
+    compression_parser.add_argument('--bpp', type=int, default=4)
+    compression_parser.add_argument('--height', type=int, default=24)
+    compression_parser.add_argument('--font', type=str, required=True)
+    compression_parser.add_argument('--characters', type=str, default='32-126')
+
+    metadata_parser = subparsers.add_parser(
+            'metadata',
+            help='Measure the size and the decoding cost of the compact glyph metadata')
+
+    metadata_parser.add_argument('--bpp', type=int, default=4)
+    metadata_parser.add_argument('--height', type=int, default=24)
+    metadata_parser.add_argument('--font', type=str, required=True)
+    metadata_parser.add_argument('--characters', type=str, default='32-126')
+    metadata_parser.add_argument('--compress', action='store_true')
+
+    lookup_parser = subparsers.add_parser(
+            'lookup',
+            help='Emulate the glyph lookups and unpacking of a text workload in every indexing mode')
+
+    lookup_parser.add_argument('--bpp', type=int, default=4)
+    lookup_parser.add_argument('--height', type=int, default=24)
+    lookup_parser.add_argument('--font', type=str, required=True)
+    lookup_parser.add_argument('--characters', type=str, default='32-126')
+    lookup_parser.add_argument('--compress', action='store_true')
+    lookup_parser.add_argument('--compact-metadata', action='store_true')
+    lookup_parser.add_argument('--kerning', action='store_true')
+    lookup_parser.add_argument('--layout', type=str, default='rows', choices=['rows', 'columns'])
+    lookup_parser.add_argument('--atlas', type=int, default=None)
+    lookup_parser.add_argument('--shards', type=int, default=None)
+    lookup_parser.add_argument(
+            '--corpus',
+            type=str,
+            nargs='+',
+            required=True,
+            help='Files or directories with the strings to draw, read like the --corpus of a conversion')
+
+    stages_parser = subparsers.add_parser(
+            'stages',
+            help='Measure the wall time of every conversion stage and the peak RSS and output size')
+
+    stages_parser.add_argument(
+            '--font',
+            type=str,
+            default=next((font for font in BENCHMARK_FONTS if os.path.isfile(font)), None),
+            help='The font to convert. Defaults to DejaVu Sans if it is installed')
+    stages_parser.add_argument(
+            '--workloads',
+            type=str,
+            nargs='+',
+            choices=list(BENCHMARK_WORKLOADS),
+            default=list(BENCHMARK_WORKLOADS))
+    stages_parser.add_argument('--repeat', type=int, default=3)
+    stages_parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='A JSON file to write the results to')
+    stages_parser.add_argument(
+            '--compare',
+            type=str,
+            default=None,
+            help='A JSON file with results of an earlier run to compare against')
+
+    arguments = parser.parse_args()
+
+    if arguments.benchmark == 'compression':
+        print(benchmark_compression(LFCOptions(
+            bpp=arguments.bpp,
+            name='benchmark',
+            height=arguments.height,
+            font=arguments.font,
+            characters=arguments.characters)))
+
+    elif arguments.benchmark == 'metadata':
+        print(benchmark_metadata(LFCOptions(
+            bpp=arguments.bpp,
+            name='benchmark',
+            height=arguments.height,
+            font=arguments.font,
+            characters=arguments.characters,
+            compress=arguments.compress)))
+
+    elif arguments.benchmark == 'lookup':
+        print(benchmark_lookup(LFCOptions(
+            bpp=arguments.bpp,
+            name='benchmark',
+            height=arguments.height,
+            font=arguments.font,
+            characters=arguments.characters,
+            compress=arguments.compress,
+            kerning=arguments.kerning,
+            compact_metadata=arguments.compact_metadata,
+            layout=arguments.layout,
+            atlas=arguments.atlas,
+            shards=arguments.shards), arguments.corpus))
+
+    elif arguments.benchmark == 'stages':
+        if arguments.font is None:
+            raise SystemExit('LFC::ERROR: No benchmark font found, use --font')
+
+        stages_report = benchmark_stages(arguments.font, arguments.workloads, arguments.repeat)
+
+        baseline_report = None
+
+        if arguments.compare is not None:
+            with open(arguments.compare, 'r', encoding='utf-8') as baseline_file:
+                baseline_report = json.load(baseline_file)
+
+        print(format_stages_report(stages_report, baseline_report))
+
+        if arguments.output is not None:
+            with open(arguments.output, 'w', encoding='utf-8') as report_file:
+                json.dump(stages_report, report_file, indent=4)
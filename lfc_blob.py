@@ -0,0 +1,345 @@
+"""Module for reading the memory-mappable binary font blob of a Lumina supported font"""
+
+import os
+import mmap
+import struct
+import argparse
+import numpy
+from lfc_glyph import LFCGlyph
+from lfc_indexing_mode import IndexingMode
+from lfc_compressor import decompress_bitmap
+
+BLOB_MAGIC = b'LFCF'
+BLOB_FORMAT_VERSION = 3
+
+# Every section starts at a multiple of the alignment, so it can be used in place when mapped
+BLOB_ALIGNMENT = 8
+
+# Blob header: magic, format version, header size, bpp, indexing mode, flags, glyph count,
+# first valid index, last valid index, lookup entry count, kerning pair count, metadata offset,
+# lookup offset, kerning offset, bitmap offset, bitmap size and file size
+BLOB_HEADER = struct.Struct('<4sHHBBHIIIIIIIIIII')
+
+# Blob header flags
+BLOB_FLAG_COMPRESSED = 1 << 0
+BLOB_FLAG_COLUMN_PAGES = 1 << 1
+
+# Glyph metadata record: code, width, height, advance, y_offset, bitmap index and flags
+BLOB_GLYPH_METADATA = struct.Struct('<IHHhhIB3x')
+
+# Glyph metadata flags
+BLOB_GLYPH_FLAG_COMPRESSED = 1 << 0
+
+# Kerning pair: left glyph index, right glyph index and signed 16-bit adjustment, sorted by glyph indices
+BLOB_KERNING_PAIR = struct.Struct('<HHh')
+
+# Lookup section entries of each indexing mode
+BLOB_LOOKUP_ENTRIES = {
+    IndexingMode.ASCII: struct.Struct('<H'),
+    IndexingMode.UNICODE: struct.Struct('<H'),
+    IndexingMode.DENSE: struct.Struct('<H'),
+    IndexingMode.SEGMENTED: struct.Struct('<IHH'),
+    IndexingMode.SORTED: struct.Struct('<I'),
+}
+
+def align(offset):
+    """Function that rounds an offset up to the blob alignment"""
+    return -(-offset // BLOB_ALIGNMENT) * BLOB_ALIGNMENT
+
+
+class LFCBlobReader:
+    """Class for reading the memory-mappable binary font blob of a Lumina supported font"""
+    def __init__(self, path):
+        self.path = path
+        self.glyphs = {}
+        self.unicode_indices = None
+
+        with open(path, 'rb') as blob_file:
+            self.blob = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.read_header()
+
+
+    def read_header(self):
+        """Function that reads the blob header and checks that the sections lie inside the blob"""
+        if len(self.blob) < BLOB_HEADER.size:
+            raise ValueError(f'LFC::ERROR: {self.path} is too small to be a font blob')
+
+        (magic, version, header_size, self.bpp, indexing_mode, self.flags, self.glyph_count,
+         self.first_valid_index, self.last_valid_index, self.lookup_count, self.kerning_count,
+         self.metadata_offset, self.lookup_offset, self.kerning_offset, self.bitmap_offset,
+         self.bitmap_size, file_size) = \
+            BLOB_HEADER.unpack_from(self.blob)
+
+        if magic != BLOB_MAGIC:
+            raise ValueError(f'LFC::ERROR: {self.path} is not a font blob')
+
+        if version != BLOB_FORMAT_VERSION or header_size != BLOB_HEADER.size:
+            raise ValueError(f'LFC::ERROR: Unsupported font blob version: {version}')
+
+        if file_size != len(self.blob):
+            raise ValueError(f'LFC::ERROR: {self.path} is truncated')
+
+        self.indexing_mode = IndexingMode(indexing_mode)
+        self.lookup_entry = BLOB_LOOKUP_ENTRIES[self.indexing_mode]
+
+        sections = [
+            (self.metadata_offset, self.glyph_count * BLOB_GLYPH_METADATA.size),
+            (self.lookup_offset, self.lookup_count * self.lookup_entry.size),
+            (self.kerning_offset, self.kerning_count * BLOB_KERNING_PAIR.size),
+            (self.bitmap_offset, self.bitmap_size),
+        ]
+
+        for (offset, size) in sections:
+            if offset % BLOB_ALIGNMENT != 0 or offset < header_size or offset + size > file_size:
+                raise ValueError(f'LFC::ERROR: {self.path} has a corrupted section table')
+
+
+    def metadata(self, index):
+        """Function that returns the metadata record of a glyph index"""
+        return BLOB_GLYPH_METADATA.unpack_from(
+                self.blob, self.metadata_offset + index * BLOB_GLYPH_METADATA.size)
+
+
+    def lookup_entry_at(self, position):
+        """Function that returns an entry of the lookup section"""
+        return self.lookup_entry.unpack_from(
+                self.blob, self.lookup_offset + position * self.lookup_entry.size)
+
+
+    def glyph_index(self, code):
+        """Function that finds the glyph index of a character code, 0 if the font lacks it"""
+        match self.indexing_mode:
+            case IndexingMode.ASCII | IndexingMode.DENSE:
+                if not self.first_valid_index <= code <= self.last_valid_index:
+                    return 0
+
+                return self.lookup_entry_at(code - self.first_valid_index)[0]
+
+            case IndexingMode.UNICODE:
+                # Glyphs are referenced by their index, so the codes come from the metadata
+                if self.unicode_indices is None:
+                    self.unicode_indices = {
+                        self.metadata(index)[0]: index for index in range(1, self.glyph_count)
+                    }
+
+                return self.unicode_indices.get(code, 0)
+
+            case IndexingMode.SEGMENTED:
+                position = self.search(lambda position: self.lookup_entry_at(position)[0], code)
+
+                if position < 0:
+                    return 0
+
+                (first_code, count, first_index) = self.lookup_entry_at(position)
+
+                return first_index + code - first_code if code < first_code + count else 0
+
+            case IndexingMode.SORTED:
+                position = self.search(lambda position: self.lookup_entry_at(position)[0], code)
+
+                if position < 0 or self.lookup_entry_at(position)[0] != code:
+                    return 0
+
+                return position + 1
+
+
+    def kerning_pair(self, position):
+        """Function that returns an entry of the kerning section"""
+        return BLOB_KERNING_PAIR.unpack_from(
+                self.blob, self.kerning_offset + position * BLOB_KERNING_PAIR.size)
+
+
+    def kerning(self, left_code, right_code):
+        """Function that returns the kerning in pixels between two characters"""
+        left = self.glyph_index(left_code)
+        right = self.glyph_index(right_code)
+
+        low = 0
+        high = self.kerning_count
+
+        # Binary search over the pairs sorted by their glyph indices
+        while low < high:
+            middle = (low + high) // 2
+            (pair_left, pair_right, adjustment) = self.kerning_pair(middle)
+
+            if (pair_left, pair_right) == (left, right):
+                return adjustment
+
+            if (pair_left, pair_right) < (left, right):
+                low = middle + 1
+            else:
+                high = middle
+
+        return 0
+
+
+    def search(self, key_at, code):
+        """Function that finds the last lookup entry with a key not above the code, -1 if none"""
+        low = 0
+        high = self.lookup_count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if key_at(middle) <= code:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low - 1
+
+
+    def glyph(self, code):
+        """Function that decodes the glyph of a character code, None if the font lacks it"""
+        if code in self.glyphs:
+            return self.glyphs[code]
+
+        index = self.glyph_index(code)
+
+        if index == 0:
+            return None
+
+        (_, width, height, advance, y_offset, bitmap_index, flags) = self.metadata(index)
+
+        pixel_count = width * height
+        bitmap_start = self.bitmap_offset + bitmap_index
+        bitmap = memoryview(self.blob)[bitmap_start : self.bitmap_offset + self.bitmap_size]
+
+        if flags & BLOB_GLYPH_FLAG_COMPRESSED:
+            data = decompress_bitmap(bitmap, self.bpp, pixel_count)
+        elif self.flags & BLOB_FLAG_COLUMN_PAGES:
+            data = self.unpack_column_pages(bitmap, width, height)
+        else:
+            data = self.unpack_pixels(bitmap, pixel_count)
+
+        bitmap.release()
+
+        glyph = LFCGlyph(self.bpp, code, width, height, advance, y_offset, bitmap_index, data)
+        glyph.column_pages = bool(self.flags & BLOB_FLAG_COLUMN_PAGES)
+
+        self.glyphs[code] = glyph
+
+        return glyph
+
+
+    def unpack_pixels(self, bitmap, pixel_count):
+        """Function that unpacks pixels stored most significant pixel first"""
+        bit_count = pixel_count * self.bpp
+
+        if bit_count == 0:
+            return []
+
+        packed_data = numpy.frombuffer(bitmap, numpy.uint8, -(-bit_count // 8))
+        bits = numpy.unpackbits(packed_data)
+
+        # A trailing partial byte holds its bits in the least significant positions
+        if bit_count % 8 != 0:
+            bits = numpy.concatenate((bits[:len(bits) - 8], bits[len(bits) - bit_count % 8:]))
+
+        weights = 1 << numpy.arange(self.bpp - 1, -1, -1)
+
+        return (bits.reshape(pixel_count, self.bpp) * weights).sum(axis=1).astype(numpy.uint8)
+
+
+    def unpack_column_pages(self, bitmap, width, height):
+        """Function that unpacks 1 bpp pixels stored as columns of 8 rows, top pixel first"""
+        page_count = -(-height // 8)
+
+        pages = numpy.frombuffer(bitmap, numpy.uint8, page_count * width).reshape(page_count, width, 1)
+        bits = numpy.unpackbits(pages, axis=2, bitorder='little')
+
+        return bits.transpose(0, 2, 1).reshape(page_count * 8, width)[:height]
+
+
+    def codes(self):
+        """Function that returns the character codes of every glyph in the blob"""
+        return [self.metadata(index)[0] for index in range(1, self.glyph_count)]
+
+
+    def validate(self):
+        """Function that checks that every character code resolves to a decodable glyph"""
+        for code in self.codes():
+            index = self.glyph_index(code)
+
+            if index == 0 or self.metadata(index)[0] != code:
+                raise ValueError(f'LFC::ERROR: Code 0x{code:x} does not resolve to its glyph')
+
+            (_, width, height, _, _, bitmap_index, flags) = self.metadata(index)
+
+            # Packed bitmaps have a known size, compressed ones are checked by decoding them
+            if not flags & BLOB_GLYPH_FLAG_COMPRESSED and \
+                    bitmap_index + -(-width * height * self.bpp // 8) > self.bitmap_size:
+                raise ValueError(f'LFC::ERROR: The bitmap of code 0x{code:x} is out of bounds')
+
+            try:
+                self.glyph(code)
+            except IndexError as exception:
+                raise ValueError(f'LFC::ERROR: The bitmap of code 0x{code:x} is out of bounds') \
+                    from exception
+
+        pairs = [self.kerning_pair(position) for position in range(self.kerning_count)]
+
+        if pairs != sorted(pairs) or \
+                any(not 0 < index < self.glyph_count for pair in pairs for index in pair[:2]):
+            raise ValueError('LFC::ERROR: The kerning pairs are not sorted glyph index pairs')
+
+
+    def close(self):
+        """Function that unmaps the blob"""
+        self.glyphs.clear()
+        self.blob.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+    def __str__(self):
+        output = ''
+
+        output += f'file: {os.path.basename(self.path)} ({len(self.blob)} bytes)\n'
+        output += f'bpp: {self.bpp}\n'
+        output += f'indexing mode: {self.indexing_mode}\n'
+        output += f'glyphs: {self.glyph_count - 1}\n'
+        output += f'valid indices: {self.first_valid_index}-{self.last_valid_index}\n'
+        output += f'compressed: {bool(self.flags & BLOB_FLAG_COMPRESSED)}\n'
+        output += f'column pages: {bool(self.flags & BLOB_FLAG_COLUMN_PAGES)}\n'
+        output += f'metadata: {self.glyph_count * BLOB_GLYPH_METADATA.size} bytes '
+        output += f'at {self.metadata_offset}\n'
+        output += f'lookup: {self.lookup_count * self.lookup_entry.size} bytes at {self.lookup_offset}\n'
+        output += f'kerning: {self.kerning_count} pairs, {self.kerning_count * BLOB_KERNING_PAIR.size} '
+        output += f'bytes at {self.kerning_offset}\n'
+        output += f'bitmap: {self.bitmap_size} bytes at {self.bitmap_offset}\n'
+
+        return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Inspect and validate a Lumina font blob')
+
+    parser.add_argument('blob', type=str, help='The path to a font blob written with --binary')
+
+    parser.add_argument(
+            '--show',
+            type=str,
+            default=None,
+            help='A character code to print as ASCII art. E.g. 65 or 0x41')
+
+    arguments = parser.parse_args()
+
+    with LFCBlobReader(arguments.blob) as reader:
+        print(reader)
+
+        reader.validate()
+        print(f'LFC::SUCCESS: All {reader.glyph_count - 1} glyphs resolve and decode')
+
+        if arguments.show is not None:
+            code = int(arguments.show, 16 if arguments.show.startswith('0x') else 10)
+            glyph = reader.glyph(code)
+
+            print(f'\n{glyph}' if glyph is not None else f'LFC::ERROR: No glyph for {arguments.show}')
@@ -0,0 +1,137 @@
+"""Module for choosing the font encoding that fits a flash budget"""
+
+import io
+import contextlib
+from lfc_constants import LFC_KERNING_PAIR_SIZE
+from lfc_glyph import calculate_bitmap_indices
+from lfc_compressor import LFCCompressor
+from lfc_deduplicator import LFCDeduplicator
+from lfc_indexer import LFCIndexer
+from lfc_metadata import metadata_fields, metadata_records, choose_field_layout, fixed_record_size
+
+# Glyph encodings of every bpp, from the cheapest to the most expensive to decode
+BUDGET_ENCODINGS = [
+    {'compress': False, 'compact_metadata': False},
+    {'compress': False, 'compact_metadata': True},
+    {'compress': True, 'compact_metadata': False},
+    {'compress': True, 'compact_metadata': True},
+]
+
+class LFCBudget:
+    """Class for choosing the font encoding that fits a flash budget"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.candidates = []
+        self.choice = None
+
+
+    def fit(self, glyphs, options):
+        """Function that sizes every encoding of untrimmed 8 bpp glyphs and chooses the best fit"""
+        # Encodings requested on the command line are kept in every candidate
+        encodings = [
+            encoding for encoding in BUDGET_ENCODINGS
+            if encoding['compress'] >= options.compress and
+               encoding['compact_metadata'] >= options.compact_metadata
+        ]
+
+        # The progress output of the stages would repeat for every candidate
+        with contextlib.redirect_stdout(io.StringIO()):
+            indexer = LFCIndexer()
+            indexer.index(glyphs, options.indexing)
+
+            # The lookup and kerning tables are the same for every bpp and encoding
+            lookup_size = indexer.table_size()
+            kerning_size = sum(len(glyph.kerning) for glyph in glyphs) * LFC_KERNING_PAIR_SIZE
+
+            # Higher bpp first, so the first candidate that fits has the best quality
+            for bpp in (8, 4, 2, 1):
+                if bpp > options.bpp:
+                    continue
+
+                for compress in sorted({encoding['compress'] for encoding in encodings}):
+                    quantized_glyphs = self.quantize(glyphs, bpp, compress, options.deduplicate)
+
+                    bitmap_size = sum(
+                        glyph.bitmap_size() for glyph in quantized_glyphs if glyph.duplicate_of is None)
+
+                    fields = metadata_fields(compress)
+                    records = metadata_records(quantized_glyphs, fields)
+
+                    for encoding in encodings:
+                        if encoding['compress'] != compress:
+                            continue
+
+                        if encoding['compact_metadata']:
+                            (_, record_size) = choose_field_layout(records, fields)
+                        else:
+                            record_size = fixed_record_size(fields)
+
+                        candidate = {
+                            'bpp': bpp,
+                            **encoding,
+                            'bitmap': bitmap_size,
+                            'metadata': record_size * len(records),
+                            'lookup': lookup_size,
+                            'kerning': kerning_size,
+                        }
+
+                        candidate['total'] = \
+                            bitmap_size + candidate['metadata'] + lookup_size + kerning_size
+
+                        self.candidates.append(candidate)
+
+        self.choice = next(
+            (candidate for candidate in self.candidates if candidate['total'] <= self.max_bytes),
+            None)
+
+        print(f'LFC::INFO: Font sizes for a budget of {self.max_bytes} bytes:\n{self}')
+
+        if self.choice is None:
+            raise ValueError(f'LFC::ERROR: No encoding fits in {self.max_bytes} bytes, the smallest '
+                             f'takes {min(candidate["total"] for candidate in self.candidates)} bytes')
+
+        print(f'LFC::INFO: Chose {self.choice["bpp"]} bpp'
+              f'{", compressed" if self.choice["compress"] else ""}'
+              f'{", compact metadata" if self.choice["compact_metadata"] else ""}: '
+              f'{self.choice["total"]} of {self.max_bytes} bytes')
+
+        return self.choice
+
+
+    def quantize(self, glyphs, bpp, compress, deduplicate):
+        """Function that returns the glyphs as they would be stored at a bpp and encoding"""
+        quantized_glyphs = [glyph.requantize(bpp) for glyph in glyphs]
+
+        calculate_bitmap_indices(quantized_glyphs)
+
+        if compress:
+            LFCCompressor().compress(quantized_glyphs)
+
+        if deduplicate:
+            LFCDeduplicator().deduplicate(quantized_glyphs)
+
+        return quantized_glyphs
+
+
+    def __str__(self):
+        output = f'{"bpp":>3}  {"compressed":>10}  {"compact metadata":>16}  {"bitmap":>8}  '
+        output += f'{"metadata":>8}  {"lookup":>8}  {"kerning":>8}  {"total":>8}\n'
+
+        for candidate in self.candidates:
+            output += f'{candidate["bpp"]:>3}  '
+            output += f'{"yes" if candidate["compress"] else "no":>10}  '
+            output += f'{"yes" if candidate["compact_metadata"] else "no":>16}  '
+            output += f'{candidate["bitmap"]:>8}  '
+            output += f'{candidate["metadata"]:>8}  '
+            output += f'{candidate["lookup"]:>8}  '
+            output += f'{candidate["kerning"]:>8}  '
+            output += f'{candidate["total"]:>8}'
+
+            if candidate is self.choice:
+                output += '  <- chosen'
+            elif candidate['total'] > self.max_bytes:
+                output += '  over budget'
+
+            output += '\n'
+
+        return output
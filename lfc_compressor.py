@@ -0,0 +1,144 @@
+"""Module for compressing glyph bitmaps in a Lumina supported font"""
+
+import math
+import numpy
+from lfc_glyph import calculate_bitmap_indices
+
+# A compressed bitmap is a sequence of tokens, each covering up to 64 pixels. Every token starts
+# with a byte holding the operation in its top two bits and the pixel count minus one in its low
+# six bits. Zero and full runs have no payload, a literal is followed by its pixels packed at bpp
+# bits per pixel and padded to a whole byte and a repeat is followed by the repeated value.
+COMPRESSION_ZERO_RUN = 0
+COMPRESSION_FULL_RUN = 1
+COMPRESSION_LITERAL = 2
+COMPRESSION_REPEAT = 3
+
+COMPRESSION_MAX_TOKEN_PIXELS = 64
+
+def compress_pixels(pixels, bpp):
+    """Function that run-length encodes a glyph's pixels into a byte stream"""
+    full_intensity = (1 << bpp) - 1
+
+    output = bytearray()
+    literal_pixels = []
+
+    def flush_literal_pixels():
+        for start in range(0, len(literal_pixels), COMPRESSION_MAX_TOKEN_PIXELS):
+            chunk = literal_pixels[start : start + COMPRESSION_MAX_TOKEN_PIXELS]
+            output.append((COMPRESSION_LITERAL << 6) | (len(chunk) - 1))
+
+            bits = numpy.unpackbits(numpy.array(chunk, numpy.uint8)[:, numpy.newaxis], axis=1)
+            output.extend(numpy.packbits(bits[:, 8 - bpp:].ravel()).tobytes())
+
+        literal_pixels.clear()
+
+    def append_run(operation, length, value=None):
+        while length > 0:
+            count = min(length, COMPRESSION_MAX_TOKEN_PIXELS)
+            output.append((operation << 6) | (count - 1))
+
+            if value is not None:
+                output.append(value)
+
+            length -= count
+
+    pixels = numpy.asarray(pixels, numpy.uint8).ravel()
+
+    # Split the pixels into runs of equal values
+    run_starts = numpy.flatnonzero(numpy.diff(pixels)) + 1
+    run_starts = numpy.concatenate(([0], run_starts)).tolist()
+    run_ends = run_starts[1:] + [len(pixels)]
+
+    for (start, end) in zip(run_starts, run_ends):
+        value = int(pixels[start])
+        length = end - start
+
+        # Runs are only worth a token if they would take at least as many bytes as literals
+        if value in (0, full_intensity) and length * bpp >= 16:
+            flush_literal_pixels()
+            append_run(COMPRESSION_ZERO_RUN if value == 0 else COMPRESSION_FULL_RUN, length)
+        elif length * bpp >= 24:
+            flush_literal_pixels()
+            append_run(COMPRESSION_REPEAT, length, value)
+        else:
+            literal_pixels += [value] * length
+
+    flush_literal_pixels()
+
+    return bytes(output)
+
+
+def decompress_bitmap(data, bpp, pixel_count):
+    """Function that decodes a compressed glyph bitmap into a list of pixels"""
+    # Reference decoder, it only reads the stream forward like a decoder on a device would
+    full_intensity = (1 << bpp) - 1
+
+    pixels = []
+    position = 0
+
+    while len(pixels) < pixel_count:
+        token = data[position]
+        position += 1
+
+        operation = token >> 6
+        count = (token & 0x3f) + 1
+
+        if operation == COMPRESSION_ZERO_RUN:
+            pixels += [0] * count
+
+        elif operation == COMPRESSION_FULL_RUN:
+            pixels += [full_intensity] * count
+
+        elif operation == COMPRESSION_LITERAL:
+            for pixel in range(count):
+                bit_offset = pixel * bpp
+                byte = data[position + bit_offset // 8]
+                pixels.append((byte >> (8 - bpp - bit_offset % 8)) & full_intensity)
+
+            position += math.ceil(count * bpp / 8)
+
+        else:
+            pixels += [data[position]] * count
+            position += 1
+
+    return pixels
+
+
+class LFCCompressor:
+    """Class for compressing glyph bitmaps in a Lumina supported font"""
+    def __init__(self):
+        self.compressed_glyph_count = 0
+        self.uncompressed_size = 0
+        self.compressed_size = 0
+
+
+    def compress(self, glyphs):
+        """Function that compresses the glyph bitmaps that get smaller when compressed"""
+        for glyph in glyphs:
+            bitmap_size = glyph.bitmap_size()
+
+            self.uncompressed_size += bitmap_size
+
+            if bitmap_size == 0:
+                continue
+
+            compressed_bitmap = compress_pixels(glyph.data, glyph.bpp)
+
+            # Only keep the compressed bitmap where it pays off
+            if len(compressed_bitmap) < bitmap_size:
+                glyph.compressed_bitmap = compressed_bitmap
+                self.compressed_glyph_count += 1
+
+            self.compressed_size += glyph.bitmap_size()
+
+        # Calculate where each glyph's data starts in the bitmap
+        calculate_bitmap_indices(glyphs)
+
+        print(f'LFC::INFO: Compressed {self.compressed_glyph_count}/{len(glyphs)} glyph bitmaps, '
+              f'{self.uncompressed_size} -> {self.compressed_size} bytes '
+              f'({self.compression_ratio():.2f}x)')
+
+
+    def compression_ratio(self):
+        """Function that returns the ratio of the uncompressed to the compressed bitmap size"""
+        return self.uncompressed_size / self.compressed_size if self.compressed_size else 1.0
@@ -2,3 +2,7 @@
 
 LFC_VERSION = '1.0.0'
 LFC_PUBLISHER_INDENTATION = ' ' * 4
+LFC_PUBLISHER_WRITE_BUFFER_SIZE = 1 << 20
+LFC_PUBLISHER_COMPRESSED_BYTES_PER_LINE = 16
+LFC_PUBLISHER_CODES_PER_LINE = 8
+LFC_KERNING_PAIR_SIZE = 6
@@ -0,0 +1,133 @@
+"""Module for converting fonts to the Lumina supported format in-process"""
+
+import copy
+from lfc_rasterizer import LFCRasterizer
+from lfc_compressor import LFCCompressor
+from lfc_deduplicator import LFCDeduplicator
+from lfc_atlas import LFCAtlas
+from lfc_budget import LFCBudget
+from lfc_indexer import LFCIndexer
+from lfc_publisher import LFCPublisher
+from lfc_profiler import LFCProfiler
+
+def rasterization_options(options):
+    """Function that returns the options the glyphs are rasterized with and whether they are trimmed"""
+    # Untrimmed 8 bpp glyphs can be quantized to every bpp of a budget without rasterizing them again
+    if options.max_bytes is not None:
+        raw_options = copy.copy(options)
+        raw_options.bpp = 8
+
+        return raw_options, False
+
+    return options, True
+
+
+class LFCConverter:
+    """Class for converting fonts to the Lumina supported format in-process"""
+    def __init__(self, profiler=None):
+        self.profiler = profiler or LFCProfiler(enabled=False)
+        self.glyphs = []
+        self.indexing_mode = None
+        self.indices = []
+
+        # The options the glyphs were converted with, a flash budget chooses their bpp and encoding
+        self.options = None
+
+
+    def prepare(self, options, face=None):
+        """Function that rasterizes, optimizes and indexes the glyphs of a font"""
+        rasterizer = LFCRasterizer(self.profiler)
+
+        (raw_options, trim) = rasterization_options(options)
+
+        rasterizer.rasterize(raw_options, face, trim)
+
+        conversion_options = options
+
+        # The flash budget converts the glyphs with copied options of the chosen bpp and encoding
+        if options.max_bytes is not None:
+            conversion_options = self.fit_budget(rasterizer, options)
+
+        self.optimize(rasterizer.glyphs, conversion_options)
+
+        self.options = conversion_options
+
+        if options.corpus is not None:
+            options.corpus.report(rasterizer.declared_glyph_count, self.glyphs, self.options)
+
+
+    def optimize(self, glyphs, options):
+        """Function that compresses, deduplicates, packs and indexes rasterized glyphs"""
+        if options.compress:
+            with self.profiler.stage('compress'):
+                compressor = LFCCompressor()
+                compressor.compress(glyphs)
+
+        if options.deduplicate:
+            with self.profiler.stage('deduplicate'):
+                deduplicator = LFCDeduplicator()
+                deduplicator.deduplicate(glyphs)
+
+        if options.atlas is not None:
+            with self.profiler.stage('atlas'):
+                atlas = LFCAtlas(options.atlas, options.atlas_height)
+                atlas.pack(glyphs)
+
+        with self.profiler.stage('index'):
+            indexer = LFCIndexer()
+            indexer.index(glyphs, options.indexing)
+
+        self.glyphs = glyphs
+        self.indexing_mode = indexer.indexing_mode
+        self.indices = indexer.indices
+
+
+    def fit_budget(self, rasterizer, options):
+        """Function that switches untrimmed 8 bpp glyphs to the encoding fitting the flash budget"""
+        with self.profiler.stage('budget'):
+            budget = LFCBudget(options.max_bytes)
+            options = options.apply_budget_choice(budget.fit(rasterizer.glyphs, options))
+
+            rasterizer.requantize(options.bpp)
+
+        return options
+
+
+    def generate(self, options, face=None):
+        """Function that converts a font and returns the content of the output files by file name"""
+        self.prepare(options, face)
+
+        options = self.options
+
+        publisher = LFCPublisher(self.profiler)
+
+        outputs = {
+            f'{options.name}.h': publisher.generate_header_file(
+                    options, self.glyphs, self.indexing_mode),
+            f'{options.name}.c': publisher.generate_source_file(
+                    options, self.glyphs, self.indexing_mode, self.indices),
+        }
+
+        if options.shards is not None:
+            outputs.update(publisher.generate_bitmap_shards(options, self.glyphs, self.indexing_mode))
+
+        if options.binary:
+            outputs[f'{options.name}.bin'] = publisher.generate_binary_file(
+                    options, self.glyphs, self.indexing_mode, self.indices)
+
+        return outputs
+
+
+    def convert(self, options, output_directory_name='output', face=None):
+        """Function that converts a font and writes the output files, None if they are up to date"""
+        publisher = LFCPublisher(self.profiler)
+
+        # Skip the conversion if the output files were generated from the same inputs
+        if options.reproducible and publisher.is_up_to_date(options, output_directory_name):
+            self.glyphs = []
+            return None
+
+        self.prepare(options, face)
+
+        return publisher.publish(
+                self.options, self.glyphs, self.indexing_mode, self.indices, output_directory_name)
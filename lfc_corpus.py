@@ -0,0 +1,310 @@
+"""Module for collecting the characters used by the UI strings of a project"""
+
+import os
+import re
+import json
+import unicodedata
+from lfc_metadata import metadata_fields, metadata_records, choose_field_layout, fixed_record_size
+from lfc_atlas import atlas_page_heights
+
+# Formats of the corpus files by extension, other files in a corpus directory are skipped
+CORPUS_FORMATS = {
+    '.po': 'po',
+    '.pot': 'po',
+    '.json': 'json',
+    '.c': 'c',
+    '.h': 'c',
+    '.cc': 'c',
+    '.cpp': 'c',
+    '.hpp': 'c',
+    '.txt': 'text',
+}
+
+# Number of characters read at a time from JSON and text files
+CORPUS_CHUNK_SIZE = 1 << 16
+
+# Number of characters listed when corpus characters are outside the declared ranges
+CORPUS_REPORTED_CHARACTERS = 8
+
+# A comment, a character literal or a string literal with its prefix and body
+C_TOKEN_PATTERN = re.compile(r'''//.*|/\*|'(?:[^'\\\n]|\\.)*'|(u8|[uUL])?"((?:[^"\\\n]|\\.)*)"''')
+
+C_ESCAPE_PATTERN = re.compile(r'\\(?:x([0-9A-Fa-f]+)|([0-7]{1,3})|u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+
+C_SIMPLE_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v'}
+
+# A quoted string of a PO file, optionally after its keyword
+PO_LINE_PATTERN = re.compile(r'(msgctxt|msgid_plural|msgid|msgstr(?:\[\d+\])?)?\s*"((?:[^"\\]|\\.)*)"')
+
+# A JSON string, followed by a colon if it is an object key
+JSON_STRING_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"(\s*:)?', re.S)
+
+JSON_TRAILING_WHITESPACE_PATTERN = re.compile(r'\s*\Z')
+
+def unescape_c_string(body, wide=False):
+    """Function that decodes the escape sequences of a C string literal body"""
+    output = bytearray()
+    position = 0
+
+    for match in C_ESCAPE_PATTERN.finditer(body):
+        output += body[position : match.start()].encode('utf-8')
+        position = match.end()
+
+        (hexadecimal, octal, short_unicode, long_unicode, simple) = match.groups()
+
+        # Numeric escapes of narrow strings are bytes of the UTF-8 encoded text
+        if hexadecimal is not None or octal is not None:
+            value = int(hexadecimal, 16) if hexadecimal is not None else int(octal, 8)
+
+            if wide:
+                output += chr(min(value, 0x10ffff)).encode('utf-8', 'ignore')
+            else:
+                output.append(value & 0xff)
+
+        elif short_unicode is not None or long_unicode is not None:
+            value = int(short_unicode or long_unicode, 16)
+            output += chr(min(value, 0x10ffff)).encode('utf-8', 'ignore')
+
+        else:
+            output += C_SIMPLE_ESCAPES.get(simple, simple).encode('utf-8')
+
+    output += body[position:].encode('utf-8')
+
+    return output.decode('utf-8', 'ignore')
+
+
+def read_c_strings(file):
+    """Function that yields the string literals of a C or C++ file, skipping comments"""
+    in_comment = False
+
+    for line in file:
+        position = 0
+
+        while True:
+            # Block comments can span several lines
+            if in_comment:
+                comment_end = line.find('*/', position)
+
+                if comment_end < 0:
+                    break
+
+                position = comment_end + 2
+                in_comment = False
+
+            match = C_TOKEN_PATTERN.search(line, position)
+
+            if match is None:
+                break
+
+            position = match.end()
+
+            if match.group(0) == '/*':
+                in_comment = True
+            elif match.group(2) is not None:
+                yield unescape_c_string(match.group(2), match.group(1) in ('L', 'u', 'U'))
+
+
+def read_po_strings(file):
+    """Function that yields the translations of a PO file, the source text where it is untranslated"""
+    entry = {}
+    keyword = None
+
+    def entry_strings():
+        # The entry with an empty msgid is the header of the file
+        if not entry.get('msgid'):
+            return []
+
+        translations = [text for (key, text) in entry.items() if key.startswith('msgstr') and text]
+
+        return translations or [entry['msgid'], entry.get('msgid_plural', '')]
+
+    for line in file:
+        line = line.strip()
+
+        # Comments, obsolete entries and blank lines end the current entry
+        if not line or line.startswith('#'):
+            yield from entry_strings()
+            entry = {}
+            keyword = None
+            continue
+
+        match = PO_LINE_PATTERN.match(line)
+
+        if match is None:
+            continue
+
+        if match.group(1) is not None:
+            keyword = match.group(1)
+
+            # A new message starts with its context or its msgid
+            if keyword in ('msgctxt', 'msgid') and any(key.startswith('msgstr') for key in entry):
+                yield from entry_strings()
+                entry = {}
+
+        # Continuation lines extend the string of the last keyword
+        if keyword is not None:
+            entry[keyword] = entry.get(keyword, '') + unescape_c_string(match.group(2))
+
+    yield from entry_strings()
+
+
+def read_json_strings(file):
+    """Function that yields the string values of a JSON file, skipping the object keys"""
+    buffer = ''
+
+    while True:
+        chunk = file.read(CORPUS_CHUNK_SIZE)
+        buffer += chunk
+        position = 0
+
+        for match in JSON_STRING_PATTERN.finditer(buffer):
+            # A string at the end of the buffer may still be followed by the colon of a key
+            if chunk and match.group(2) is None and \
+               JSON_TRAILING_WHITESPACE_PATTERN.match(buffer, match.end()):
+                break
+
+            position = match.end()
+
+            if match.group(2) is None:
+                yield json.loads(f'"{match.group(1)}"', strict=False)
+
+        # Only an unfinished string is kept for the next chunk, so the buffer stays small
+        string_start = buffer.find('"', position)
+        buffer = buffer[string_start:] if string_start >= 0 else ''
+
+        if not chunk:
+            break
+
+
+def read_text(file):
+    """Function that yields the text of a plain text file in chunks"""
+    yield from iter(lambda: file.read(CORPUS_CHUNK_SIZE), '')
+
+
+CORPUS_READERS = {
+    'po': read_po_strings,
+    'json': read_json_strings,
+    'c': read_c_strings,
+    'text': read_text,
+}
+
+def corpus_files(paths):
+    """Function that yields the files of the corpus paths with their formats"""
+    for path in paths:
+        if os.path.isfile(path):
+            # Files given directly are read as plain text unless their format is known
+            yield path, CORPUS_FORMATS.get(os.path.splitext(path)[1].lower(), 'text')
+
+        elif os.path.isdir(path):
+            for (directory, directory_names, file_names) in os.walk(path):
+                directory_names.sort()
+
+                for file_name in sorted(file_names):
+                    corpus_format = CORPUS_FORMATS.get(os.path.splitext(file_name)[1].lower())
+
+                    if corpus_format is not None:
+                        yield os.path.join(directory, file_name), corpus_format
+
+        else:
+            raise FileNotFoundError(f'LFC::ERROR: The corpus path does not exist: {path}')
+
+
+def read_corpus_file(path, corpus_format):
+    """Function that yields the strings of a corpus file in the order they appear"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as corpus_file:
+        try:
+            yield from CORPUS_READERS[corpus_format](corpus_file)
+        except json.JSONDecodeError as exception:
+            raise ValueError(f'LFC::ERROR: Invalid JSON string in {path}: {exception}') from exception
+
+
+def converted_sizes(glyphs, options):
+    """Function that returns the bytes of glyph bitmaps and the metadata record size of converted glyphs"""
+    fields = metadata_fields(options.compress, options.atlas is not None)
+
+    if options.compact_metadata:
+        (_, record_size) = choose_field_layout(metadata_records(glyphs, fields), fields)
+    else:
+        record_size = fixed_record_size(fields)
+
+    if options.atlas is not None:
+        bitmap_size = options.atlas * options.bpp // 8 * sum(atlas_page_heights(glyphs, options.atlas_height))
+    else:
+        bitmap_size = sum(glyph.bitmap_size() for glyph in glyphs if glyph.duplicate_of is None)
+
+    return bitmap_size, record_size
+
+
+class LFCCorpus:
+    """Class for collecting the characters used by the UI strings of a project"""
+    def __init__(self):
+        self.characters = set()
+        self.file_count = 0
+        self.byte_count = 0
+
+
+    def collect(self, paths):
+        """Function that streams through the corpus files and collects the characters of their strings"""
+        for (path, corpus_format) in corpus_files(paths):
+            for text in read_corpus_file(path, corpus_format):
+                self.characters.update(text)
+
+            self.file_count += 1
+            self.byte_count += os.path.getsize(path)
+
+        # Control characters such as line breaks are never drawn
+        self.characters = {
+            character for character in self.characters if unicodedata.category(character) != 'Cc'
+        }
+
+
+    def subset(self, character_ranges):
+        """Function that narrows the declared character ranges down to the characters of the corpus"""
+        codes = sorted(ord(character) for character in self.characters)
+
+        declared_codes = [
+            code for code in codes
+            if any(code in character_range for character_range in character_ranges)
+        ]
+
+        print(f'LFC::INFO: Corpus: {len(codes)} distinct characters in {self.file_count} files '
+              f'({self.byte_count} bytes)')
+
+        undeclared_codes = sorted(set(codes) - set(declared_codes))
+
+        if undeclared_codes:
+            undeclared_characters = ', '.join(
+                    f'0x{code:x}' for code in undeclared_codes[:CORPUS_REPORTED_CHARACTERS])
+
+            if len(undeclared_codes) > CORPUS_REPORTED_CHARACTERS:
+                undeclared_characters += ', ...'
+
+            print(f'LFC::INFO: Skipped {len(undeclared_codes)} corpus characters outside the declared '
+                  f'characters: {undeclared_characters}')
+
+        if not declared_codes:
+            raise ValueError('LFC::ERROR: The corpus uses none of the declared characters')
+
+        # Consecutive characters are merged back into ranges
+        subset_ranges = []
+
+        for code in declared_codes:
+            if subset_ranges and subset_ranges[-1].stop == code:
+                subset_ranges[-1] = range(subset_ranges[-1].start, code + 1)
+            else:
+                subset_ranges.append(range(code, code + 1))
+
+        return subset_ranges
+
+
+    def report(self, declared_glyph_count, glyphs, options):
+        """Function that reports the glyphs and estimated bytes saved compared to the declared characters"""
+        (bitmap_size, record_size) = converted_sizes(glyphs, options)
+
+        # The skipped glyphs are never rasterized, so each is estimated to take the average bitmap
+        # of the converted glyphs and a metadata record
+        saved_size = round((declared_glyph_count - len(glyphs)) * (bitmap_size / len(glyphs) + record_size))
+
+        print(f'LFC::INFO: Converted the {len(glyphs)} glyphs used by the corpus instead of '
+              f'{declared_glyph_count} glyphs of the declared characters, saving about {saved_size} '
+              f'bytes of glyph bitmaps and metadata')
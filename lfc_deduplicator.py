@@ -0,0 +1,44 @@
+"""Module for sharing identical glyph bitmaps in a Lumina supported font"""
+
+class LFCDeduplicator:
+    """Class for sharing identical glyph bitmaps in a Lumina supported font"""
+    def __init__(self):
+        self.duplicate_count = 0
+        self.saved_bytes = 0
+
+
+    def deduplicate(self, glyphs):
+        """Function that points glyphs with identical bitmaps at a single copy of the bitmap"""
+        unique_glyphs = {}
+
+        character_data_index = 0
+
+        for glyph in glyphs:
+            bitmap_size = glyph.bitmap_size()
+
+            # Glyphs without a bitmap have nothing to share
+            if bitmap_size == 0:
+                glyph.bitmap_index = character_data_index
+                continue
+
+            key = (glyph.width, glyph.height, glyph.pack_bitmap())
+
+            if key in unique_glyphs:
+                original_glyph = unique_glyphs[key]
+
+                glyph.bitmap_index = original_glyph.bitmap_index
+                glyph.duplicate_of = original_glyph.code
+
+                self.duplicate_count += 1
+                self.saved_bytes += bitmap_size
+                continue
+
+            unique_glyphs[key] = glyph
+
+            glyph.bitmap_index = character_data_index
+
+            # Update the character data index for the next unique bitmap
+            character_data_index += bitmap_size
+
+        print(f'LFC::INFO: Deduplicated {self.duplicate_count} glyph bitmaps, '
+              f'saving {self.saved_bytes} bytes')
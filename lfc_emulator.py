@@ -0,0 +1,420 @@
+"""Module for emulating the glyph lookup and unpacking of Lumina on the host"""
+
+import math
+import collections
+import unicodedata
+from lfc_constants import LFC_KERNING_PAIR_SIZE
+from lfc_indexing_mode import IndexingMode
+from lfc_indexer import INDEXER_DENSE_ENTRY_SIZE, INDEXER_SEGMENT_ENTRY_SIZE, INDEXER_SORTED_ENTRY_SIZE
+from lfc_metadata import LFCMetadataPacker, metadata_fields, metadata_records, fixed_record_size, \
+                         unpack_metadata_record
+from lfc_compressor import COMPRESSION_ZERO_RUN, COMPRESSION_FULL_RUN, COMPRESSION_LITERAL
+from lfc_atlas import atlas_page_heights, render_atlas_pages
+from lfc_publisher import LFCPublisher, shard_glyphs, shard_offsets
+
+# Size in bytes of an entry of the glyph bitmap shard offset table
+EMULATOR_SHARD_OFFSET_SIZE = 4
+
+# Tables a lookup and unpack reads from, in the order they are read
+EMULATOR_TABLES = ['text', 'lookup', 'metadata', 'shards', 'bitmap', 'kerning']
+
+def read_packed_pixels(bitmap, start, pixel_count, bpp, cost):
+    """Function that reads pixels stored most significant pixel first, one byte read at a time"""
+    bit_count = pixel_count * bpp
+    byte_count = math.ceil(bit_count / 8)
+
+    pixels = []
+
+    for pixel in range(pixel_count):
+        bit_offset = pixel * bpp
+        shift = 8 - bpp - bit_offset % 8
+
+        # A trailing partial byte holds its bits in the least significant positions
+        if bit_offset // 8 == byte_count - 1 and bit_count % 8 != 0:
+            shift -= 8 - bit_count % 8
+
+        pixels.append((bitmap[start + bit_offset // 8] >> shift) & ((1 << bpp) - 1))
+
+    cost['bitmap_reads'] += byte_count
+    cost['bitmap_bytes'] += byte_count
+    cost['unpack_steps'] += pixel_count
+
+    return pixels
+
+
+def read_compressed_pixels(bitmap, start, pixel_count, bpp, cost):
+    """Function that decodes the tokens of a compressed bitmap, counting every byte and token read"""
+    full_intensity = (1 << bpp) - 1
+
+    pixels = []
+    position = start
+
+    while len(pixels) < pixel_count:
+        token = bitmap[position]
+        position += 1
+
+        operation = token >> 6
+        count = (token & 0x3f) + 1
+
+        cost['unpack_steps'] += 1
+
+        if operation == COMPRESSION_ZERO_RUN:
+            pixels += [0] * count
+
+        elif operation == COMPRESSION_FULL_RUN:
+            pixels += [full_intensity] * count
+
+        # Literal pixels are extracted one at a time, runs are filled in one step
+        elif operation == COMPRESSION_LITERAL:
+            for pixel in range(count):
+                bit_offset = pixel * bpp
+                byte = bitmap[position + bit_offset // 8]
+                pixels.append((byte >> (8 - bpp - bit_offset % 8)) & full_intensity)
+
+            position += math.ceil(count * bpp / 8)
+
+            cost['unpack_steps'] += count
+
+        else:
+            pixels += [bitmap[position]] * count
+            position += 1
+
+    cost['bitmap_reads'] += position - start
+    cost['bitmap_bytes'] += position - start
+
+    return pixels
+
+
+def read_column_pages(bitmap, start, width, height, cost):
+    """Function that reads 1 bpp pixels stored as columns of 8 rows, top pixel first"""
+    pixels = [
+        (bitmap[start + row // 8 * width + column] >> row % 8) & 1
+        for row in range(height)
+        for column in range(width)
+    ]
+
+    cost['bitmap_reads'] += math.ceil(height / 8) * width
+    cost['bitmap_bytes'] += math.ceil(height / 8) * width
+    cost['unpack_steps'] += width * height
+
+    return pixels
+
+
+class LFCEmulator:
+    """Class for emulating the glyph lookup and unpacking of Lumina on the host"""
+    def __init__(self, options, glyphs, indexing_mode, indices):
+        self.options = options
+        self.glyphs = glyphs
+        self.indexing_mode = indexing_mode
+        self.indices = indices
+        self.bpp = glyphs[0].bpp
+
+        (self.first_valid_index, self.last_valid_index) = \
+            LFCPublisher().valid_index_range(glyphs, indexing_mode)
+
+        # The header of a UNICODE font defines the string of every glyph as its index
+        self.unicode_indices = {glyph.code: index + 1 for (index, glyph) in enumerate(glyphs)}
+
+        self.counts = collections.Counter()
+        self.glyph_count = 0
+        self.missing_count = 0
+
+        # Every character costs the same each time it is drawn, so each one is emulated once
+        self.character_indices = {}
+
+        self.load_metadata()
+        self.load_bitmap()
+
+        self.kerning_pairs = LFCPublisher().kerning_pairs(glyphs) if options.kerning else []
+
+
+    def load_metadata(self):
+        """Function that builds the glyph metadata records as the publisher writes them"""
+        atlas = self.options.atlas is not None
+        fields = metadata_fields(self.options.compress, atlas)
+
+        if self.options.compact_metadata:
+            packer = LFCMetadataPacker()
+            self.metadata = packer.pack(self.glyphs, self.options.compress, atlas)
+            self.metadata_layout = packer.layout
+            self.metadata_record_size = packer.record_size
+        else:
+            self.metadata = metadata_records(self.glyphs, fields)
+            self.metadata_layout = None
+            self.metadata_record_size = fixed_record_size(fields)
+
+
+    def load_bitmap(self):
+        """Function that builds the glyph bitmap or atlas pages as the publisher writes them"""
+        self.shard_offsets = None
+
+        if self.options.atlas is not None:
+            self.atlas_stride = self.options.atlas * self.bpp // 8
+            self.atlas_page_height = self.options.atlas_height or \
+                                     atlas_page_heights(self.glyphs, self.options.atlas_height)[0]
+            self.bitmap = b''.join(
+                    render_atlas_pages(self.glyphs, self.options.atlas, self.options.atlas_height))
+            return
+
+        # A bitmap index stays an offset into the whole bitmap when it is split into shards
+        self.bitmap = b''.join(
+                glyph.encode_bitmap() for glyph in self.glyphs if glyph.duplicate_of is None)
+
+        if self.options.shards is not None:
+            self.shard_offsets = shard_offsets(
+                    shard_glyphs(self.glyphs, self.options.shards, self.options.declared_characters))
+
+
+    def emulate(self, strings):
+        """Function that draws every string of a workload and counts the cost of its glyphs"""
+        character_counts = collections.Counter()
+        pair_counts = collections.Counter()
+
+        for text in strings:
+            character_counts.update(text)
+
+            # Kerning only applies between neighbouring characters that are drawn
+            pair_counts.update(zip(text, text[1:]))
+
+        for (character, count) in character_counts.items():
+            # Control characters such as line breaks are never drawn
+            if unicodedata.category(character) == 'Cc':
+                continue
+
+            (index, cost) = self.draw_character(character)
+            self.character_indices[character] = index
+
+            for (key, value) in cost.items():
+                self.counts[key] += value * count
+
+            if index == 0:
+                self.missing_count += count
+            else:
+                self.glyph_count += count
+
+        if not self.kerning_pairs:
+            return
+
+        for ((left, right), count) in pair_counts.items():
+            left_index = self.character_indices.get(left, 0)
+            right_index = self.character_indices.get(right, 0)
+
+            if left_index == 0 or right_index == 0:
+                continue
+
+            for (key, value) in self.kerning(left_index, right_index).items():
+                self.counts[key] += value * count
+
+
+    def draw_character(self, character):
+        """Function that looks up and unpacks the glyph of a character, checking the decoded pixels"""
+        cost = collections.Counter()
+
+        match self.indexing_mode:
+            case IndexingMode.UNICODE:
+                # Characters without a glyph can not be written in a string at all
+                if ord(character) not in self.unicode_indices:
+                    return 0, cost
+
+                codes = [self.unicode_indices[ord(character)]]
+                text_size = 1
+
+            case IndexingMode.ASCII:
+                # Strings are looked up byte by byte, so other characters miss on every byte
+                codes = list(character.encode('utf-8'))
+                text_size = len(codes)
+
+            case _:
+                codes = [ord(character)]
+                text_size = len(character.encode('utf-8'))
+                cost['decode_steps'] += text_size
+
+        cost['text_reads'] += text_size
+        cost['text_bytes'] += text_size
+
+        indices = [self.glyph_index(code, cost) for code in codes]
+        index = indices[0] if len(indices) == 1 else 0
+
+        if index == 0:
+            return 0, cost
+
+        glyph = self.glyphs[index - 1]
+
+        if glyph.code != ord(character):
+            raise ValueError(f'LFC::ERROR: Code 0x{ord(character):x} resolves to the glyph of '
+                             f'0x{glyph.code:x}')
+
+        if self.unpack(index, cost) != glyph.data.ravel().tolist():
+            raise ValueError(f'LFC::ERROR: The glyph of code 0x{glyph.code:x} does not decode to '
+                             'its pixels')
+
+        return index, cost
+
+
+    def glyph_index(self, code, cost):
+        """Function that finds the glyph index of a code like Lumina, 0 if the font lacks it"""
+        match self.indexing_mode:
+            case IndexingMode.ASCII | IndexingMode.DENSE:
+                cost['lookup_steps'] += 1
+
+                if not self.first_valid_index <= code <= self.last_valid_index:
+                    return 0
+
+                self.touch(cost, 'lookup', INDEXER_DENSE_ENTRY_SIZE)
+
+                return self.indices[code - self.first_valid_index]
+
+            case IndexingMode.UNICODE:
+                # The string holds the glyph index, the lookup table maps it to itself
+                cost['lookup_steps'] += 1
+                self.touch(cost, 'lookup', INDEXER_DENSE_ENTRY_SIZE)
+
+                return code
+
+            case IndexingMode.SEGMENTED:
+                position = self.search(
+                        lambda position: self.indices[position][0], code, INDEXER_SEGMENT_ENTRY_SIZE, cost)
+
+                if position < 0:
+                    return 0
+
+                # The found segment is read again for its length and first glyph index
+                cost['lookup_steps'] += 1
+                self.touch(cost, 'lookup', INDEXER_SEGMENT_ENTRY_SIZE)
+
+                (first_code, count, first_index) = self.indices[position]
+
+                return first_index + code - first_code if code < first_code + count else 0
+
+            case IndexingMode.SORTED:
+                position = self.search(
+                        lambda position: self.indices[position], code, INDEXER_SORTED_ENTRY_SIZE, cost)
+
+                if position < 0 or self.indices[position] != code:
+                    return 0
+
+                return position + 1
+
+
+    def search(self, key_at, code, entry_size, cost):
+        """Function that finds the last lookup entry with a key not above the code, -1 if none"""
+        low = 0
+        high = len(self.indices)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            cost['lookup_steps'] += 1
+            self.touch(cost, 'lookup', entry_size)
+
+            if key_at(middle) <= code:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low - 1
+
+
+    def unpack(self, index, cost):
+        """Function that reads the metadata record of a glyph index and unpacks its bitmap"""
+        self.touch(cost, 'metadata', self.metadata_record_size)
+
+        if self.metadata_layout is not None:
+            record = unpack_metadata_record(
+                    self.metadata, index, self.metadata_layout, self.metadata_record_size)
+            cost['unpack_steps'] += len(self.metadata_layout)
+        else:
+            record = self.metadata[index]
+
+        (width, height) = (record['width'], record['height'])
+
+        if self.options.atlas is not None:
+            return self.unpack_atlas(record, cost)
+
+        bitmap_index = record['bitmap_index']
+
+        # The shard holding the bitmap is the last one starting at or before it
+        if self.shard_offsets is not None:
+            shard = len(self.shard_offsets) - 1
+
+            cost['unpack_steps'] += 1
+            self.touch(cost, 'shards', EMULATOR_SHARD_OFFSET_SIZE)
+
+            while self.shard_offsets[shard] > bitmap_index:
+                shard -= 1
+
+                cost['unpack_steps'] += 1
+                self.touch(cost, 'shards', EMULATOR_SHARD_OFFSET_SIZE)
+
+        if record.get('compressed'):
+            return read_compressed_pixels(self.bitmap, bitmap_index, width * height, self.bpp, cost)
+
+        if self.options.layout == 'columns':
+            return read_column_pages(self.bitmap, bitmap_index, width, height, cost)
+
+        return read_packed_pixels(self.bitmap, bitmap_index, width * height, self.bpp, cost)
+
+
+    def unpack_atlas(self, record, cost):
+        """Function that reads the rows of a glyph from its atlas page"""
+        pixels = []
+
+        # Glyphs start on a byte, so every row is read like a packed glyph of a single row
+        for row in range(record['height']):
+            row_start = (record['atlas_page'] * self.atlas_page_height + record['atlas_y'] + row) * \
+                        self.atlas_stride + record['atlas_x'] * self.bpp // 8
+
+            pixels += read_packed_pixels(self.bitmap, row_start, record['width'], self.bpp, cost)
+
+        return pixels
+
+
+    def kerning(self, left, right):
+        """Function that binary searches the kerning pairs of two glyph indices like Lumina"""
+        cost = collections.Counter()
+
+        low = 0
+        high = len(self.kerning_pairs)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            cost['kerning_steps'] += 1
+            self.touch(cost, 'kerning', LFC_KERNING_PAIR_SIZE)
+
+            if self.kerning_pairs[middle][:2] == (left, right):
+                break
+
+            if self.kerning_pairs[middle][:2] < (left, right):
+                low = middle + 1
+            else:
+                high = middle
+
+        return cost
+
+
+    def touch(self, cost, table, size):
+        """Function that counts a read of a table entry"""
+        cost[f'{table}_reads'] += 1
+        cost[f'{table}_bytes'] += size
+
+
+    def per_glyph(self, key):
+        """Function that returns the average count of a key per drawn glyph"""
+        return self.counts[key] / self.glyph_count if self.glyph_count else 0.0
+
+
+    def reads(self):
+        """Function that returns the average number of memory reads per drawn glyph"""
+        return sum(self.per_glyph(f'{table}_reads') for table in EMULATOR_TABLES)
+
+
+    def bytes_read(self):
+        """Function that returns the average number of bytes read per drawn glyph"""
+        return sum(self.per_glyph(f'{table}_bytes') for table in EMULATOR_TABLES)
+
+
+    def steps(self):
+        """Function that returns the average number of decoding, lookup and unpacking steps per drawn glyph"""
+        return sum(
+            self.per_glyph(key) for key in ('decode_steps', 'lookup_steps', 'unpack_steps', 'kerning_steps'))
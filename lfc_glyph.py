@@ -1,26 +1,113 @@
 """Module for storing and optimizing a glyph in a Lumina supported font"""
 
 import math
+import struct
+import numpy
+
+# Binary glyph record header: bpp, code, width, height, advance, y_offset, bitmap_index
+GLYPH_RECORD_HEADER = struct.Struct('<BIHHhiI')
+
+def deserialize_glyph(buffer, offset=0):
+    """Function that reads a glyph from a binary record and returns it with the record's end"""
+    bpp, code, width, height, advance, y_offset, bitmap_index = \
+        GLYPH_RECORD_HEADER.unpack_from(buffer, offset)
+
+    data_offset = offset + GLYPH_RECORD_HEADER.size
+    data = numpy.frombuffer(buffer, numpy.uint8, width * height, data_offset)
+
+    glyph = LFCGlyph(bpp, code, width, height, advance, y_offset, bitmap_index, data)
+
+    return glyph, data_offset + width * height
+
+
+def pack_pixels(pixels, bpp):
+    """Function that packs pixels into bytes, most significant pixel first"""
+    pixels = numpy.asarray(pixels, numpy.uint8).ravel()
+
+    if bpp == 8:
+        return pixels.tobytes()
+
+    # Split every pixel into its bpp bits and pack the whole bitstream at once
+    bits = numpy.unpackbits(pixels[:, numpy.newaxis], axis=1)[:, 8 - bpp:].ravel()
+
+    full_byte_bits = len(bits) - len(bits) % 8
+    packed_data = numpy.packbits(bits[:full_byte_bits]).tobytes()
+
+    # A trailing partial byte holds its bits in the least significant positions
+    if full_byte_bits < len(bits):
+        packed_data += bytes([int(numpy.packbits(bits[full_byte_bits:])[0]) >> (8 - len(bits) % 8)])
+
+    return packed_data
+
+
+def pack_column_pages(pixels):
+    """Function that packs 1 bpp pixels into pages of 8 rows, a byte per column, top pixel first"""
+    pixels = numpy.asarray(pixels, numpy.uint8)
+    (height, width) = pixels.shape
+
+    # Every byte holds 8 vertical pixels with the top pixel in the least significant bit
+    pages = pixels.reshape(height // 8, 8, width).transpose(0, 2, 1)
+
+    return numpy.packbits(pages, axis=2, bitorder='little').tobytes()
+
+
+def calculate_bitmap_indices(glyphs):
+    """Function that calculates the index of each glyph's data in the font bitmap"""
+    character_data_index = 0
+
+    for glyph in glyphs:
+        glyph.bitmap_index = character_data_index
+
+        # Update the character data index for the next character
+        character_data_index += glyph.bitmap_size()
+
 
 class LFCGlyph:
     """Class representing a glyph in a Lumina supported font"""
     def __init__(self, bpp, code, width, height, advance, y_offset, bitmap_index, data):
         self.bpp = bpp
-        self.data = data
+        self.data = numpy.asarray(data, dtype=numpy.uint8).reshape(height, width)
         self.code = code
         self.width = width
         self.height = height
         self.advance = advance
         self.y_offset = y_offset
         self.bitmap_index = bitmap_index
+        self.duplicate_of = None
+        self.compressed_bitmap = None
+        self.kerning = {}
+        self.atlas_page = 0
+        self.atlas_x = 0
+        self.atlas_y = 0
+        self.column_pages = False
+
+
+    def requantize(self, bpp):
+        """Function that returns the untrimmed 8 bpp glyph quantized, trimmed and padded at a bpp"""
+        glyph = LFCGlyph(
+            bpp,
+            self.code,
+            self.width,
+            self.height,
+            self.advance,
+            self.y_offset,
+            0,
+            self.data >> (8 - bpp))
+
+        glyph.kerning = self.kerning
+
+        # Trim and pad exactly like a glyph rasterized at the bpp
+        if self.data.any():
+            glyph.trim_zero_axes()
+            glyph.adjust_bitmap_width()
+
+        return glyph
 
 
     def trim_zero_axes(self):
         """Function that trims unnecessary leading/trailing zero rows/columns from the glyph data"""
-        self._trim_leading_zero_rows()
-        self._trim_trailing_zero_rows()
-        self._trim_leading_zero_columns()
-        self._trim_trailing_zero_columns()
+        self._trim_zero_rows()
+        self._trim_zero_columns()
 
 
     def adjust_bitmap_width(self):
@@ -31,82 +118,165 @@ class LFCGlyph:
         # Calculate the amount of padding needed to make the width a multiple of bpp
         column_padding = math.ceil(self.width / pixels_per_byte)
         column_padding *= pixels_per_byte
-        column_padding -= self.width 
+        column_padding -= self.width
 
-        # Add padding
-        for row in range(self.height):
-            index = row * (self.width + column_padding) + self.width 
-            self.data[index:index] = [0] * column_padding
+        # Add padding to the right side of every row
+        if column_padding > 0:
+            padded_data = numpy.zeros((self.height, self.width + column_padding), numpy.uint8)
+            padded_data[:, :self.width] = self.data
+            self.data = padded_data
 
-        # Update the glyph's data and width
+        # Update the glyph's width
         self.width += column_padding
 
 
-    def _trim_leading_zero_columns(self):
-        zero_column_count = 0
+    def arrange_column_pages(self):
+        """Function that lays the glyph out in page aligned columns of 8 vertical pixels per byte"""
+        self.column_pages = True
+
+        if self.data.size == 0:
+            return
+
+        # Columns take a byte per page each, so the padding of the row layout is dropped again
+        nonzero_columns = numpy.flatnonzero(self.data.any(axis=0))
+
+        if nonzero_columns.size:
+            self.width = int(nonzero_columns[-1]) + 1
+            self.data = self.data[:, :self.width]
+
+        # Extend the glyph up and down to the nearest page boundaries of the line
+        leading_row_count = self.y_offset % 8
+        trailing_row_count = -(leading_row_count + self.height) % 8
+
+        padded_data = numpy.zeros(
+                (leading_row_count + self.height + trailing_row_count, self.width), numpy.uint8)
+        padded_data[leading_row_count : leading_row_count + self.height] = self.data
+
+        self.data = padded_data
+        self.height = len(padded_data)
+        self.y_offset -= leading_row_count
+
+
+    def pack_bitmap(self):
+        """Function that packs the glyph's pixels into the bytes of its bitmap layout"""
+        if self.column_pages:
+            return pack_column_pages(self.data)
+
+        return pack_pixels(self.data, self.bpp)
+
+
+    def bitmap_size(self):
+        """Function that returns the number of bytes the glyph takes in the font bitmap"""
+        if self.compressed_bitmap is not None:
+            return len(self.compressed_bitmap)
+
+        if self.column_pages:
+            return self.width * math.ceil(self.height / 8)
+
+        return math.ceil(self.width / (8 // self.bpp)) * self.height
+
+
+    def encode_bitmap(self):
+        """Function that returns the bytes of the glyph as stored in the font bitmap"""
+        if self.compressed_bitmap is not None:
+            return self.compressed_bitmap
+
+        return self.pack_bitmap()
+
+
+    def serialize(self):
+        """Function that writes the glyph into a compact binary record"""
+        header = GLYPH_RECORD_HEADER.pack(
+            self.bpp,
+            self.code,
+            self.width,
+            self.height,
+            self.advance,
+            self.y_offset,
+            self.bitmap_index)
+
+        return header + self.data.tobytes()
+
+
+    def _trim_zero_rows(self):
+        # Find the non-zero rows of the glyph
+        nonzero_rows = numpy.flatnonzero(self.data.any(axis=1))
+
+        # Remove the leading zero rows and adjust the glyph's vertical offset
+        leading_zero_row_count = int(nonzero_rows[0]) if nonzero_rows.size else self.height
+
+        self.data = self.data[leading_zero_row_count:]
+        self.height -= leading_zero_row_count
+        self.y_offset += leading_zero_row_count
+
+        # Trailing zero rows are detected with a window that lags one pixel behind the row
+        # boundary, so every window holds the last pixel of the row above it instead of its own
+        # last pixel. Previous versions trimmed rows this way, so the output stays compatible.
+        last_checked_row = 0 if self.width > 1 else 1
 
-        # Count leading zero columns
-        for column in range(self.width):
-            if all(self.data[row * self.width + column] == 0 for row in range(self.height)):
-                zero_column_count += 1
-            else:
-                break
+        windows = self.data.ravel()[self.width - 1 : -1].reshape(-1, self.width)
+        nonzero_windows = numpy.flatnonzero(windows[last_checked_row:].any(axis=1))
 
-        # Remove zero columns and adjust the glyph's width
-        for _ in range(zero_column_count):
-            self.width -= 1
+        checked_window_count = max(len(windows) - last_checked_row, 0)
 
-            for row in range(self.height):
-                self.data.pop(row * (self.width - zero_column_count + 1))
+        if nonzero_windows.size == 0:
+            trailing_zero_row_count = checked_window_count
+        else:
+            trailing_zero_row_count = checked_window_count - 1 - int(nonzero_windows[-1])
 
+        # Remove the trailing zero rows
+        self.data = self.data[:self.height - trailing_zero_row_count]
+        self.height -= trailing_zero_row_count
 
-    def _trim_trailing_zero_columns(self):
-        zero_column_count = 0
 
-        # Count leading zero columns
-        for column in range(self.width - 1, -1, -1):
-            if all(self.data[row * self.width + column] == 0 for row in range(self.height)):
-                zero_column_count += 1
-            else:
-                break
+    def _trim_zero_columns(self):
+        # Find the non-zero columns of the glyph and remove the leading zero columns
+        nonzero_columns = numpy.flatnonzero(self.data.any(axis=0))
+        leading_zero_column_count = int(nonzero_columns[0]) if nonzero_columns.size else self.width
 
-        # Remove zero columns and adjust the glyph's width
-        for _ in range(zero_column_count):
-            self.width -= 1
+        self._remove_zero_columns(leading_zero_column_count, 0)
 
-            for row in range(self.height):
-                self.data.pop(row * (self.width - zero_column_count + 1) + self.width)
+        # Find the non-zero columns again and remove the trailing zero columns
+        nonzero_columns = numpy.flatnonzero(self.data.any(axis=0))
+        trailing_zero_column_count = \
+            self.width - 1 - int(nonzero_columns[-1]) if nonzero_columns.size else self.width
 
+        self._remove_zero_columns(trailing_zero_column_count, 1)
 
-    def _trim_leading_zero_rows(self):
-        zero_row_count = 0
 
-        # Count leading zero rows
-        for row in range(0, len(self.data), self.width):
-            if not any(self.data[row : row + self.width]):
-                zero_row_count += 1
-            else:
-                break
+    def _remove_zero_columns(self, count, trailing):
+        # A single column is removed as a plain slice
+        if count <= 1:
+            self.data = self.data[:, count * (1 - trailing) : self.width - count * trailing]
+            self.width -= count
+            return
 
-        # Adjust the glyph based on the number of leading zero rows
-        self.data = self.data[zero_row_count * self.width:]
-        self.height -= zero_row_count
-        self.y_offset += zero_row_count
+        # Previous versions removed wider runs by popping one pixel per row and column from the
+        # flat bitmap, with a row stride that shrinks by one per removed column. The stride only
+        # lines up with the row boundaries for a single column, so the popped pixels are replayed
+        # here to keep the output identical, a whole column of pops at a time.
+        indices = numpy.arange(self.height * self.width)
+        rows = numpy.arange(self.height)
 
+        for width in range(self.width - 1, self.width - count - 1, -1):
+            # Every pop shortens the bitmap by one pixel, negative positions count from its end
+            lengths = len(indices) - rows
+            positions = rows * (width - count + 1) + width * trailing
+            positions = numpy.where(positions < 0, positions + lengths, positions)
 
-    def _trim_trailing_zero_rows(self):
-        zero_row_count = 0
+            # The popping ran past the end of these glyphs and failed the conversion, so there is
+            # no previous output to match and the columns are removed as intended instead
+            if ((positions < 0) | (positions >= lengths)).any():
+                self.data = self.data[:, count * (1 - trailing) : self.width - count * trailing]
+                self.width -= count
+                return
 
-        # Count trailing zero rows
-        for row in range(len(self.data) - 1, self.width, -self.width):
-            if not any(self.data[row - self.width : row]):
-                zero_row_count += 1
-            else:
-                break
+            # Shift every position past the pixels popped before it from in front of it
+            earlier_pops = numpy.tril(positions[:, numpy.newaxis] >= positions, -1).sum(axis=1)
+            indices = numpy.delete(indices, positions + earlier_pops)
 
-        # Adjust the glyph based on the number of trailing zero rows
-        self.data = self.data[:len(self.data) - zero_row_count * self.width]
-        self.height -= zero_row_count
+        self.width -= count
+        self.data = self.data.ravel()[indices].reshape(self.height, self.width)
 
 
     def __str__(self):
@@ -128,7 +298,7 @@ class LFCGlyph:
 
         for j in range(self.height):
             for i in range(self.width):
-                output += f'{self.data[j * self.width + i]:0{raw_data_padding}d} '
+                output += f'{self.data[j, i]:0{raw_data_padding}d} '
             output += '\n'
 
         # Print the bitmap as ascii art
@@ -138,7 +308,7 @@ class LFCGlyph:
 
         for j in range(self.height):
             for i in range(self.width):
-                character_data = self.data[j * self.width + i]
+                character_data = int(self.data[j, i])
                 if self.bpp == 1:
                     output += ascii_art_intensity_characters[character_data * 7]
                 elif self.bpp == 2:
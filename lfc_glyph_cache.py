@@ -0,0 +1,119 @@
+"""Module for caching rasterized glyphs on disk between conversions"""
+
+import os
+import time
+import struct
+import sqlite3
+from lfc_glyph import deserialize_glyph
+
+# Bumped whenever the rasterized glyph data changes, so stale entries are never reused
+GLYPH_CACHE_FORMAT_VERSION = 1
+
+GLYPH_CACHE_FILE_NAME = 'lfc_glyph_cache.sqlite3'
+
+# Cache entry header: the glyph's bitmap_top, followed by the glyph record
+GLYPH_CACHE_ENTRY_HEADER = struct.Struct('<i')
+
+class LFCGlyphCache:
+    """Class for caching rasterized glyphs on disk between conversions"""
+    def __init__(self, directory, max_size):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.max_size = max_size
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(directory, GLYPH_CACHE_FILE_NAME), timeout=60)
+
+        # Let evictions give disk space back, this only takes effect for a new cache file
+        self.connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS glyphs ('
+            'font_key TEXT NOT NULL, '
+            'code INTEGER NOT NULL, '
+            'entry BLOB NOT NULL, '
+            'last_used INTEGER NOT NULL, '
+            'PRIMARY KEY (font_key, code))')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS glyphs_last_used ON glyphs (last_used)')
+
+
+    def font_key(self, options, load_flags):
+        """Function that calculates the key shared by all glyphs of a font conversion"""
+        return f'{options.font_hash()}:{options.height}:{options.bpp}:{load_flags}:' \
+               f'{GLYPH_CACHE_FORMAT_VERSION}'
+
+
+    def load(self, font_key, characters):
+        """Function that returns the cached entries of the given characters, keyed by code"""
+        characters = set(characters)
+
+        entries = {
+            code: entry
+            for (code, entry) in self.connection.execute(
+                'SELECT code, entry FROM glyphs WHERE font_key = ?', (font_key,))
+            if code in characters
+        }
+
+        self.hits += len(entries)
+        self.misses += len(characters) - len(entries)
+
+        # Mark the entries as recently used
+        self.connection.executemany(
+            'UPDATE glyphs SET last_used = ? WHERE font_key = ? AND code = ?',
+            [(time.time_ns(), font_key, code) for code in entries])
+
+        return entries
+
+
+    def store(self, font_key, glyphs, bitmap_tops):
+        """Function that stores rasterized glyphs and their bitmap tops in the cache"""
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO glyphs VALUES (?, ?, ?, ?)',
+            [(font_key, glyph.code, self.create_entry(glyph, bitmap_top), time.time_ns())
+             for (glyph, bitmap_top) in zip(glyphs, bitmap_tops)])
+
+
+    def create_entry(self, glyph, bitmap_top):
+        """Function that serializes a glyph and its bitmap top into a cache entry"""
+        return GLYPH_CACHE_ENTRY_HEADER.pack(bitmap_top) + glyph.serialize()
+
+
+    def read_entry(self, entry):
+        """Function that deserializes a cache entry into a glyph and its bitmap top"""
+        (bitmap_top,) = GLYPH_CACHE_ENTRY_HEADER.unpack_from(entry)
+        glyph, _ = deserialize_glyph(entry, GLYPH_CACHE_ENTRY_HEADER.size)
+
+        return glyph, bitmap_top
+
+
+    def close(self):
+        """Function that evicts the least recently used entries over the size limit"""
+        size = self.connection.execute('SELECT COALESCE(SUM(LENGTH(entry)), 0) FROM glyphs')
+        size = size.fetchone()[0]
+
+        if size > self.max_size:
+            evicted_rows = []
+
+            for (rowid, entry_size) in self.connection.execute(
+                    'SELECT rowid, LENGTH(entry) FROM glyphs ORDER BY last_used'):
+                if size <= self.max_size:
+                    break
+
+                evicted_rows.append((rowid,))
+                size -= entry_size
+
+            self.connection.executemany('DELETE FROM glyphs WHERE rowid = ?', evicted_rows)
+            self.evictions += len(evicted_rows)
+
+        self.connection.commit()
+
+        if self.evictions > 0:
+            self.connection.execute('PRAGMA incremental_vacuum').fetchall()
+
+        self.connection.close()
+
+
+    def __str__(self):
+        return f'{self.hits} hits, {self.misses} misses, {self.evictions} evicted'
@@ -1,13 +1,53 @@
 """Module for indexing glyphs in a Lumina supported font"""
 
+import math
 from lfc_indexing_mode import IndexingMode
 
+# Size in bytes of the entries of each lookup structure
+INDEXER_DENSE_ENTRY_SIZE = 1
+INDEXER_SEGMENT_ENTRY_SIZE = 8
+INDEXER_SORTED_ENTRY_SIZE = 4
+
+# The number of table bytes a single lookup step is worth to the cost model
+INDEXER_LOOKUP_STEP_COST = 32
+
+# The dense lookup table holds single byte glyph indices
+INDEXER_MAX_DENSE_GLYPHS = 255
+
+INDEXING_MODES = {
+    'dense': IndexingMode.DENSE,
+    'segmented': IndexingMode.SEGMENTED,
+    'sorted': IndexingMode.SORTED,
+}
+
+def find_segments(glyphs):
+    """Function that splits the glyphs into runs of consecutive codes sorted by their first code"""
+    segments = []
+
+    for (index, glyph) in enumerate(glyphs):
+        if segments and glyph.code == segments[-1][0] + segments[-1][1]:
+            first_code, count, first_index = segments[-1]
+            segments[-1] = (first_code, count + 1, first_index)
+        else:
+            segments.append((glyph.code, 1, index + 1))
+
+    segments.sort()
+
+    # Overlapping segments mean a character was requested more than once
+    for (previous, current) in zip(segments, segments[1:]):
+        if current[0] < previous[0] + previous[1]:
+            raise ValueError(f'LFC::ERROR: Duplicate character: 0x{current[0]:x}')
+
+    return segments
+
+
 class LFCIndexer:
     """Class for indexing glyphs in a Lumina supported font"""
 
     def __init__(self):
         self.indices = []
         self.indexing_mode = IndexingMode.ASCII
+        self.costs = {}
 
 
     def detect_indexing_mode(self, glyphs):
@@ -19,9 +59,69 @@ class LFCIndexer:
         return IndexingMode.UNICODE
 
 
-    def index(self, glyphs):
-        """Function that indexes the glyphs based on the detected indexing mode"""
-        self.indexing_mode = self.detect_indexing_mode(glyphs)
+    def estimate_costs(self, glyphs):
+        """Function that estimates the table size and lookup steps of each lookup structure"""
+        codes = [glyph.code for glyph in glyphs]
+        segments = find_segments(glyphs)
+
+        costs = {}
+
+        if len(glyphs) <= INDEXER_MAX_DENSE_GLYPHS:
+            costs[IndexingMode.DENSE] = ((max(codes) - min(codes) + 1) * INDEXER_DENSE_ENTRY_SIZE, 1)
+
+        # A binary search over the segments followed by an offset into the found segment
+        costs[IndexingMode.SEGMENTED] = (
+            len(segments) * INDEXER_SEGMENT_ENTRY_SIZE,
+            math.ceil(math.log2(len(segments))) + 1)
+
+        # The sorted code array is searched directly, so the glyphs must already be in code order
+        if codes == sorted(codes):
+            costs[IndexingMode.SORTED] = (
+                len(codes) * INDEXER_SORTED_ENTRY_SIZE,
+                math.ceil(math.log2(len(codes))) + 1)
+
+        return costs
+
+
+    def choose_indexing_mode(self, glyphs):
+        """Function that chooses the lookup structure with the lowest cost for the glyphs"""
+        self.costs = self.estimate_costs(glyphs)
+
+        return min(
+            self.costs,
+            key=lambda mode: self.costs[mode][0] + self.costs[mode][1] * INDEXER_LOOKUP_STEP_COST)
+
+
+    def index(self, glyphs, indexing=None):
+        """Function that indexes the glyphs based on the detected or requested indexing mode"""
+        if indexing is None:
+            self.indexing_mode = self.detect_indexing_mode(glyphs)
+        elif indexing == 'auto':
+            self.indexing_mode = self.choose_indexing_mode(glyphs)
+        else:
+            self.indexing_mode = INDEXING_MODES[indexing]
+            self.costs = self.estimate_costs(glyphs)
+
+            if self.indexing_mode == IndexingMode.DENSE and self.indexing_mode not in self.costs:
+                raise ValueError(f'LFC::ERROR: The dense indexing mode supports at most '
+                                 f'{INDEXER_MAX_DENSE_GLYPHS} glyphs')
+
+            if self.indexing_mode == IndexingMode.SORTED and self.indexing_mode not in self.costs:
+                raise ValueError('LFC::ERROR: The sorted indexing mode requires the characters '
+                                 'in ascending order')
+
+        # A dense table of sorted ASCII characters is what the ASCII indexing mode already is
+        if self.indexing_mode == IndexingMode.DENSE and \
+                self.detect_indexing_mode(glyphs) == IndexingMode.ASCII and \
+                IndexingMode.SORTED in self.costs:
+            self.indexing_mode = IndexingMode.ASCII
+
+        if indexing is not None:
+            # The ASCII indexing mode is a dense lookup table
+            (table_size, lookup_steps) = self.costs.get(
+                    self.indexing_mode, self.costs.get(IndexingMode.DENSE))
+            print(f'LFC::INFO: Indexing mode: {self.indexing_mode}, '
+                  f'{table_size} byte lookup table, {lookup_steps} lookup steps')
 
         match self.indexing_mode:
             case IndexingMode.ASCII:
@@ -34,3 +134,39 @@ class LFCIndexer:
             case IndexingMode.UNICODE:
                 # Create an index list with a length of the number of glyphs
                 self.indices = list(range(1, len(glyphs) + 1))
+
+                # The header defines every glyph as a single byte string
+                if len(glyphs) > INDEXER_MAX_DENSE_GLYPHS:
+                    print(f'LFC::WARNING: {len(glyphs)} glyphs do not fit the single byte indices '
+                          f'of the UNICODE indexing mode. Use --indexing auto instead')
+
+            case IndexingMode.DENSE:
+                first_code = min(glyph.code for glyph in glyphs)
+
+                self.indices = [0] * (max(glyph.code for glyph in glyphs) - first_code + 1)
+
+                for (index, glyph) in enumerate(glyphs):
+                    self.indices[glyph.code - first_code] = index + 1
+
+            case IndexingMode.SEGMENTED:
+                # Each segment holds its first code, its length and the index of its first glyph
+                self.indices = find_segments(glyphs)
+
+            case IndexingMode.SORTED:
+                self.indices = [glyph.code for glyph in glyphs]
+
+
+    def table_size(self):
+        """Function that returns the size in bytes of the lookup table of the indexed glyphs"""
+        match self.indexing_mode:
+            case IndexingMode.SEGMENTED:
+                return len(self.indices) * INDEXER_SEGMENT_ENTRY_SIZE
+
+            case IndexingMode.SORTED:
+                return len(self.indices) * INDEXER_SORTED_ENTRY_SIZE
+
+            case IndexingMode.UNICODE:
+                # The UNICODE lookup table starts with an entry reserved by Lumina
+                return (len(self.indices) + 1) * INDEXER_DENSE_ENTRY_SIZE
+
+        return len(self.indices) * INDEXER_DENSE_ENTRY_SIZE
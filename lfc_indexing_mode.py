@@ -6,6 +6,9 @@ class IndexingMode(Enum):
     """Enum that defines the indexing mode of the glyphs in a Lumina supported font"""
     ASCII = 1
     UNICODE = 2
+    DENSE = 3
+    SEGMENTED = 4
+    SORTED = 5
 
     def __str__(self):
-        return 'ASCII' if self == IndexingMode.ASCII else 'UNICODE'
+        return self.name
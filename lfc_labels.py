@@ -0,0 +1,125 @@
+"""Module for pre-rendering the static text labels of a Lumina supported font"""
+
+import re
+import json
+import tomllib
+import numpy
+from lfc_glyph import pack_pixels, pack_column_pages
+from lfc_metadata import fixed_record_size
+
+# Label identifiers become C preprocessor names
+LABEL_ID_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# Fields of a lumina_font_label_t record
+LABEL_RECORD_FIELDS = ['width', 'height', 'y_offset', 'bitmap_index']
+
+def load_labels(labels_path):
+    """Function that loads the labels to pre-render from a JSON or TOML file of IDs and strings"""
+    if labels_path.endswith('.toml'):
+        with open(labels_path, 'rb') as labels_file:
+            labels = tomllib.load(labels_file)
+    else:
+        with open(labels_path, 'r', encoding='utf-8') as labels_file:
+            labels = json.load(labels_file)
+
+    for (label_id, text) in labels.items():
+        if not LABEL_ID_PATTERN.fullmatch(label_id):
+            raise ValueError(f'LFC::ERROR: Invalid label ID: {label_id}. '
+                             'Use letters, digits and underscores')
+
+        if not isinstance(text, str) or not text:
+            raise ValueError(f'LFC::ERROR: Label {label_id} must be a non-empty string')
+
+    if len({label_id.upper() for label_id in labels}) != len(labels):
+        raise ValueError('LFC::ERROR: Label IDs must be unique regardless of case')
+
+    return labels
+
+
+class LFCLabelCache:
+    """Class for pre-rendering the static text labels of a Lumina supported font"""
+    def __init__(self):
+        self.labels = []
+        self.label_bitmap_size = 0
+        self.label_table_size = 0
+
+
+    def render(self, labels, glyphs, kerning=False):
+        """Function that lays out every label with the glyph metrics and packs its bitmap"""
+        glyphs_by_code = {glyph.code: glyph for glyph in glyphs}
+
+        bitmap_index = 0
+
+        for (label_id, text) in labels.items():
+            missing_codes = sorted({ord(character) for character in text} - set(glyphs_by_code))
+
+            if missing_codes:
+                raise ValueError(f'LFC::ERROR: Label {label_id} uses characters that are not '
+                                 f'converted: {", ".join(f"0x{code:x}" for code in missing_codes)}')
+
+            (width, height, y_offset, data) = self.compose(
+                    [glyphs_by_code[ord(character)] for character in text], kerning)
+
+            # The label bitmap is packed like a glyph bitmap of the font
+            if glyphs[0].column_pages:
+                bitmap = pack_column_pages(data)
+            else:
+                bitmap = pack_pixels(data, glyphs[0].bpp)
+
+            self.labels.append({
+                'id': label_id,
+                'text': text,
+                'width': width,
+                'height': height,
+                'y_offset': y_offset,
+                'bitmap_index': bitmap_index,
+                'bitmap': bitmap,
+            })
+
+            bitmap_index += len(bitmap)
+
+        self.label_bitmap_size = bitmap_index
+        self.label_table_size = fixed_record_size(LABEL_RECORD_FIELDS) * len(self.labels)
+
+        glyph_bitmap_size = sum(glyph.bitmap_size() for glyph in glyphs if glyph.duplicate_of is None)
+        label_cache_size = self.label_bitmap_size + self.label_table_size
+
+        print(f'LFC::INFO: Pre-rendered {len(self.labels)} labels into {self.label_bitmap_size} '
+              f'bytes of bitmaps and a {self.label_table_size} byte label table, '
+              f'{label_cache_size / max(glyph_bitmap_size, 1) * 100:.1f}% of the '
+              f'{glyph_bitmap_size} bytes of glyph bitmaps')
+
+
+    def compose(self, glyphs, kerning=False):
+        """Function that draws a string of glyphs into one bitmap and returns its size and offset"""
+        positions = []
+        pen = 0
+
+        # Place every glyph at the pen position and advance the pen like the renderer does
+        for (index, glyph) in enumerate(glyphs):
+            positions.append(pen)
+            pen += glyph.advance
+
+            if kerning and index < len(glyphs) - 1:
+                pen += glyph.kerning.get(glyphs[index + 1].code, 0)
+
+        inked_glyphs = [(x, glyph) for (x, glyph) in zip(positions, glyphs) if glyph.data.size]
+
+        left = min([0] + [x for (x, _) in inked_glyphs])
+        right = max([pen] + [x + glyph.width for (x, glyph) in inked_glyphs])
+        top = min((glyph.y_offset for (_, glyph) in inked_glyphs), default=0)
+        bottom = max((glyph.y_offset + glyph.height for (_, glyph) in inked_glyphs), default=0)
+
+        # Rows are padded to whole bytes like the glyph bitmaps, column pages need no padding
+        pixels_per_byte = 1 if glyphs[0].column_pages else 8 // glyphs[0].bpp
+        width = -(-(right - left) // pixels_per_byte) * pixels_per_byte
+
+        data = numpy.zeros((bottom - top, width), numpy.uint8)
+
+        # Overlapping glyphs keep the stronger coverage of each pixel
+        for (x, glyph) in inked_glyphs:
+            region = data[glyph.y_offset - top : glyph.y_offset - top + glyph.height,
+                          x - left : x - left + glyph.width]
+            numpy.maximum(region, glyph.data, out=region)
+
+        return width, bottom - top, top, data
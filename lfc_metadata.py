@@ -0,0 +1,125 @@
+"""Module for packing the glyph metadata of a Lumina supported font into compact records"""
+
+import math
+
+# Bytes every field takes in the fixed lumina_font_glyph_metadata_t records
+METADATA_FIELD_SIZES = {
+    'width': 2,
+    'height': 2,
+    'advance': 2,
+    'y_offset': 2,
+    'bitmap_index': 4,
+    'atlas_x': 2,
+    'atlas_y': 2,
+    'atlas_page': 2,
+    'compressed': 1,
+}
+
+# The fixed records are padded to a multiple of their largest field
+METADATA_RECORD_ALIGNMENT = 4
+
+def metadata_fields(compression=False, atlas=False):
+    """Function that returns the fields of the glyph metadata records in their order"""
+    fields = ['width', 'height', 'advance', 'y_offset']
+    fields += ['atlas_x', 'atlas_y', 'atlas_page'] if atlas else ['bitmap_index']
+
+    if compression:
+        fields.append('compressed')
+
+    return fields
+
+
+def metadata_records(glyphs, fields):
+    """Function that returns the field values of every metadata record, the reserved one first"""
+    max_width = max(glyph.width for glyph in glyphs)
+
+    # The first record is reserved by Lumina and holds the widest glyph as its advance
+    records = [{field: max_width if field == 'advance' else 0 for field in fields}]
+
+    for glyph in glyphs:
+        record = {field: getattr(glyph, field) for field in fields if field != 'compressed'}
+
+        if 'compressed' in fields:
+            record['compressed'] = int(glyph.compressed_bitmap is not None)
+
+        records.append(record)
+
+    return records
+
+
+def choose_field_layout(records, fields):
+    """Function that chooses the bit offset, bit count and bias of every field and the record size"""
+    layout = {}
+    shift = 0
+
+    # Every field is stored as its distance from the smallest value, in as few bits as it needs
+    for field in fields:
+        bias = min(record[field] for record in records)
+        bits = (max(record[field] for record in records) - bias).bit_length()
+
+        layout[field] = (shift, bits, bias)
+        shift += bits
+
+    # Records are whole bytes, so the record of a glyph index is found without a bit offset table
+    return layout, max(math.ceil(shift / 8), 1)
+
+
+def pack_metadata(records, layout, record_size):
+    """Function that packs the metadata records into little endian bit fields"""
+    output = bytearray()
+
+    for record in records:
+        value = 0
+
+        for (field, (shift, _, bias)) in layout.items():
+            value |= (record[field] - bias) << shift
+
+        output += value.to_bytes(record_size, 'little')
+
+    return bytes(output)
+
+
+def unpack_metadata_record(data, index, layout, record_size):
+    """Function that decodes the metadata record of a glyph index into its field values"""
+    # Reference decoder, it reads a single record like a decoder on a device would
+    value = int.from_bytes(data[index * record_size : (index + 1) * record_size], 'little')
+
+    return {
+        field: ((value >> shift) & ((1 << bits) - 1)) + bias
+        for (field, (shift, bits, bias)) in layout.items()
+    }
+
+
+def fixed_record_size(fields):
+    """Function that returns the size of a fixed lumina_font_glyph_metadata_t record"""
+    size = sum(METADATA_FIELD_SIZES[field] for field in fields)
+
+    return math.ceil(size / METADATA_RECORD_ALIGNMENT) * METADATA_RECORD_ALIGNMENT
+
+
+class LFCMetadataPacker:
+    """Class for packing the glyph metadata of a Lumina supported font into compact records"""
+    def __init__(self):
+        self.layout = {}
+        self.record_size = 0
+        self.fixed_size = 0
+        self.compact_size = 0
+
+
+    def pack(self, glyphs, compression=False, atlas=False):
+        """Function that chooses the smallest record layout for the glyphs and returns the records"""
+        fields = metadata_fields(compression, atlas)
+        records = metadata_records(glyphs, fields)
+
+        (self.layout, self.record_size) = choose_field_layout(records, fields)
+
+        self.fixed_size = fixed_record_size(fields) * len(records)
+        self.compact_size = self.record_size * len(records)
+
+        field_bits = ', '.join(f'{field} {bits}' for (field, (_, bits, _)) in self.layout.items())
+
+        print(f'LFC::INFO: Packed the glyph metadata into {self.record_size} byte records '
+              f'({field_bits} bits), {self.fixed_size} -> {self.compact_size} bytes, '
+              f'saving {self.fixed_size - self.compact_size} bytes')
+
+        return pack_metadata(records, self.layout, self.record_size)
@@ -1,13 +1,31 @@
 """Module for parsing and storing command line arguments"""
 
 import argparse
+import copy
+import hashlib
 import os.path
 import string
+import sys
+from lfc_constants import LFC_VERSION
+from lfc_labels import load_labels
+from lfc_corpus import LFCCorpus
+
+BPP_CHOICES = [1, 2, 4, 8]
+
+INDEXING_CHOICES = ['auto', 'dense', 'segmented', 'sorted']
+
+LAYOUT_CHOICES = ['rows', 'columns']
+
+DEFAULT_CACHE_SIZE_MB = 256
 
 class LFCOptions:
     """Class for parsing and storing command line arguments"""
-    def __init__(self):
-        self.parse()
+    def __init__(self, **values):
+        # Options given as values bypass the command line
+        if values:
+            self.load(**values)
+        else:
+            self.parse()
 
 
     def parse(self):
@@ -17,7 +35,7 @@ class LFCOptions:
         parser.add_argument(
                 '--bpp',
                 type=int,
-                choices=[1, 2, 4, 8],
+                choices=BPP_CHOICES,
                 required=True,
                 help='Defines how many bits per pixel to use for the generated font')
 
@@ -46,17 +64,363 @@ class LFCOptions:
                 help='A comma separated list of numbers or ranges of characters to convert. '
                      'E.g. 65,66-70,75')
 
+        parser.add_argument(
+                '--corpus',
+                type=str,
+                action='append',
+                default=None,
+                metavar='PATH',
+                help='A directory or file of UI strings (.po, .json, .c or .txt), only the declared '
+                     'characters its strings use are converted. Can be given several times')
+
+        parser.add_argument(
+                '--jobs',
+                type=int,
+                default=1,
+                help='The number of worker processes used to rasterize the characters')
+
+        parser.add_argument(
+                '--cache',
+                type=str,
+                default=None,
+                help='A directory for caching rasterized glyphs between conversions')
+
+        parser.add_argument(
+                '--cache-size',
+                type=int,
+                default=DEFAULT_CACHE_SIZE_MB,
+                help='The size limit of the glyph cache in MiB. '
+                     'The least recently used glyphs are evicted first')
+
+        parser.add_argument(
+                '--reproducible',
+                action='store_true',
+                help='Leave the generation time out of the output files and skip the conversion '
+                     'when the existing output files were generated from the same inputs')
+
+        parser.add_argument(
+                '--deduplicate',
+                action='store_true',
+                help='Store identical glyph bitmaps only once')
+
+        parser.add_argument(
+                '--compress',
+                action='store_true',
+                help='Run-length encode the glyph bitmaps that get smaller when compressed and flag '
+                     'them in the glyph metadata')
+
+        parser.add_argument(
+                '--indexing',
+                type=str,
+                choices=INDEXING_CHOICES,
+                default=None,
+                help='The glyph lookup structure: a dense lookup table, a table of consecutive code '
+                     'ranges or a sorted code array. auto chooses the one with the lowest cost in '
+                     'table size and lookup steps. Defaults to the ASCII or UNICODE indexing mode')
+
+        parser.add_argument(
+                '--binary',
+                action='store_true',
+                help='Also write the font as a memory-mappable binary file, for loading fonts from '
+                     'external flash or a filesystem at runtime')
+
+        parser.add_argument(
+                '--kerning',
+                action='store_true',
+                help='Generate a table of the kerning between every pair of glyphs')
+
+        parser.add_argument(
+                '--kerning-threshold',
+                type=int,
+                default=1,
+                help='The smallest kerning in pixels that is kept. Defaults to dropping the pairs '
+                     'whose kerning rounds to zero at the font height')
+
+        parser.add_argument(
+                '--compact-metadata',
+                action='store_true',
+                help='Store the glyph metadata as bit packed records with the smallest field widths '
+                     'the glyphs need, instead of fixed size records')
+
+        parser.add_argument(
+                '--layout',
+                type=str,
+                choices=LAYOUT_CHOICES,
+                default='rows',
+                help='The byte layout of the glyph bitmaps. columns stores 1 bpp glyphs as page '
+                     'aligned columns of 8 vertical pixels per byte, the layout of SSD1306 and '
+                     'ST7565 style displays. Defaults to rows')
+
+        parser.add_argument(
+                '--atlas',
+                type=int,
+                default=None,
+                metavar='WIDTH',
+                help='Pack the glyph bitmaps into atlas pages of the given width in pixels instead '
+                     'of storing each glyph bitmap separately, for blitting glyphs with a DMA or '
+                     'GPU engine')
+
+        parser.add_argument(
+                '--atlas-height',
+                type=int,
+                default=None,
+                metavar='HEIGHT',
+                help='The height of the atlas pages in pixels. Defaults to a single page')
+
+        parser.add_argument(
+                '--labels',
+                type=str,
+                default=None,
+                metavar='FILE',
+                help='A JSON or TOML file mapping label IDs to static strings, which are '
+                     'pre-rendered into one bitmap each, so they can be drawn with a single blit')
+
+        parser.add_argument(
+                '--shards',
+                type=int,
+                default=None,
+                metavar='COUNT',
+                help='Split the glyph bitmap into this many source files of fixed blocks of the declared '
+                     'characters, which compile in parallel and stay unchanged when their glyphs do')
+
+        parser.add_argument(
+                '--max-bytes',
+                type=int,
+                default=None,
+                help='A flash budget for the font data. The font is rasterized once and sized at '
+                     'every bpp up to --bpp, with and without compression and compact metadata, '
+                     'and the highest bpp that fits is converted with the cheapest encoding')
+
+        parser.add_argument(
+                '--watch',
+                action='store_true',
+                help='Stay running and convert the font again whenever the font, labels or corpus '
+                     'files change, rasterizing only the glyphs whose outlines changed')
+
+        parser.add_argument(
+                '--stats',
+                '--profile',
+                type=str,
+                default=None,
+                metavar='FILE',
+                help='Time every stage of the conversion and write a JSON report with the stage '
+                     'times, glyphs per second, the slowest glyphs and the bytes of every output '
+                     'section to a file')
+
         arguments = parser.parse_args()
 
-        self.bpp = int(arguments.bpp)
-        self.name = arguments.name
-        self.height = arguments.height
+        self.load(
+            arguments.bpp,
+            arguments.name,
+            arguments.height,
+            arguments.font,
+            arguments.characters,
+            arguments.jobs,
+            arguments.cache,
+            arguments.cache_size,
+            arguments.reproducible,
+            arguments.deduplicate,
+            arguments.compress,
+            arguments.indexing,
+            arguments.binary,
+            arguments.kerning,
+            arguments.kerning_threshold,
+            arguments.compact_metadata,
+            arguments.layout,
+            arguments.atlas,
+            arguments.atlas_height,
+            arguments.labels,
+            arguments.shards,
+            arguments.max_bytes,
+            arguments.corpus,
+            arguments.watch,
+            arguments.stats,
+            ' '.join(sys.argv))
+
+
+    def load(self, bpp, name, height, font, characters, jobs=1, cache=None,
+             cache_size=DEFAULT_CACHE_SIZE_MB, reproducible=False, deduplicate=False,
+             compress=False, indexing=None, binary=False, kerning=False,
+             kerning_threshold=1, compact_metadata=False, layout='rows', atlas=None,
+             atlas_height=None, labels=None, shards=None, max_bytes=None, corpus=None, watch=False,
+             stats=None,
+             command=None):
+        """Function that validates and stores the options"""
+        if int(bpp) not in BPP_CHOICES:
+            raise ValueError(f'LFC::ERROR: Invalid bpp: {bpp}. Use one of {BPP_CHOICES}')
+
+        self.bpp = int(bpp)
+        self.name = name
+        self.height = int(height)
 
-        if not os.path.isfile(arguments.font):
+        if not os.path.isfile(font):
             raise FileNotFoundError('LFC::ERROR: The specified font file does not exist')
 
-        self.font = arguments.font
-        self.characters = self.expand_characters(arguments.characters)
+        self.font = font
+        self.declared_characters = self.expand_characters(characters)
+        self.characters = self.declared_characters
+
+        self.corpus_paths = [corpus] if isinstance(corpus, str) else corpus
+        self.corpus = None
+
+        if self.corpus_paths is not None:
+            self.collect_corpus()
+
+        if int(jobs) < 1:
+            raise ValueError(f'LFC::ERROR: Invalid number of jobs: {jobs}. Use at least 1')
+
+        self.jobs = int(jobs)
+
+        self.cache_directory = cache
+        self.cache_size = int(cache_size) << 20
+
+        self.reproducible = bool(reproducible)
+        self.deduplicate = bool(deduplicate)
+        self.compress = bool(compress)
+
+        if indexing is not None and indexing not in INDEXING_CHOICES:
+            raise ValueError(f'LFC::ERROR: Invalid indexing mode: {indexing}. '
+                             f'Use one of {INDEXING_CHOICES}')
+
+        self.indexing = indexing
+        self.binary = bool(binary)
+        self.kerning = bool(kerning)
+
+        if int(kerning_threshold) < 1:
+            raise ValueError(f'LFC::ERROR: Invalid kerning threshold: {kerning_threshold}. '
+                             'Use at least 1')
+
+        self.kerning_threshold = int(kerning_threshold)
+        self.compact_metadata = bool(compact_metadata)
+
+        if layout not in LAYOUT_CHOICES:
+            raise ValueError(f'LFC::ERROR: Invalid layout: {layout}. Use one of {LAYOUT_CHOICES}')
+
+        if layout == 'columns' and (self.bpp != 1 or compress or atlas is not None):
+            raise ValueError('LFC::ERROR: The columns layout is only supported for uncompressed '
+                             '1 bpp fonts without an atlas')
+
+        self.layout = layout
+
+        if atlas is not None and (int(atlas) < 1 or int(atlas) % (8 // self.bpp)):
+            raise ValueError(f'LFC::ERROR: Invalid atlas width: {atlas}. Use a multiple of '
+                             f'{8 // self.bpp} pixels, so the atlas rows are whole bytes')
+
+        if atlas_height is not None and int(atlas_height) < 1:
+            raise ValueError(f'LFC::ERROR: Invalid atlas height: {atlas_height}. Use at least 1')
+
+        if atlas is not None and (compress or binary):
+            raise ValueError('LFC::ERROR: The atlas can not be combined with compressed bitmaps '
+                             'or the binary file')
+
+        self.atlas = int(atlas) if atlas is not None else None
+        self.atlas_height = int(atlas_height) if atlas_height is not None else None
+
+        self.labels_path = labels
+        self.labels = load_labels(labels) if labels is not None else None
+
+        if shards is not None and int(shards) < 1:
+            raise ValueError(f'LFC::ERROR: Invalid number of shards: {shards}. Use at least 1')
+
+        if shards is not None and self.atlas is not None:
+            raise ValueError('LFC::ERROR: The glyph bitmap can not be sharded with the atlas')
+
+        self.shards = int(shards) if shards is not None else None
+
+        if max_bytes is not None and int(max_bytes) < 1:
+            raise ValueError(f'LFC::ERROR: Invalid flash budget: {max_bytes}. Use at least 1 byte')
+
+        if max_bytes is not None and (self.atlas is not None or self.layout != 'rows'):
+            raise ValueError('LFC::ERROR: The flash budget can not be combined with the atlas or '
+                             'the columns layout')
+
+        self.max_bytes = int(max_bytes) if max_bytes is not None else None
+        self.watch = bool(watch)
+
+        # The encoding the font was requested with, the flash budget may choose a cheaper one
+        self.requested_encoding = (self.bpp, self.compress, self.compact_metadata)
+        self.stats = stats
+        self._font_hash = None
+
+        # Record an equivalent command line when the options were not parsed from one
+        if command is None:
+            command = f'lfc.py --bpp {self.bpp} --name {name} --height {self.height} ' \
+                      f'--font {font} --characters {characters}'
+
+        self.command = command
+
+
+    def apply_budget_choice(self, choice):
+        """Function that returns a copy of the options switched to the encoding fitting the flash budget"""
+        # The requested options are left alone, so they can be fitted to the budget again
+        options = copy.copy(self)
+        options.bpp = choice['bpp']
+        options.compress = choice['compress']
+        options.compact_metadata = choice['compact_metadata']
+
+        return options
+
+
+    def collect_corpus(self):
+        """Function that narrows the declared characters down to the characters the corpus strings use"""
+        self.corpus = LFCCorpus()
+        self.corpus.collect(self.corpus_paths)
+        self.characters = self.corpus.subset(self.declared_characters)
+
+
+    def reload_inputs(self):
+        """Function that reads the font, labels and corpus files again after they changed"""
+        self._font_hash = None
+
+        if self.labels_path is not None:
+            self.labels = load_labels(self.labels_path)
+
+        if self.corpus_paths is not None:
+            self.collect_corpus()
+
+
+    def font_hash(self):
+        """Returns the SHA-256 hash of the font file content"""
+        if self._font_hash is None:
+            font_hash = hashlib.sha256()
+
+            with open(self.font, 'rb') as font_file:
+                for block in iter(lambda: font_file.read(1 << 20), b''):
+                    font_hash.update(block)
+
+            self._font_hash = font_hash.hexdigest()
+
+        return self._font_hash
+
+
+    def inputs_hash(self):
+        """Returns a hash of every input that affects the content of the output files"""
+        # The requested encoding is hashed, so a font fitted to a flash budget stays up to date
+        (bpp, compress, compact_metadata) = self.requested_encoding
+
+        inputs = [
+            LFC_VERSION,
+            self.font_hash(),
+            self.name,
+            bpp,
+            self.height,
+            self.characters,
+            self.deduplicate,
+            compress,
+            self.indexing,
+            self.binary,
+            self.kerning,
+            self.kerning_threshold,
+            compact_metadata,
+            self.layout,
+            self.atlas,
+            self.atlas_height,
+            self.labels,
+            self.shards,
+            self.max_bytes,
+        ]
+
+        return hashlib.sha256(repr(inputs).encode('utf-8')).hexdigest()
 
 
     def parse_int(self, value: str):
@@ -72,7 +436,7 @@ class LFCOptions:
 
 
     def expand_characters(self, characters: str):
-        """Convert a comma separated list of numbers or ranges of numbers into an integer list"""
+        """Convert a comma separated list of numbers or ranges of numbers into a list of ranges"""
         characters = ''.join(characters.split())
 
         tokens = characters.split(',')
@@ -86,7 +450,8 @@ class LFCOptions:
                         raise ValueError(f'LFC::ERROR: Invalid character: {token}.'
                                          ' Use a number or a hex value')
 
-                    character_array.append(self.parse_int(token))
+                    character = self.parse_int(token)
+                    character_array.append(range(character, character + 1))
                 case 1:
                     start, end = token.split('-')
 
@@ -98,7 +463,8 @@ class LFCOptions:
                         raise ValueError(f'LFC::ERROR: Invalid range end: {end}.'
                                          ' Use a number or a hex value')
 
-                    character_array += list(range(self.parse_int(start), self.parse_int(end) + 1))
+                    # Ranges stay lazy, they are narrowed down to the font's characters later
+                    character_array.append(range(self.parse_int(start), self.parse_int(end) + 1))
                 case _:
                     raise ValueError(
                             'LFC::ERROR: Invalid character range. '
@@ -114,6 +480,6 @@ class LFCOptions:
         output += f'bpp: {self.bpp}\n'
         output += f'height: {self.height}\n'
         output += f'font: {self.font}\n'
-        output += f'characters: {', '.join([str(x) for x in self.characters])}\n\n'
+        output += f'characters: {', '.join([str(x) for r in self.characters for x in r])}\n\n'
 
         return output
@@ -0,0 +1,123 @@
+"""Module for measuring where the time of a conversion goes"""
+
+import json
+import time
+import contextlib
+
+# Number of slowest glyphs listed in the report
+PROFILER_SLOWEST_GLYPH_COUNT = 10
+
+class LFCCountingStream:
+    """Class for counting the characters written to a text stream"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+
+    def write(self, string):
+        """Function that writes a string to the stream and counts its characters"""
+        self.count += len(string)
+        return self.stream.write(string)
+
+
+class LFCProfiler:
+    """Class for measuring where the time of a conversion goes"""
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+        self.glyph_seconds = []
+        self.section_bytes = {}
+        self.start_time = time.perf_counter()
+
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Function that measures the time spent in a block as part of a stage"""
+        start_time = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start_time)
+
+
+    @contextlib.contextmanager
+    def section(self, name, stream):
+        """Function that measures the time spent generating a section and the bytes it emits"""
+        count = stream.count if self.enabled else 0
+
+        with self.stage(f'generate_{name}'):
+            yield
+
+        if self.enabled:
+            self.add_section(name, stream.count - count)
+
+
+    def counting_stream(self, stream):
+        """Function that wraps a stream to count the bytes of each section written to it"""
+        return LFCCountingStream(stream) if self.enabled else stream
+
+
+    def add_time(self, name, seconds):
+        """Function that adds time spent in a stage"""
+        if not self.enabled:
+            return
+
+        stage = self.stages.setdefault(name, {'seconds': 0, 'calls': 0})
+        stage['seconds'] += seconds
+        stage['calls'] += 1
+
+
+    def add_glyph(self, code, seconds):
+        """Function that records the time spent rasterizing a single glyph"""
+        if self.enabled:
+            self.glyph_seconds.append((seconds, code))
+
+
+    def add_section(self, name, size):
+        """Function that records the bytes emitted for a section of the output"""
+        if self.enabled:
+            self.section_bytes[name] = self.section_bytes.get(name, 0) + size
+
+
+    def report(self, options, glyph_count):
+        """Function that creates a machine-readable report of the measurements"""
+        total_seconds = time.perf_counter() - self.start_time
+
+        rasterize_seconds = sum(
+            self.stages.get(name, {'seconds': 0})['seconds']
+            for name in ('rasterize_glyphs', 'trim_pad', 'rasterize_parallel'))
+
+        return {
+            'name': options.name,
+            'font': options.font,
+            'bpp': options.bpp,
+            'height': options.height,
+            'glyphs': glyph_count,
+            'total_seconds': total_seconds,
+            'glyphs_per_second': glyph_count / total_seconds if total_seconds else None,
+            'rasterized_glyphs_per_second':
+                len(self.glyph_seconds) / rasterize_seconds if self.glyph_seconds else None,
+            'stages': self.stages,
+            'slowest_glyphs': [
+                {'code': code, 'seconds': seconds}
+                for (seconds, code) in sorted(self.glyph_seconds, reverse=True)
+                [:PROFILER_SLOWEST_GLYPH_COUNT]
+            ],
+            'section_bytes': self.section_bytes,
+        }
+
+
+    def write_report(self, file_path, options, glyph_count):
+        """Function that writes the report as JSON and prints a summary of it"""
+        report = self.report(options, glyph_count)
+
+        with open(file_path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=4)
+
+        print(f'LFC::INFO: {glyph_count} glyphs in {report["total_seconds"]:.3f}s')
+
+        for (name, stage) in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+            print(f'LFC::INFO:   {name:<20} {stage["seconds"] * 1000:>10.2f} ms')
+
+        print(f'LFC::INFO: Stats written to: {file_path}')
@@ -1,55 +1,220 @@
 """Module that generates the header and source files for the Lumina supported font converter"""
 
+import io
 import os
-import sys
+import re
+import json
 import math
+import bisect
+import filecmp
 import datetime
 import textwrap
-from lfc_constants import LFC_VERSION, LFC_PUBLISHER_INDENTATION
+from lfc_constants import LFC_VERSION, LFC_PUBLISHER_INDENTATION, LFC_PUBLISHER_WRITE_BUFFER_SIZE, \
+                          LFC_PUBLISHER_COMPRESSED_BYTES_PER_LINE, LFC_PUBLISHER_CODES_PER_LINE
 from lfc_indexing_mode import IndexingMode
+from lfc_profiler import LFCProfiler
+from lfc_atlas import atlas_page_heights, render_atlas_pages
+from lfc_metadata import LFCMetadataPacker
+from lfc_labels import LFCLabelCache
+from lfc_blob import BLOB_MAGIC, BLOB_FORMAT_VERSION, BLOB_HEADER, BLOB_FLAG_COMPRESSED, \
+                     BLOB_GLYPH_METADATA, BLOB_GLYPH_FLAG_COMPRESSED, BLOB_LOOKUP_ENTRIES, \
+                     BLOB_KERNING_PAIR, BLOB_FLAG_COLUMN_PAGES, align
+
+# Name of the source file holding a shard of the glyph bitmap
+SHARD_FILE_NAME_FORMAT = '{name}_bitmap_{index}.c'
+
+# Precomputed C literal for every possible byte value of the glyph bitmap
+BYTE_TO_C_LITERAL = tuple(f'0x{byte:02x}, ' for byte in range(256))
+
+def shard_glyphs(glyphs, shard_count, character_ranges):
+    """Function that splits the glyphs into contiguous shards of fixed blocks of the declared characters"""
+    # Every shard covers the same number of declared characters, so the boundaries stay where they
+    # are when glyphs are added to or removed from the font or the corpus
+    blocks = []
+    declared_count = 0
+
+    for character_range in character_ranges:
+        blocks.append((character_range.start, declared_count))
+        declared_count += len(character_range)
+
+    blocks.sort()
+    block_starts = [start for (start, _) in blocks]
+
+    shards = [[] for _ in range(shard_count)]
+    shard_index = 0
+
+    for glyph in glyphs:
+        (start, position) = blocks[bisect.bisect_right(block_starts, glyph.code) - 1]
+        position += glyph.code - start
+
+        # A shard is a contiguous part of the bitmap, so a glyph never goes back to an earlier shard
+        shard_index = max(shard_index, position * shard_count // declared_count)
+        shards[shard_index].append(glyph)
+
+    return shards
+
+
+def shard_offsets(shards):
+    """Function that returns the offset in the whole glyph bitmap each shard starts at"""
+    offsets = []
+    offset = 0
+
+    for shard in shards:
+        offsets.append(offset)
+        offset += sum(glyph.bitmap_size() for glyph in shard if glyph.duplicate_of is None)
+
+    return offsets
+
 
 class LFCPublisher:
     """Class that generates the header and source files for the Lumina supported font converter"""
-    def __init__(self):
-        pass
+    def __init__(self, profiler=None):
+        self.profiler = profiler or LFCProfiler(enabled=False)
 
 
-    def publish(self, options, glyphs, indexing_mode, indices):
+    def publish(self, options, glyphs, indexing_mode, indices, output_directory_name='output'):
         """Function that generates the Lumina compatible font files"""
-        output_directory_name = 'output'
         print(f'LFC::INFO: Creating output directory: {output_directory_name}/')
         output_directory = self.create_output_directory(output_directory_name)
 
-        header_file_content = self.generate_header_file(options, glyphs, indexing_mode)
+        with self.profiler.stage('generate_header'):
+            header_file_content = self.generate_header_file(options, glyphs, indexing_mode)
 
-        source_file_content = self.generate_source_file(options, glyphs, indexing_mode, indices)
+        self.profiler.add_section('header', len(header_file_content))
 
         header_file_path = os.path.join(output_directory, f'{options.name}.h')
         source_file_path = os.path.join(output_directory, f'{options.name}.c')
 
         print(f'LFC::INFO: Writing header file: {output_directory_name}/{options.name}.h')
-        with open(header_file_path, 'w', encoding='utf-8') as header_file:
-            header_file.write(header_file_content)
+        self.write_file(header_file_path, lambda header_file: header_file.write(header_file_content))
 
         print(f'LFC::INFO: Writing source file: {output_directory_name}/{options.name}.c')
-        with open(source_file_path, 'w', encoding='utf-8') as source_file:
-            source_file.write(source_file_content)
+        self.write_file(source_file_path, lambda source_file: self.write_source_file(
+                source_file, options, glyphs, indexing_mode, indices))
+
+        output_file_paths = (header_file_path, source_file_path)
+
+        if options.shards is not None:
+            with self.profiler.stage('generate_shards'):
+                shard_files = self.generate_bitmap_shards(options, glyphs, indexing_mode)
+
+            self.profiler.add_section('shards', sum(len(content) for content in shard_files.values()))
+
+            print(f'LFC::INFO: Writing {len(shard_files)} glyph bitmap shards: '
+                  f'{output_directory_name}/{SHARD_FILE_NAME_FORMAT.format(name=options.name, index="*")}')
+
+            for (file_name, content) in shard_files.items():
+                shard_file_path = os.path.join(output_directory, file_name)
+                self.write_file(
+                        shard_file_path,
+                        lambda shard_file, content=content: shard_file.write(content))
+
+                output_file_paths += (shard_file_path,)
+
+            self.remove_stale_shards(options, output_directory, shard_files)
+
+        if options.binary:
+            binary_file_path = os.path.join(output_directory, f'{options.name}.bin')
+            with self.profiler.stage('generate_binary'):
+                binary_file_content = self.generate_binary_file(options, glyphs, indexing_mode, indices)
+
+            self.profiler.add_section('binary', len(binary_file_content))
+
+            print(f'LFC::INFO: Writing binary file: {output_directory_name}/{options.name}.bin')
+            self.write_file(
+                    binary_file_path,
+                    lambda binary_file: binary_file.write(binary_file_content),
+                    binary=True)
+
+            output_file_paths += (binary_file_path,)
 
         print(f'LFC::SUCCESS: Font {options.name} successfully converted!')
 
+        return output_file_paths
+
+
+    def write_file(self, file_path, write_content, binary=False):
+        """Function that writes a file, leaving an existing file untouched if its content is the same"""
+        temporary_file_path = f'{file_path}.tmp'
+
+        if binary:
+            temporary_file = open(temporary_file_path, 'wb')
+        else:
+            temporary_file = open(temporary_file_path, 'w', encoding='utf-8',
+                                  buffering=LFC_PUBLISHER_WRITE_BUFFER_SIZE)
+
+        with temporary_file:
+            write_content(temporary_file)
+
+            with self.profiler.stage('write_files'):
+                temporary_file.flush()
+
+        with self.profiler.stage('write_files'):
+            # Keep the existing file and its modification time if nothing changed
+            if os.path.isfile(file_path) and filecmp.cmp(temporary_file_path, file_path, shallow=False):
+                os.remove(temporary_file_path)
+                print(f'LFC::INFO: {os.path.basename(file_path)} is unchanged, '
+                      'keeping the existing file')
+            else:
+                os.replace(temporary_file_path, file_path)
+
+
+    def is_up_to_date(self, options, output_directory_name='output'):
+        """Function that checks if the output files were generated from the same inputs"""
+        output_directory = self.output_directory_path(output_directory_name)
+
+        inputs_hash_line = self.generate_inputs_hash_line(options)
+
+        for extension in ('h', 'c'):
+            file_path = os.path.join(output_directory, f'{options.name}.{extension}')
+
+            if not os.path.isfile(file_path):
+                return False
+
+            # Look for the inputs hash in the leading comment block
+            with open(file_path, 'r', encoding='utf-8') as output_file:
+                comment_lines = []
+
+                for line in output_file:
+                    if not line.startswith('//'):
+                        break
+
+                    comment_lines.append(line)
+
+            if inputs_hash_line not in comment_lines:
+                return False
+
+        # The shards leave the inputs hash out, so they stay the same while their glyphs do
+        if options.shards is not None:
+            for index in range(options.shards):
+                shard_file_name = SHARD_FILE_NAME_FORMAT.format(name=options.name, index=index)
+
+                if not os.path.isfile(os.path.join(output_directory, shard_file_name)):
+                    return False
+
+        # The binary file is generated together with the source files from the same inputs
+        if options.binary and not os.path.isfile(os.path.join(output_directory, f'{options.name}.bin')):
+            return False
+
+        return True
+
 
     def indent(self, string):
         """Function that adds indentation to a given string"""
         return f'{LFC_PUBLISHER_INDENTATION}{string}'
 
 
+    def output_directory_path(self, directory_name):
+        """Function that returns the path of the output directory"""
+        return os.path.join(os.path.dirname(os.path.realpath(__file__)), directory_name)
+
+
     def create_output_directory(self, directory_name):
         """Function that creates the output directory"""
-        output_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), directory_name)
+        output_path = self.output_directory_path(directory_name)
 
         # Create the output directory if it doesn't exist
-        if not os.path.exists(output_path):
-            os.mkdir(output_path)
+        os.makedirs(output_path, exist_ok=True)
 
         return output_path
 
@@ -70,6 +235,12 @@ class LFCPublisher:
                 output += f'#define LUMINA_FONT_GLYPH_{glyph.code:X} "\\x{index + 1:x}"\n'
             output += '\n'
 
+        # Pre-rendered labels are referred to by their position in the label table
+        if options.labels is not None:
+            for (index, label_id) in enumerate(options.labels):
+                output += f'#define {options.name.upper()}_LABEL_{label_id.upper()} {index}\n'
+            output += '\n'
+
         output += f'extern const lumina_font_t {options.name};\n\n'
 
         output += '#ifdef __cplusplus\n}\n#endif // __cplusplus\n\n'
@@ -81,21 +252,57 @@ class LFCPublisher:
 
     def generate_source_file(self, options, glyphs, indexing_mode, indices):
         """Function that generates the source file content"""
-        output = self.generate_info(options)
-        output += f'#include "{options.name}.h"\n\n'
-        output += self.generate_glyphs_bitmap(options.name, glyphs, options.bpp, indexing_mode)
-        output += self.generate_glyphs_metadata(options.name, glyphs, indexing_mode)
-        output += self.generate_glyphs_lookup_table(options.name, indexing_mode, indices, glyphs)
-        output += self.generate_font(options, glyphs, indexing_mode)
-        output += '\n'
+        output = io.StringIO()
+        self.write_source_file(output, options, glyphs, indexing_mode, indices)
 
-        return output
+        return output.getvalue()
+
+
+    def write_source_file(self, stream, options, glyphs, indexing_mode, indices):
+        """Function that writes the source file content to a text stream"""
+        stream = self.profiler.counting_stream(stream)
+
+        with self.profiler.section('info', stream):
+            stream.write(self.generate_info(options))
+            stream.write(f'#include "{options.name}.h"\n\n')
+
+        if options.atlas is not None:
+            with self.profiler.section('atlas', stream):
+                stream.write(self.generate_glyph_atlas(options, glyphs))
+        elif options.shards is not None:
+            with self.profiler.section('bitmap', stream):
+                stream.write(self.generate_glyph_bitmap_shard_table(options, glyphs))
+        else:
+            with self.profiler.section('bitmap', stream):
+                self.write_glyphs_bitmap(stream, options.name, glyphs, options.bpp, indexing_mode)
+
+        with self.profiler.section('metadata', stream):
+            if options.compact_metadata:
+                stream.write(self.generate_compact_glyphs_metadata(options, glyphs, indexing_mode))
+            else:
+                stream.write(self.generate_glyphs_metadata(
+                        options.name, glyphs, indexing_mode, options.compress, options.atlas is not None))
+
+        with self.profiler.section('lut', stream):
+            stream.write(self.generate_glyphs_lookup_table(options.name, indexing_mode, indices, glyphs))
+
+        if options.kerning:
+            with self.profiler.section('kerning', stream):
+                stream.write(self.generate_kerning_pairs(options.name, glyphs, indexing_mode))
+
+        if options.labels is not None:
+            with self.profiler.section('labels', stream):
+                stream.write(self.generate_labels(options, glyphs))
+
+        with self.profiler.section('font', stream):
+            stream.write(self.generate_font(options, glyphs, indexing_mode))
+            stream.write('\n')
 
 
     def generate_info(self, options):
         """Function that generates the font information"""
         command = textwrap.fill(
-                ' '.join(sys.argv),
+                options.command,
                 width=107,
                 initial_indent='',
                 subsequent_indent="//          ")
@@ -107,49 +314,194 @@ class LFCPublisher:
         output += f'// Font file: {os.path.basename(options.font)}\n//\n'
         output += f'// Generated with Lumina Font Converter v{LFC_VERSION}\n'
         output += '// https://github.com/kostoskistefan/lumina-font-converter\n'
-        output += f'// Generated on: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n'
+
+        # Reproducible output records the inputs instead of the generation time
+        if options.reproducible:
+            output += self.generate_inputs_hash_line(options)
+        else:
+            output += f'// Generated on: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n'
+
         output += f'// Command: {command}\n'
         output += f'// {"-" * 117}\n\n'
 
         return output
 
 
+    def generate_inputs_hash_line(self, options):
+        """Function that generates the comment line recording the hash of the inputs"""
+        return f'// Inputs hash: {options.inputs_hash()}\n'
+
+
     def generate_glyphs_bitmap(self, font_name, glyphs, bpp, indexing_mode):
         """Function that generates the glyph bitmap data"""
-        output = f'static const uint8_t {font_name}_glyph_bitmap[] = {{\n'
+        output = io.StringIO()
+        self.write_glyphs_bitmap(output, font_name, glyphs, bpp, indexing_mode)
 
+        return output.getvalue()
+
+
+    def write_glyphs_bitmap(self, stream, font_name, glyphs, bpp, indexing_mode):
+        """Function that writes the glyph bitmap data to a text stream"""
+        stream.write(f'static const uint8_t {font_name}_glyph_bitmap[] = {{\n')
+        self.write_glyph_bitmap_rows(stream, glyphs, bpp, indexing_mode)
+        stream.write('};\n\n')
+
+
+    def write_glyph_bitmap_rows(self, stream, glyphs, bpp, indexing_mode):
+        """Function that writes the commented bitmap bytes of every glyph to a text stream"""
         pixels_per_byte = 8 // bpp
 
         for (index, glyph) in enumerate(glyphs):
-            output += self.indent('// ') 
+            output = [self.indent('// ')]
 
             if indexing_mode == IndexingMode.ASCII:
-                output += f'Code: {glyph.code:d}, '
+                output.append(f'Code: {glyph.code:d}, ')
             else:
-                output += f'Code: 0x{glyph.code:x}, '
+                output.append(f'Code: 0x{glyph.code:x}, ')
+
+            output.append(f'Width: {glyph.width}, ')
+            output.append(f'Height: {glyph.height}')
+
+            if glyph.compressed_bitmap is not None:
+                output.append(f', Compressed: {len(glyph.compressed_bitmap)} bytes')
+
+            output.append('\n')
 
-            output += f'Width: {glyph.width}, '
-            output += f'Height: {glyph.height}\n'
+            # Deduplicated glyphs point at the bitmap of an identical glyph
+            if glyph.duplicate_of is not None:
+                if indexing_mode == IndexingMode.ASCII:
+                    output.append(self.indent(f'// Same bitmap as Code: {glyph.duplicate_of:d}\n'))
+                else:
+                    output.append(self.indent(f'// Same bitmap as Code: 0x{glyph.duplicate_of:x}\n'))
+
+                if index < len(glyphs) - 1:
+                    output.append('\n')
 
-            glyph_bitstream = ''.join([f'{chunk:0{bpp}b}' for chunk in glyph.data])
+                stream.write(''.join(output))
+                continue
 
-            columns = 0
+            glyph_bitmap = glyph.encode_bitmap()
 
-            output += self.indent('')
+            # Each line holds the bytes of one glyph row or column page, compressed glyphs have no rows
+            if glyph.compressed_bitmap is not None:
+                bytes_per_line = LFC_PUBLISHER_COMPRESSED_BYTES_PER_LINE
+            elif glyph.column_pages:
+                bytes_per_line = max(glyph.width, 1)
+            else:
+                bytes_per_line = max(math.ceil(glyph.width / pixels_per_byte), 1)
 
-            for i in range(0, len(glyph_bitstream), 8):
-                output += f'0x{int(glyph_bitstream[i:i+8], 2):0>02x}, '
+            output.append(self.indent(''))
 
-                columns += pixels_per_byte
+            for i in range(0, len(glyph_bitmap), bytes_per_line):
+                line = glyph_bitmap[i : i + bytes_per_line]
+                output.append(''.join(map(BYTE_TO_C_LITERAL.__getitem__, line)))
 
-                if columns >= glyph.width:
-                    columns = 0
-                    output += '\n'
+                # The last line is only terminated if it holds a complete row
+                if len(line) == bytes_per_line or glyph.compressed_bitmap is not None:
+                    output.append('\n')
 
-                    if i < len(glyph_bitstream) - 8:
-                        output += self.indent('')
+                    if i + bytes_per_line < len(glyph_bitmap):
+                        output.append(self.indent(''))
 
             if index < len(glyphs) - 1:
+                output.append('\n')
+
+            stream.write(''.join(output))
+
+
+    def generate_bitmap_shards(self, options, glyphs, indexing_mode):
+        """Function that generates the source files of the glyph bitmap shards by file name"""
+        shard_files = {}
+
+        for (index, shard) in enumerate(shard_glyphs(glyphs, options.shards, options.declared_characters)):
+            output = io.StringIO()
+
+            # The shards leave the generation time and the inputs out, so an unchanged shard
+            # compiles to the same object file and hits the compiler cache
+            output.write(f'// {"-" * 117}\n')
+            output.write(f'// Font name: {options.name}\n')
+            output.write(f'// Glyph bitmap shard {index + 1} of {options.shards}')
+
+            if shard:
+                output.write(f', Codes: 0x{shard[0].code:x} to 0x{shard[-1].code:x}')
+
+            output.write('\n')
+            output.write(f'// Generated with Lumina Font Converter v{LFC_VERSION}\n')
+            output.write(f'// {"-" * 117}\n\n')
+
+            output.write('#include <stdint.h>\n\n')
+            output.write(f'const uint8_t {options.name}_glyph_bitmap_{index}[] = {{\n')
+
+            self.write_glyph_bitmap_rows(output, shard, options.bpp, indexing_mode)
+
+            # C does not allow empty arrays
+            if not any(glyph.duplicate_of is None and glyph.bitmap_size() for glyph in shard):
+                output.write(self.indent('0x00, // Padding, the shard has no bitmap bytes\n'))
+
+            output.write('};\n')
+
+            shard_files[SHARD_FILE_NAME_FORMAT.format(name=options.name, index=index)] = output.getvalue()
+
+        return shard_files
+
+
+    def remove_stale_shards(self, options, output_directory, shard_files):
+        """Function that removes the shard files of a conversion with more shards"""
+        shard_file_pattern = re.compile(re.escape(options.name) + r'_bitmap_\d+\.c')
+
+        for file_name in sorted(os.listdir(output_directory)):
+            if shard_file_pattern.fullmatch(file_name) and file_name not in shard_files:
+                print(f'LFC::INFO: Removing stale glyph bitmap shard: {file_name}')
+                os.remove(os.path.join(output_directory, file_name))
+
+
+    def generate_glyph_bitmap_shard_table(self, options, glyphs):
+        """Function that generates the table of glyph bitmap shards and the offset each one starts at"""
+        shards = shard_glyphs(glyphs, options.shards, options.declared_characters)
+
+        output = ''
+
+        for index in range(len(shards)):
+            output += f'extern const uint8_t {options.name}_glyph_bitmap_{index}[];\n'
+
+        output += f'\nstatic const uint8_t *const {options.name}_glyph_bitmap_shards[] = {{\n'
+
+        for index in range(len(shards)):
+            output += self.indent(f'{options.name}_glyph_bitmap_{index},\n')
+
+        output += '};\n\n'
+
+        # A glyph's bitmap_index stays an offset into the whole bitmap, the shard holding it is the
+        # last one starting at or before it
+        output += f'static const uint32_t {options.name}_glyph_bitmap_shard_offsets[] = {{\n'
+
+        for offset in shard_offsets(shards):
+            output += self.indent(f'{offset},\n')
+
+        output += '};\n\n'
+
+        return output
+
+
+    def generate_glyph_atlas(self, options, glyphs):
+        """Function that generates the atlas pages holding the glyph bitmaps"""
+        output = f'static const uint8_t {options.name}_glyph_atlas[] = {{\n'
+
+        page_heights = atlas_page_heights(glyphs, options.atlas_height)
+        pages = render_atlas_pages(glyphs, options.atlas, options.atlas_height)
+
+        bytes_per_line = options.atlas // (8 // options.bpp)
+
+        # Each line holds the bytes of one atlas row
+        for (page_index, (page_height, page)) in enumerate(zip(page_heights, pages)):
+            output += self.indent(f'// Page: {page_index}, Width: {options.atlas}, Height: {page_height}\n')
+
+            for i in range(0, len(page), bytes_per_line):
+                line = page[i : i + bytes_per_line]
+                output += self.indent(''.join(map(BYTE_TO_C_LITERAL.__getitem__, line)))
+                output += '\n'
+
+            if page_index < len(pages) - 1:
                 output += '\n'
 
         output += '};\n\n'
@@ -157,7 +509,7 @@ class LFCPublisher:
         return output
 
 
-    def generate_glyphs_metadata(self, font_name, glyphs, indexing_mode):
+    def generate_glyphs_metadata(self, font_name, glyphs, indexing_mode, compression=False, atlas=False):
         """Function that generates the glyph metadata"""
         output = f'static const lumina_font_glyph_metadata_t {font_name}_glyph_metadata[] = {{\n'
 
@@ -168,14 +520,28 @@ class LFCPublisher:
         max_advance_digits = max(max(len(str(glyph.advance)) for glyph in glyphs), len(str(max_width)))
         max_y_offset_digits = max(len(str(glyph.y_offset)) for glyph in glyphs)
         max_bitmap_index_digits = max(len(str(glyph.bitmap_index)) for glyph in glyphs)
+        max_atlas_x_digits = max(len(str(glyph.atlas_x)) for glyph in glyphs)
+        max_atlas_y_digits = max(len(str(glyph.atlas_y)) for glyph in glyphs)
+        max_atlas_page_digits = max(len(str(glyph.atlas_page)) for glyph in glyphs)
 
         output += self.indent('{ ')
         output += f'.width = {0:{max_width_digits}}, '
         output += f'.height = {0:{max_height_digits}}, '
         output += f'.advance = {max_width:{max_advance_digits}}, '
         output += f'.y_offset = {0:{max_y_offset_digits}}, '
-        output += f'.bitmap_index = {0:{max_bitmap_index_digits}} '
-        output += f'}}, // Reserved by Lumina\n'
+
+        # Atlas glyphs are found by their position in the atlas instead of a bitmap index
+        if atlas:
+            output += f'.atlas_x = {0:{max_atlas_x_digits}}, '
+            output += f'.atlas_y = {0:{max_atlas_y_digits}}, '
+            output += f'.atlas_page = {0:{max_atlas_page_digits}}'
+        else:
+            output += f'.bitmap_index = {0:{max_bitmap_index_digits}}'
+
+        if compression:
+            output += ', .compressed = 0'
+
+        output += f' }}, // Reserved by Lumina\n'
 
         for glyph in glyphs:
             output += self.indent('{ ')
@@ -183,12 +549,63 @@ class LFCPublisher:
             output += f'.height = {glyph.height:{max_height_digits}}, '
             output += f'.advance = {glyph.advance:{max_advance_digits}}, '
             output += f'.y_offset = {glyph.y_offset:{max_y_offset_digits}}, '
-            output += f'.bitmap_index = {glyph.bitmap_index:{max_bitmap_index_digits}} '
+
+            if atlas:
+                output += f'.atlas_x = {glyph.atlas_x:{max_atlas_x_digits}}, '
+                output += f'.atlas_y = {glyph.atlas_y:{max_atlas_y_digits}}, '
+                output += f'.atlas_page = {glyph.atlas_page:{max_atlas_page_digits}}'
+            else:
+                output += f'.bitmap_index = {glyph.bitmap_index:{max_bitmap_index_digits}}'
+
+            if compression:
+                output += f', .compressed = {int(glyph.compressed_bitmap is not None)}'
 
             if indexing_mode == IndexingMode.ASCII:
-                output += f'}}, // Code: {glyph.code:d}\n'
+                output += f' }}, // Code: {glyph.code:d}\n'
+            else:
+                output += f' }}, // Code: 0x{glyph.code:x}\n'
+
+        output += '};\n\n'
+
+        return output
+
+
+    def generate_compact_glyphs_metadata(self, options, glyphs, indexing_mode):
+        """Function that generates the glyph metadata as bit packed records and their layout"""
+        packer = LFCMetadataPacker()
+        metadata = packer.pack(glyphs, options.compress, options.atlas is not None)
+
+        output = f'static const uint8_t {options.name}_glyph_metadata[] = {{\n'
+
+        # Each line holds one record, the first one is reserved by Lumina
+        for index in range(len(glyphs) + 1):
+            record = metadata[index * packer.record_size : (index + 1) * packer.record_size]
+            output += self.indent(''.join(map(BYTE_TO_C_LITERAL.__getitem__, record)))
+
+            if index == 0:
+                output += '// Reserved by Lumina\n'
+            elif indexing_mode == IndexingMode.ASCII:
+                output += f'// Code: {glyphs[index - 1].code:d}\n'
             else:
-                output += f'}}, // Code: 0x{glyph.code:x}\n'
+                output += f'// Code: 0x{glyphs[index - 1].code:x}\n'
+
+        output += '};\n\n'
+
+        output += 'static const lumina_font_glyph_metadata_layout_t '
+        output += f'{options.name}_glyph_metadata_layout = {{\n'
+        output += self.indent(f'.record_size = {packer.record_size},\n')
+
+        max_field_digits = max(len(field) for field in packer.layout)
+        max_shift_digits = max(len(str(shift)) for (shift, _, _) in packer.layout.values())
+        max_bits_digits = max(len(str(bits)) for (_, bits, _) in packer.layout.values())
+        max_bias_digits = max(len(str(bias)) for (_, _, bias) in packer.layout.values())
+
+        # A field is decoded as ((record >> shift) & ((1 << bits) - 1)) + bias
+        for (field, (shift, bits, bias)) in packer.layout.items():
+            output += self.indent(f'.{field:<{max_field_digits}} = {{ ')
+            output += f'.shift = {shift:{max_shift_digits}}, '
+            output += f'.bits = {bits:{max_bits_digits}}, '
+            output += f'.bias = {bias:{max_bias_digits}} }},\n'
 
         output += '};\n\n'
 
@@ -197,6 +614,13 @@ class LFCPublisher:
 
     def generate_glyphs_lookup_table(self, font_name, indexing_mode, indices, glyphs):
         """Function that generates the glyph lookup table"""
+        match indexing_mode:
+            case IndexingMode.SEGMENTED:
+                return self.generate_glyph_segments(font_name, indices)
+
+            case IndexingMode.SORTED:
+                return self.generate_glyph_codes(font_name, indices)
+
         output = f'static const lumina_font_glyph_lut_entry_t {font_name}_glyph_lut[] = {{\n'
 
         max_code_digits = len(str(len(glyphs)))
@@ -215,9 +639,137 @@ class LFCPublisher:
                 if index == 0:
                     output += '// Unused\n'
 
-                else:
+                elif indexing_mode == IndexingMode.ASCII:
                     output += f'// Code: {glyphs[index - 1].code:d}\n'
 
+                else:
+                    output += f'// Code: 0x{glyphs[index - 1].code:x}\n'
+
+        output += '};\n\n'
+
+        return output
+
+
+    def generate_glyph_segments(self, font_name, segments):
+        """Function that generates the table of consecutive code ranges sorted by their first code"""
+        output = f'static const lumina_font_glyph_segment_t {font_name}_glyph_segments[] = {{\n'
+
+        max_first_code_digits = max(len(f'{first_code:x}') for (first_code, _, _) in segments)
+        max_count_digits = max(len(str(count)) for (_, count, _) in segments)
+        max_first_index_digits = max(len(str(first_index)) for (_, _, first_index) in segments)
+
+        for (first_code, count, first_index) in segments:
+            output += self.indent('{ ')
+            output += f'.first_code = 0x{first_code:0{max_first_code_digits}x}, '
+            output += f'.count = {count:{max_count_digits}}, '
+            output += f'.first_index = {first_index:{max_first_index_digits}}'
+            output += f' }}, // Codes: 0x{first_code:x}-0x{first_code + count - 1:x}\n'
+
+        output += '};\n\n'
+
+        return output
+
+
+    def generate_glyph_codes(self, font_name, codes):
+        """Function that generates the sorted array of glyph codes"""
+        output = f'static const uint32_t {font_name}_glyph_codes[] = {{\n'
+
+        max_code_digits = max(len(f'{code:x}') for code in codes)
+
+        # The glyph index of each code is its position in the array plus one
+        for i in range(0, len(codes), LFC_PUBLISHER_CODES_PER_LINE):
+            line = codes[i : i + LFC_PUBLISHER_CODES_PER_LINE]
+            output += self.indent(''.join(f'0x{code:0{max_code_digits}x}, ' for code in line))
+            output += f'// Index: {i + 1}\n'
+
+        output += '};\n\n'
+
+        return output
+
+
+    def kerning_pairs(self, glyphs):
+        """Function that lists the kerning pairs by glyph index, sorted for a binary search"""
+        glyph_indices = {glyph.code: index + 1 for (index, glyph) in enumerate(glyphs)}
+
+        return sorted(
+            (glyph_indices[glyph.code], glyph_indices[right_code], adjustment)
+            for glyph in glyphs
+            for (right_code, adjustment) in glyph.kerning.items())
+
+
+    def generate_kerning_pairs(self, font_name, glyphs, indexing_mode):
+        """Function that generates the kerning pair table"""
+        pairs = self.kerning_pairs(glyphs)
+
+        # C does not allow empty arrays, the font refers to no table instead
+        if not pairs:
+            return ''
+
+        output = f'static const lumina_font_kerning_pair_t {font_name}_kerning_pairs[] = {{\n'
+
+        max_index_digits = len(str(len(glyphs)))
+        max_adjustment_digits = max(len(str(adjustment)) for (_, _, adjustment) in pairs)
+
+        for (left, right, adjustment) in pairs:
+            output += self.indent('{ ')
+            output += f'.left = {left:{max_index_digits}}, '
+            output += f'.right = {right:{max_index_digits}}, '
+            output += f'.adjustment = {adjustment:{max_adjustment_digits}}'
+
+            if indexing_mode == IndexingMode.ASCII:
+                output += f' }}, // Codes: {glyphs[left - 1].code:d}, {glyphs[right - 1].code:d}\n'
+            else:
+                output += f' }}, // Codes: 0x{glyphs[left - 1].code:x}, 0x{glyphs[right - 1].code:x}\n'
+
+        output += '};\n\n'
+
+        return output
+
+
+    def generate_labels(self, options, glyphs):
+        """Function that generates the pre-rendered label bitmaps and the label table"""
+        label_cache = LFCLabelCache()
+        label_cache.render(options.labels, glyphs, options.kerning)
+
+        output = f'static const uint8_t {options.name}_label_bitmap[] = {{\n'
+
+        for (index, label) in enumerate(label_cache.labels):
+            text = json.dumps(label['text'], ensure_ascii=False)
+
+            output += self.indent(f'// Label: {label["id"]} {text}, ')
+            output += f'Width: {label["width"]}, Height: {label["height"]}\n'
+
+            # Each line holds the bytes of one label row or column page
+            if glyphs[0].column_pages:
+                bytes_per_line = max(label['width'], 1)
+            else:
+                bytes_per_line = max(math.ceil(label['width'] / (8 // options.bpp)), 1)
+
+            for i in range(0, len(label['bitmap']), bytes_per_line):
+                line = label['bitmap'][i : i + bytes_per_line]
+                output += self.indent(''.join(map(BYTE_TO_C_LITERAL.__getitem__, line)))
+                output += '\n'
+
+            if index < len(label_cache.labels) - 1:
+                output += '\n'
+
+        output += '};\n\n'
+
+        output += f'static const lumina_font_label_t {options.name}_labels[] = {{\n'
+
+        max_width_digits = max(len(str(label['width'])) for label in label_cache.labels)
+        max_height_digits = max(len(str(label['height'])) for label in label_cache.labels)
+        max_y_offset_digits = max(len(str(label['y_offset'])) for label in label_cache.labels)
+        max_bitmap_index_digits = max(len(str(label['bitmap_index'])) for label in label_cache.labels)
+
+        for label in label_cache.labels:
+            output += self.indent('{ ')
+            output += f'.width = {label["width"]:{max_width_digits}}, '
+            output += f'.height = {label["height"]:{max_height_digits}}, '
+            output += f'.y_offset = {label["y_offset"]:{max_y_offset_digits}}, '
+            output += f'.bitmap_index = {label["bitmap_index"]:{max_bitmap_index_digits}}'
+            output += f' }}, // {options.name.upper()}_LABEL_{label["id"].upper()}\n'
+
         output += '};\n\n'
 
         return output
@@ -227,12 +779,148 @@ class LFCPublisher:
         """Function that generates the C extern font struct"""
         output = f'const lumina_font_t {options.name} = {{\n'
         output += self.indent(f'.bpp = {options.bpp},\n')
-        output += self.indent(f'.first_valid_index = {glyphs[0].code},\n')
-        output += self.indent(f'.last_valid_index = {glyphs[-1].code},\n')
-        output += self.indent(f'.glyph_lut = {options.name}_glyph_lut,\n')
-        output += self.indent(f'.glyph_bitmap = {options.name}_glyph_bitmap,\n')
-        output += self.indent(f'.glyph_metadata = {options.name}_glyph_metadata,\n')
+
+        (first_valid_index, last_valid_index) = self.valid_index_range(glyphs, indexing_mode)
+
+        output += self.indent(f'.first_valid_index = {first_valid_index},\n')
+        output += self.indent(f'.last_valid_index = {last_valid_index},\n')
+
+        match indexing_mode:
+            case IndexingMode.SEGMENTED:
+                segments = f'{options.name}_glyph_segments'
+                output += self.indent(f'.glyph_segments = {segments},\n')
+                output += self.indent(
+                        f'.glyph_segment_count = sizeof({segments}) / sizeof({segments}[0]),\n')
+
+            case IndexingMode.SORTED:
+                codes = f'{options.name}_glyph_codes'
+                output += self.indent(f'.glyph_codes = {codes},\n')
+                output += self.indent(
+                        f'.glyph_code_count = sizeof({codes}) / sizeof({codes}[0]),\n')
+
+            case _:
+                output += self.indent(f'.glyph_lut = {options.name}_glyph_lut,\n')
+
+        if options.kerning:
+            if any(glyph.kerning for glyph in glyphs):
+                pairs = f'{options.name}_kerning_pairs'
+                output += self.indent(f'.kerning_pairs = {pairs},\n')
+                output += self.indent(f'.kerning_pair_count = sizeof({pairs}) / sizeof({pairs}[0]),\n')
+            else:
+                output += self.indent('.kerning_pairs = NULL,\n')
+                output += self.indent('.kerning_pair_count = 0,\n')
+
+        if options.atlas is not None:
+            page_heights = atlas_page_heights(glyphs, options.atlas_height)
+
+            # Pages are atlas_page_height rows apart, only the last page may have fewer rows
+            output += self.indent(f'.glyph_atlas = {options.name}_glyph_atlas,\n')
+            output += self.indent(f'.atlas_width = {options.atlas},\n')
+            output += self.indent(f'.atlas_page_height = {options.atlas_height or page_heights[0]},\n')
+            output += self.indent(f'.atlas_page_count = {len(page_heights)},\n')
+        elif options.shards is not None:
+            output += self.indent(f'.glyph_bitmap_shards = {options.name}_glyph_bitmap_shards,\n')
+            output += self.indent(
+                    f'.glyph_bitmap_shard_offsets = {options.name}_glyph_bitmap_shard_offsets,\n')
+            output += self.indent(f'.glyph_bitmap_shard_count = {options.shards},\n')
+        else:
+            output += self.indent(f'.glyph_bitmap = {options.name}_glyph_bitmap,\n')
+
+        if options.compact_metadata:
+            output += self.indent(f'.compact_glyph_metadata = {options.name}_glyph_metadata,\n')
+            output += self.indent(f'.glyph_metadata_layout = &{options.name}_glyph_metadata_layout,\n')
+        else:
+            output += self.indent(f'.glyph_metadata = {options.name}_glyph_metadata,\n')
+
+        if options.layout == 'columns':
+            output += self.indent('.bitmap_layout = LUMINA_FONT_BITMAP_LAYOUT_COLUMN_PAGES,\n')
+
+        if options.labels is not None:
+            output += self.indent(f'.label_bitmap = {options.name}_label_bitmap,\n')
+            output += self.indent(f'.labels = {options.name}_labels,\n')
+            output += self.indent(f'.label_count = {len(options.labels)},\n')
+
         output += self.indent(f'.indexing_mode = LUMINA_FONT_INDEXING_MODE_{indexing_mode},\n')
         output += '};'
 
         return output
+
+
+    def valid_index_range(self, glyphs, indexing_mode):
+        """Function that returns the first and last valid character code of the font"""
+        if indexing_mode in (IndexingMode.ASCII, IndexingMode.UNICODE):
+            return glyphs[0].code, glyphs[-1].code
+
+        return min(glyph.code for glyph in glyphs), max(glyph.code for glyph in glyphs)
+
+
+    def generate_binary_file(self, options, glyphs, indexing_mode, indices):
+        """Function that generates the memory-mappable binary font blob"""
+        max_width = max(glyph.width for glyph in glyphs)
+
+        # The first metadata record is reserved by Lumina, like in the source file
+        metadata = [BLOB_GLYPH_METADATA.pack(0, 0, 0, max_width, 0, 0, 0)]
+
+        for glyph in glyphs:
+            flags = BLOB_GLYPH_FLAG_COMPRESSED if glyph.compressed_bitmap is not None else 0
+
+            metadata.append(BLOB_GLYPH_METADATA.pack(
+                glyph.code,
+                glyph.width,
+                glyph.height,
+                glyph.advance,
+                glyph.y_offset,
+                glyph.bitmap_index,
+                flags))
+
+        metadata = b''.join(metadata)
+
+        lookup_entry = BLOB_LOOKUP_ENTRIES[indexing_mode]
+        lookup = b''.join(
+            lookup_entry.pack(*index) if isinstance(index, tuple) else lookup_entry.pack(index)
+            for index in indices)
+
+        bitmap = b''.join(glyph.encode_bitmap() for glyph in glyphs if glyph.duplicate_of is None)
+
+        kerning_pairs = self.kerning_pairs(glyphs)
+        kerning = b''.join(BLOB_KERNING_PAIR.pack(*pair) for pair in kerning_pairs)
+
+        # Lay out the sections after the header, each starting at an aligned offset
+        metadata_offset = align(BLOB_HEADER.size)
+        lookup_offset = align(metadata_offset + len(metadata))
+        kerning_offset = align(lookup_offset + len(lookup))
+        bitmap_offset = align(kerning_offset + len(kerning))
+        file_size = align(bitmap_offset + len(bitmap))
+
+        (first_valid_index, last_valid_index) = self.valid_index_range(glyphs, indexing_mode)
+
+        blob = bytearray(file_size)
+
+        BLOB_HEADER.pack_into(
+            blob,
+            0,
+            BLOB_MAGIC,
+            BLOB_FORMAT_VERSION,
+            BLOB_HEADER.size,
+            options.bpp,
+            indexing_mode.value,
+            (BLOB_FLAG_COMPRESSED if options.compress else 0) | \
+                (BLOB_FLAG_COLUMN_PAGES if options.layout == 'columns' else 0),
+            len(glyphs) + 1,
+            first_valid_index,
+            last_valid_index,
+            len(indices),
+            len(kerning_pairs),
+            metadata_offset,
+            lookup_offset,
+            kerning_offset,
+            bitmap_offset,
+            len(bitmap),
+            file_size)
+
+        blob[metadata_offset : metadata_offset + len(metadata)] = metadata
+        blob[lookup_offset : lookup_offset + len(lookup)] = lookup
+        blob[kerning_offset : kerning_offset + len(kerning)] = kerning
+        blob[bitmap_offset : bitmap_offset + len(bitmap)] = bitmap
+
+        return bytes(blob)
@@ -1,60 +1,428 @@
 """Module for rasterizing font characters into Lumina supported glyphs"""
 
+import copy
 import math
+import time
+import bisect
+import ctypes
+import struct
+import itertools
+import concurrent.futures
+import numpy
 import freetype
-from lfc_glyph import LFCGlyph
+from lfc_constants import LFC_KERNING_PAIR_SIZE
+from lfc_glyph import LFCGlyph, calculate_bitmap_indices, deserialize_glyph
+from lfc_glyph_cache import LFCGlyphCache
+from lfc_profiler import LFCProfiler
+
+# FreeType flags used to load and render every character
+RASTERIZER_LOAD_FLAGS = freetype.FT_LOAD_RENDER
+
+# Number of missing characters listed when characters are skipped
+RASTERIZER_REPORTED_MISSING_CHARACTERS = 8
+
+# Number of chunks each worker process gets, so uneven chunks still balance out
+RASTERIZER_CHUNKS_PER_JOB = 4
+
+# Tag of the TrueType kerning table
+RASTERIZER_KERNING_TABLE_TAG = 0x6B65726E
+
+# Font face opened once by each worker process
+worker_face = None
+
+def initialize_worker(font):
+    """Function that opens the font face of a rasterizer worker process"""
+    global worker_face # pylint: disable=global-statement
+    worker_face = freetype.Face(font)
+
+
+def load_kerning_table(face):
+    """Function that reads the raw kerning table of a font face, None if it has none"""
+    length = ctypes.c_ulong(0)
+
+    # Query the table length first, then load the table into a buffer of that length
+    if freetype.raw.FT_Load_Sfnt_Table(
+            face._FT_Face, RASTERIZER_KERNING_TABLE_TAG, 0, None, ctypes.byref(length)):
+        return None
+
+    table = (ctypes.c_ubyte * length.value)()
+
+    if freetype.raw.FT_Load_Sfnt_Table(
+            face._FT_Face, RASTERIZER_KERNING_TABLE_TAG, 0, table, ctypes.byref(length)):
+        return None
+
+    return bytes(table)
+
+
+def read_kerning_pairs(table):
+    """Function that lists the glyph index pairs of the horizontal pair lists in a kerning table"""
+    pairs = []
+
+    try:
+        # Microsoft kerning tables start with a 16-bit version 0, Apple ones with a 32-bit version 1
+        microsoft_table = struct.unpack_from('>H', table)[0] == 0
+
+        if microsoft_table:
+            (table_count,) = struct.unpack_from('>H', table, 2)
+            offset = 4
+        else:
+            (table_count,) = struct.unpack_from('>I', table, 4)
+            offset = 8
+
+        for _ in range(table_count):
+            if microsoft_table:
+                (length, coverage) = struct.unpack_from('>2xHH', table, offset)
+                header_size = 6
+                table_format = coverage >> 8
+                horizontal = coverage & 0x0005 == 0x0001
+            else:
+                (length, coverage) = struct.unpack_from('>IH', table, offset)
+                header_size = 8
+                table_format = coverage & 0x00ff
+                horizontal = coverage & 0xe000 == 0
+
+            # Only horizontal pair lists hold kerning that FreeType applies
+            if table_format == 0:
+                (pair_count,) = struct.unpack_from('>H', table, offset + header_size)
+
+                if horizontal:
+                    pairs += [
+                        (left, right)
+                        for (left, right, _) in struct.iter_unpack(
+                            '>HHh',
+                            table[offset + header_size + 8 : offset + header_size + 8 + pair_count * 6])
+                    ]
+
+                # The 16-bit length overflows for large pair lists, so it is recalculated
+                length = header_size + 8 + pair_count * 6
+
+            offset += length
+
+    except struct.error:
+        return None
+
+    return pairs
+
+
+def rasterize_chunk(options, trim=True):
+    """Function that rasterizes a chunk of characters in a worker process"""
+    worker_face.set_char_size(options.height << 6)
+
+    rasterizer = LFCRasterizer()
+    bitmap_tops = rasterizer.rasterize_font(worker_face, options, trim)
+
+    # Send the glyphs back as binary records instead of pickled objects
+    glyph_records = b''.join(glyph.serialize() for glyph in rasterizer.glyphs)
+
+    return glyph_records, numpy.array(bitmap_tops, numpy.int32).tobytes()
+
 
 class LFCRasterizer:
     """Class for rasterizing font characters into Lumina supported glyphs"""
-    def __init__(self):
+    def __init__(self, profiler=None):
         self.glyphs = []
+        self.declared_glyph_count = 0
+        self.profiler = profiler or LFCProfiler(enabled=False)
 
 
-    def rasterize(self, options):
+    def rasterize(self, options, face=None, trim=True):
         """Function that rasterizes the font characters into Lumina supported glyphs"""
-        # Calculate the max ascent
-        max_ascent = self.calculate_max_ascent(options)
+        with self.profiler.stage('face_load'):
+            # Load the font face unless an already opened one is reused
+            font_face = face if face is not None else freetype.Face(options.font)
 
-        # Iterate over all fonts and rasterize them
-        self.rasterize_font(max_ascent, options)
+        with self.profiler.stage('select_characters'):
+            characters = self.select_characters(font_face, options.characters)
 
+            # A corpus narrows the declared characters down, so count the glyphs they would have had
+            if options.corpus is not None:
+                (declared_characters, _) = self.find_characters(font_face, options.declared_characters)
+                self.declared_glyph_count = len(declared_characters)
 
-    def calculate_max_ascent(self, options):
-        """Function that calculates the maximum ascent of the font"""
-        # Find the character with the highest bitmap_top (ascent)
-        face = freetype.Face(options.font)
-        face.set_char_size(options.height << 6)
+        options = copy.copy(options)
+        options.characters = characters
 
-        max_ascent = 0
+        cache = None
+        cached_entries = {}
 
-        for character in options.characters:
-            # Load the character from the font
-            face.load_char(character, freetype.FT_LOAD_FLAGS['FT_LOAD_BITMAP_METRICS_ONLY'])
+        # Look up the characters in the glyph cache and only rasterize the missing ones,
+        # untrimmed glyphs are not cached
+        if options.cache_directory is not None and trim:
+            with self.profiler.stage('glyph_cache'):
+                cache = LFCGlyphCache(options.cache_directory, options.cache_size)
+                font_key = cache.font_key(options, RASTERIZER_LOAD_FLAGS)
+                cached_entries = cache.load(font_key, characters)
+
+            options.characters = [c for c in characters if c not in cached_entries]
+
+        # Rasterize all characters into glyphs
+        if not options.characters:
+            bitmap_tops = []
+        elif face is None and options.jobs > 1:
+            with self.profiler.stage('rasterize_parallel'):
+                bitmap_tops = self.rasterize_font_parallel(options, trim)
+        else:
+            with self.profiler.stage('face_load'):
+                # Set the character size
+                font_face.set_char_size(options.height << 6)
+
+            bitmap_tops = self.rasterize_font(font_face, options, trim)
+
+        if cache is not None:
+            with self.profiler.stage('glyph_cache'):
+                cache.store(font_key, self.glyphs, bitmap_tops)
+                cache.close()
+
+            print(f'LFC::INFO: Glyph cache: {cache}')
+
+            # Merge the cached and rasterized glyphs back in the order of the characters
+            rasterized_glyphs = iter(zip(self.glyphs, bitmap_tops))
+
+            self.glyphs = []
+            bitmap_tops = []
+
+            for character in characters:
+                if character in cached_entries:
+                    glyph, bitmap_top = cache.read_entry(cached_entries[character])
+                else:
+                    glyph, bitmap_top = next(rasterized_glyphs)
+
+                self.glyphs.append(glyph)
+                bitmap_tops.append(bitmap_top)
+
+        self.arrange_glyphs(font_face, options, bitmap_tops)
+
+
+    def arrange_glyphs(self, face, options, bitmap_tops):
+        """Function that extracts the kerning of the rasterized glyphs and lines them up"""
+        if options.kerning:
+            with self.profiler.stage('kerning'):
+                self.extract_kerning(face, options)
+
+        with self.profiler.stage('max_ascent'):
+            # Offset the glyphs vertically by the max ascent
+            max_ascent = self.calculate_max_ascent(bitmap_tops)
+
+            for glyph in self.glyphs:
+                glyph.y_offset += max_ascent
+
+            # Calculate where each glyph's data starts in the bitmap
+            calculate_bitmap_indices(self.glyphs)
+
+        # Page addressed displays take the bitmaps as columns of 8 pixels aligned to the line
+        if options.layout == 'columns':
+            with self.profiler.stage('layout'):
+                self.arrange_column_pages()
+
+
+    def select_characters(self, face, character_ranges):
+        """Function that narrows the requested character ranges down to the font's characters"""
+        requested_count = sum(len(character_range) for character_range in character_ranges)
+
+        (characters, is_mapped) = self.find_characters(face, character_ranges)
+
+        skipped_count = requested_count - len(characters)
+
+        if skipped_count > 0:
+            missing_characters = itertools.islice(
+                (character
+                 for character_range in character_ranges
+                 for character in character_range
+                 if not is_mapped(character)),
+                RASTERIZER_REPORTED_MISSING_CHARACTERS)
+
+            missing_characters = ', '.join(f'0x{character:x}' for character in missing_characters)
 
-            # Update the max ascent
-            max_ascent = max(max_ascent, face.glyph.bitmap_top)
+            if skipped_count > RASTERIZER_REPORTED_MISSING_CHARACTERS:
+                missing_characters += ', ...'
 
-        return max_ascent
+            print(f'LFC::INFO: Skipped {skipped_count} characters without a glyph in the font: '
+                  f'{missing_characters}')
 
+        if not characters:
+            raise ValueError('LFC::ERROR: The font has no glyph for any of the characters')
 
-    def rasterize_font(self, max_ascent, options):
-        """Function that rasterizes the font into glyphs"""
-        # Load the font face
-        face = freetype.Face(options.font)
+        return characters
+
+
+    def find_characters(self, face, character_ranges):
+        """Function that returns the characters of the ranges the font has and a test for mapped ones"""
+        requested_count = sum(len(character_range) for character_range in character_ranges)
+
+        # Few characters are looked up one by one, many are intersected with the whole charmap
+        if requested_count <= face.num_glyphs:
+            def is_mapped(character):
+                return face.get_char_index(character) != 0
+
+            characters = [
+                character
+                for character_range in character_ranges
+                for character in character_range
+                if is_mapped(character)
+            ]
+        else:
+            # The charmap iteration ends with a character of glyph index 0, which is not mapped
+            mapped_characters = sorted(
+                character for (character, glyph_index) in face.get_chars() if glyph_index != 0)
+
+            characters = []
+
+            for character_range in character_ranges:
+                # Only walk the part of the charmap that falls into the range
+                start = bisect.bisect_left(mapped_characters, character_range.start)
+                end = bisect.bisect_left(mapped_characters, character_range.stop)
+                characters += mapped_characters[start:end]
+
+            is_mapped = set(mapped_characters).__contains__
+
+        return characters, is_mapped
+
+
+    def extract_kerning(self, face, options):
+        """Function that stores the kerning of every pair of glyphs above the threshold"""
+        if not face.has_kerning:
+            print('LFC::INFO: The font has no kerning')
+            return
+
+        # The candidate pairs come from the pair lists of the font's kerning table, asking every
+        # pair of glyphs instead would take a FreeType call per pair of characters
+        table = load_kerning_table(face)
+
+        if table is None:
+            print("LFC::INFO: The font has no 'kern' table, kerning is skipped")
+            return
+
+        pairs = read_kerning_pairs(table)
+
+        if pairs is None:
+            print("LFC::WARNING: The 'kern' table of the font can not be read, kerning is skipped")
+            return
 
-        # Set the character size
         face.set_char_size(options.height << 6)
 
-        character_data_index = 0
+        # Several characters can share a glyph of the font
+        glyphs_by_index = {}
+
+        for glyph in self.glyphs:
+            glyphs_by_index.setdefault(face.get_char_index(glyph.code), []).append(glyph)
+
+        kerning = freetype.FT_Vector(0, 0)
+
+        pair_count = 0
+        dropped_pair_count = 0
+
+        for (left, right) in pairs:
+            if left not in glyphs_by_index or right not in glyphs_by_index:
+                continue
+
+            freetype.raw.FT_Get_Kerning(
+                    face._FT_Face, left, right, freetype.FT_KERNING_UNFITTED, ctypes.byref(kerning))
+
+            # The kerning is scaled to the font height and rounded to whole pixels here, FreeType
+            # would also shrink it below 25 pixels per em
+            adjustment = round(kerning.x / 64)
+
+            if abs(adjustment) < options.kerning_threshold:
+                dropped_pair_count += 1
+                continue
+
+            for left_glyph in glyphs_by_index[left]:
+                for right_glyph in glyphs_by_index[right]:
+                    left_glyph.kerning[right_glyph.code] = adjustment
+                    pair_count += 1
+
+        print(f'LFC::INFO: Kerning: {pair_count} pairs ({pair_count * LFC_KERNING_PAIR_SIZE} bytes), '
+              f'dropped {dropped_pair_count} pairs below {options.kerning_threshold}px')
+
+
+    def arrange_column_pages(self):
+        """Function that lays out every glyph bitmap in page aligned columns"""
+        row_layout_size = sum(glyph.bitmap_size() for glyph in self.glyphs)
+
+        for glyph in self.glyphs:
+            glyph.arrange_column_pages()
+
+        column_layout_size = sum(glyph.bitmap_size() for glyph in self.glyphs)
+
+        # The bitmaps changed size, so their indices are calculated again
+        calculate_bitmap_indices(self.glyphs)
 
-        glyph_bpp_map_divisor = 1 << (8 - options.bpp)
+        print(f'LFC::INFO: Arranged {len(self.glyphs)} glyph bitmaps in page aligned columns, '
+              f'{row_layout_size} -> {column_layout_size} bytes')
 
-        pixels_per_byte = 8 // options.bpp
+
+    def requantize(self, bpp):
+        """Function that replaces untrimmed 8 bpp glyphs with the glyphs rasterized at a bpp"""
+        self.glyphs = [glyph.requantize(bpp) for glyph in self.glyphs]
+
+        calculate_bitmap_indices(self.glyphs)
+
+
+    def rasterize_font_parallel(self, options, trim=True):
+        """Function that rasterizes the font into glyphs using multiple worker processes"""
+        characters = list(options.characters)
+
+        # Split the characters into contiguous chunks to keep their order
+        chunk_size = max(math.ceil(len(characters) / (options.jobs * RASTERIZER_CHUNKS_PER_JOB)), 1)
+
+        chunks = []
+
+        for start in range(0, len(characters), chunk_size):
+            chunk = copy.copy(options)
+            chunk.characters = characters[start : start + chunk_size]
+            chunks.append(chunk)
+
+        bitmap_tops = []
+
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=options.jobs,
+                initializer=initialize_worker,
+                initargs=(options.font,)) as executor:
+            # Merge the chunks back in their original order
+            for (glyph_records, chunk_bitmap_tops) in executor.map(
+                    rasterize_chunk, chunks, itertools.repeat(trim)):
+                offset = 0
+
+                while offset < len(glyph_records):
+                    glyph, offset = deserialize_glyph(glyph_records, offset)
+                    self.glyphs.append(glyph)
+
+                bitmap_tops += numpy.frombuffer(chunk_bitmap_tops, numpy.int32).tolist()
+
+        return bitmap_tops
+
+
+    def calculate_max_ascent(self, bitmap_tops):
+        """Function that calculates the maximum ascent of the font"""
+        # Find the character with the highest bitmap_top (ascent)
+        return max([0] + bitmap_tops)
+
+
+    def bitmap_to_array(self, bitmap):
+        """Function that copies a FreeType bitmap into a 2D array of 8-bit pixels"""
+        if bitmap.rows == 0 or bitmap.width == 0:
+            return numpy.zeros((bitmap.rows, bitmap.width), numpy.uint8)
+
+        # Read the pixels straight from the FreeType buffer instead of a Python list
+        buffer = numpy.ctypeslib.as_array(bitmap._FT_Bitmap.buffer, (bitmap.rows, bitmap.pitch))
+
+        return buffer[:, :bitmap.width].copy()
+
+
+    def rasterize_font(self, face, options, trim=True):
+        """Function that rasterizes the font into glyphs and returns their bitmap tops"""
+        bitmap_tops = []
+
+        glyph_bpp_shift = 8 - options.bpp
 
         # Iterate over all requested characters
         for character in options.characters:
+            start_time = time.perf_counter()
+
             # Load the character from the font
-            face.load_char(character)
+            face.load_char(character, RASTERIZER_LOAD_FLAGS)
+
+            bitmap_buffer = self.bitmap_to_array(face.glyph.bitmap)
 
             # Create the glyph object
             glyph = LFCGlyph(
@@ -63,20 +431,29 @@ class LFCRasterizer:
                 face.glyph.bitmap.width,
                 face.glyph.bitmap.rows,
                 face.glyph.advance.x >> 6,
-                max_ascent - face.glyph.bitmap_top,
-                character_data_index,
-                list(map(lambda x: x // glyph_bpp_map_divisor, face.glyph.bitmap.buffer))
+                -face.glyph.bitmap_top,
+                0,
+                bitmap_buffer >> glyph_bpp_shift
             )
 
-            if any(face.glyph.bitmap.buffer):
+            rasterized_time = time.perf_counter()
+
+            # Untrimmed glyphs keep the whole bitmap, so they can be quantized to any bpp later
+            if trim and bitmap_buffer.any():
                 # Trim leading and trailing zero rows from the glyph data
                 glyph.trim_zero_axes()
 
                 # Adjust the bitmap width of the glyph to a multiple of bpp
                 glyph.adjust_bitmap_width()
 
-            # Update the character data index for the next character
-            character_data_index += math.ceil(glyph.width / pixels_per_byte) * glyph.height
+            end_time = time.perf_counter()
+
+            self.profiler.add_time('rasterize_glyphs', rasterized_time - start_time)
+            self.profiler.add_time('trim_pad', end_time - rasterized_time)
+            self.profiler.add_glyph(character, end_time - start_time)
 
             # Add the glyph to the list
             self.glyphs.append(glyph)
+            bitmap_tops.append(face.glyph.bitmap_top)
+
+        return bitmap_tops
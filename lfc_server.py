@@ -0,0 +1,192 @@
+"""Module for serving font conversions to other processes over JSON lines"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import contextlib
+import collections
+import socketserver
+import freetype
+from lfc_options import LFCOptions
+from lfc_converter import LFCConverter
+
+# Number of font faces kept open between requests by default
+SERVER_DEFAULT_FACE_CACHE_SIZE = 16
+
+class LFCFaceCache:
+    """Class for keeping the least recently used font faces open between conversions"""
+    def __init__(self, max_size):
+        self.faces = collections.OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, font, height):
+        """Function that returns an open face of a font file set to the given height"""
+        # A changed font file gets a new key, so its stale face is evicted in time
+        key = (os.path.realpath(font), os.stat(font).st_mtime_ns, height)
+
+        if key in self.faces:
+            self.hits += 1
+            self.faces.move_to_end(key)
+            return self.faces[key]
+
+        self.misses += 1
+
+        face = freetype.Face(font)
+        face.set_char_size(height << 6)
+
+        self.faces[key] = face
+
+        # Close the least recently used faces over the size limit
+        while len(self.faces) > self.max_size:
+            self.faces.popitem(last=False)
+
+        return face
+
+
+    def __str__(self):
+        return f'{len(self.faces)} open, {self.hits} hits, {self.misses} misses'
+
+
+class LFCServer:
+    """Class for serving font conversions to other processes over JSON lines"""
+    def __init__(self, face_cache_size=SERVER_DEFAULT_FACE_CACHE_SIZE):
+        self.face_cache = LFCFaceCache(face_cache_size)
+        self.request_count = 0
+
+
+    def handle(self, request):
+        """Function that runs a conversion request and returns the response"""
+        self.request_count += 1
+
+        start_time = time.perf_counter()
+
+        response = {'id': request.get('id')}
+
+        try:
+            options = LFCOptions(**request['options'])
+            face = self.face_cache.get(options.font, options.height)
+
+            converter = LFCConverter()
+
+            # The written files are listed, otherwise their content is returned
+            if request.get('write', True):
+                output_files = converter.convert(options, request.get('output', 'output'), face)
+
+                response['files'] = list(output_files or ())
+                response['skipped'] = output_files is None
+            else:
+                outputs = converter.generate(options, face)
+
+                response['outputs'] = {
+                    file_name: base64.b64encode(content).decode('ascii')
+                    if isinstance(content, bytes) else content
+                    for (file_name, content) in outputs.items()
+                }
+
+            response['ok'] = True
+            response['glyphs'] = len(converter.glyphs)
+
+        except Exception as exception: # pylint: disable=broad-exception-caught
+            response['ok'] = False
+            response['error'] = str(exception)
+
+        response['seconds'] = time.perf_counter() - start_time
+
+        return response
+
+
+    def handle_line(self, line):
+        """Function that runs a JSON encoded request and returns the JSON encoded response"""
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as exception:
+            return json.dumps({'id': None, 'ok': False, 'error': f'Invalid request: {exception}'})
+
+        if not isinstance(request, dict):
+            return json.dumps({'id': None, 'ok': False, 'error': 'Invalid request: expected a JSON object'})
+
+        # The status request reports on the server instead of converting a font
+        if request.get('status'):
+            return json.dumps({
+                'id': request.get('id'),
+                'ok': True,
+                'requests': self.request_count,
+                'faces': str(self.face_cache),
+            })
+
+        # Progress messages of the conversion would mix with the responses
+        with contextlib.redirect_stdout(sys.stderr):
+            response = self.handle(request)
+
+        return json.dumps(response)
+
+
+    def serve_stream(self, input_stream, output_stream):
+        """Function that answers one request per line until the input stream ends"""
+        for line in input_stream:
+            if not line.strip():
+                continue
+
+            output_stream.write(self.handle_line(line) + '\n')
+            output_stream.flush()
+
+
+    def serve_socket(self, socket_path):
+        """Function that answers requests of clients connecting to a Unix socket"""
+        server = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            """Class for answering the requests of a single client connection"""
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+
+                    self.wfile.write(server.handle_line(line.decode('utf-8')).encode('utf-8') + b'\n')
+
+        # Remove the socket of a previous server that did not shut down cleanly
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+        # Clients are answered one at a time, the face cache is not shared between threads
+        with socketserver.UnixStreamServer(socket_path, RequestHandler) as socket_server:
+            print(f'LFC::INFO: Listening on {socket_path}', file=sys.stderr)
+
+            try:
+                socket_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(socket_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Serve font conversions over JSON lines')
+
+    parser.add_argument(
+            '--socket',
+            type=str,
+            default=None,
+            help='The path of a Unix socket to listen on. Defaults to reading requests from stdin '
+                 'and writing responses to stdout')
+
+    parser.add_argument(
+            '--faces',
+            type=int,
+            default=SERVER_DEFAULT_FACE_CACHE_SIZE,
+            help='The number of font faces kept open between requests')
+
+    arguments = parser.parse_args()
+
+    lfc_server = LFCServer(arguments.faces)
+
+    if arguments.socket is not None:
+        lfc_server.serve_socket(arguments.socket)
+    else:
+        lfc_server.serve_stream(sys.stdin, sys.stdout)
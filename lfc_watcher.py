@@ -0,0 +1,227 @@
+"""Module for converting a font again whenever its input files change"""
+
+import os
+import copy
+import time
+import ctypes
+import hashlib
+import freetype
+from lfc_rasterizer import LFCRasterizer, RASTERIZER_LOAD_FLAGS
+from lfc_converter import LFCConverter, rasterization_options
+from lfc_publisher import LFCPublisher
+from lfc_profiler import LFCProfiler
+from lfc_corpus import corpus_files
+
+# Seconds between two checks of the watched files
+WATCHER_POLL_INTERVAL = 0.5
+
+# FreeType flags that load a glyph exactly like the rasterizer, without rendering it
+WATCHER_OUTLINE_LOAD_FLAGS = RASTERIZER_LOAD_FLAGS & ~freetype.FT_LOAD_RENDER
+
+# Smallest number of changed characters rasterized by worker processes, fewer are not worth starting them
+WATCHER_PARALLEL_CHARACTERS = 512
+
+def hash_glyph_outline(face, character):
+    """Function that hashes everything a character's rendered glyph is made from"""
+    face.load_char(character, WATCHER_OUTLINE_LOAD_FLAGS)
+
+    slot = face.glyph._FT_GlyphSlot.contents
+
+    glyph_hash = hashlib.sha256()
+    glyph_hash.update(repr((slot.format, slot.advance.x)).encode('utf-8'))
+
+    # The hinted outline at the font height decides the rendered pixels and the bitmap top
+    if slot.format == freetype.FT_GLYPH_FORMAT_OUTLINE:
+        outline = slot.outline
+        glyph_hash.update(repr((outline.n_points, outline.n_contours, outline.flags)).encode('utf-8'))
+
+        if outline.n_points > 0:
+            glyph_hash.update(ctypes.string_at(
+                    outline.points, outline.n_points * ctypes.sizeof(freetype.FT_Vector)))
+            glyph_hash.update(ctypes.string_at(outline.tags, outline.n_points))
+            glyph_hash.update(ctypes.string_at(
+                    outline.contours, outline.n_contours * ctypes.sizeof(ctypes.c_short)))
+
+    # Embedded bitmaps are used as they are
+    else:
+        bitmap = slot.bitmap
+        glyph_hash.update(repr((bitmap.width, bitmap.rows, bitmap.pitch, bitmap.pixel_mode,
+                                slot.bitmap_left, slot.bitmap_top)).encode('utf-8'))
+
+        if bitmap.rows > 0 and bitmap.pitch != 0:
+            glyph_hash.update(ctypes.string_at(bitmap.buffer, bitmap.rows * abs(bitmap.pitch)))
+
+    return glyph_hash.digest()
+
+
+class LFCWatcher:
+    """Class for converting a font again whenever its input files change"""
+    def __init__(self, poll_interval=WATCHER_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.outline_hashes = {}
+        self.rasterized_glyphs = {}
+        self.conversion_count = 0
+
+
+    def watch(self, options, output_directory_name='output'):
+        """Function that converts the font and converts it again after every change until interrupted"""
+        input_paths = [options.font]
+
+        if options.labels_path is not None:
+            input_paths.append(options.labels_path)
+
+        if options.corpus_paths is not None:
+            input_paths += options.corpus_paths
+
+        file_states = self.file_states(self.watched_paths(options))
+
+        self.regenerate(options, output_directory_name)
+
+        print(f'LFC::INFO: Watching {", ".join(input_paths)} for changes, press Ctrl+C to stop')
+
+        try:
+            while True:
+                time.sleep(self.poll_interval)
+
+                changed_file_states = self.file_states(self.watched_paths(options))
+
+                if changed_file_states == file_states:
+                    continue
+
+                # Font editors write their exports in several steps, so wait for the files to settle
+                while True:
+                    time.sleep(self.poll_interval)
+
+                    settled_file_states = self.file_states(self.watched_paths(options))
+
+                    if settled_file_states == changed_file_states:
+                        break
+
+                    changed_file_states = settled_file_states
+
+                file_states = changed_file_states
+
+                try:
+                    options.reload_inputs()
+                    self.regenerate(options, output_directory_name)
+                except Exception as exception: # pylint: disable=broad-exception-caught
+                    print(exception)
+                    print('LFC::WARNING: Keeping the previous output files until the next change')
+
+        except KeyboardInterrupt:
+            print(f'LFC::INFO: Stopped watching after {self.conversion_count} conversions')
+
+
+    def watched_paths(self, options):
+        """Function that lists the input files of the conversion, with every file of the corpus"""
+        paths = [options.font]
+
+        if options.labels_path is not None:
+            paths.append(options.labels_path)
+
+        # Corpus directories are listed again every time, so added and removed files are noticed
+        for corpus_path in options.corpus_paths or []:
+            if os.path.isdir(corpus_path):
+                paths += [path for (path, _) in corpus_files([corpus_path])]
+            else:
+                paths.append(corpus_path)
+
+        return paths
+
+
+    def file_states(self, paths):
+        """Function that returns every file with its modification time and size, None if it is missing"""
+        states = []
+
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                states.append((path, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                states.append((path, None))
+
+        return states
+
+
+    def regenerate(self, options, output_directory_name='output'):
+        """Function that rasterizes the changed glyphs of the font again and rewrites the outputs"""
+        start_time = time.perf_counter()
+
+        profiler = LFCProfiler(enabled=options.stats is not None)
+
+        (raw_options, trim) = rasterization_options(options)
+
+        rasterizer = LFCRasterizer(profiler)
+
+        with profiler.stage('face_load'):
+            face = freetype.Face(options.font)
+            face.set_char_size(options.height << 6)
+
+        with profiler.stage('select_characters'):
+            characters = rasterizer.select_characters(face, options.characters)
+
+        with profiler.stage('outline_hash'):
+            outline_hashes = {character: hash_glyph_outline(face, character) for character in characters}
+
+        changed_characters = [
+            character for character in characters
+            if outline_hashes[character] != self.outline_hashes.get(character)
+        ]
+
+        if changed_characters:
+            self.rasterize_characters(face, raw_options, changed_characters, trim, profiler)
+
+        # Characters the font no longer has are dropped
+        self.rasterized_glyphs = {character: self.rasterized_glyphs[character] for character in characters}
+        self.outline_hashes = outline_hashes
+
+        # The later stages change the glyphs in place, so every conversion starts from copies
+        for character in characters:
+            (glyph, _) = self.rasterized_glyphs[character]
+
+            glyph = copy.copy(glyph)
+            glyph.kerning = {}
+
+            rasterizer.glyphs.append(glyph)
+
+        rasterizer.arrange_glyphs(
+                face, raw_options, [bitmap_top for (_, bitmap_top) in self.rasterized_glyphs.values()])
+
+        converter = LFCConverter(profiler)
+
+        # The flash budget returns copied options with the chosen bpp and encoding
+        conversion_options = options
+
+        if options.max_bytes is not None:
+            conversion_options = converter.fit_budget(rasterizer, options)
+
+        converter.optimize(rasterizer.glyphs, conversion_options)
+
+        publisher = LFCPublisher(profiler)
+        publisher.publish(conversion_options, converter.glyphs, converter.indexing_mode,
+                          converter.indices, output_directory_name)
+
+        if options.stats is not None:
+            profiler.write_report(options.stats, conversion_options, len(converter.glyphs))
+
+        self.conversion_count += 1
+
+        print(f'LFC::INFO: Rasterized {len(changed_characters)} of {len(characters)} glyphs, '
+              f'regenerated the output files in {(time.perf_counter() - start_time) * 1000:.1f} ms')
+
+
+    def rasterize_characters(self, face, options, characters, trim, profiler):
+        """Function that rasterizes characters and replaces their glyphs and bitmap tops"""
+        options = copy.copy(options)
+        options.characters = characters
+
+        rasterizer = LFCRasterizer(profiler)
+
+        if options.jobs > 1 and len(characters) >= WATCHER_PARALLEL_CHARACTERS:
+            with profiler.stage('rasterize_parallel'):
+                bitmap_tops = rasterizer.rasterize_font_parallel(options, trim)
+        else:
+            bitmap_tops = rasterizer.rasterize_font(face, options, trim)
+
+        for (glyph, bitmap_top) in zip(rasterizer.glyphs, bitmap_tops):
+            self.rasterized_glyphs[glyph.code] = (glyph, bitmap_top)
@@ -0,0 +1,6 @@
+"""Configuration that lets the tests import the converter modules from the repository root"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
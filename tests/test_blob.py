@@ -0,0 +1,113 @@
+"""Tests that round-trip fonts through the binary font blob writer and reader"""
+
+import types
+import numpy
+import pytest
+from lfc_blob import LFCBlobReader
+from lfc_glyph import LFCGlyph, calculate_bitmap_indices
+from lfc_indexer import LFCIndexer
+from lfc_indexing_mode import IndexingMode
+from lfc_compressor import LFCCompressor
+from lfc_publisher import LFCPublisher
+
+ASCII_CODES = [0x20, 0x21, 0x41, 0x42, 0x43, 0x56, 0x61, 0x7e]
+UNICODE_CODES = [0x20, 0x41, 0x56, 0xe9, 0x3b1, 0x3b2, 0x3b3, 0x20ac, 0x1f600]
+
+# Every indexing mode with the characters it is written for and the requested indexing
+INDEXING_CASES = [
+    (IndexingMode.ASCII, ASCII_CODES, None),
+    (IndexingMode.UNICODE, UNICODE_CODES, None),
+    (IndexingMode.DENSE, UNICODE_CODES[:5], 'dense'),
+    (IndexingMode.SEGMENTED, UNICODE_CODES, 'segmented'),
+    (IndexingMode.SORTED, UNICODE_CODES, 'sorted'),
+]
+
+def font_glyphs(codes, bpp):
+    """Function that returns sparse, padded glyphs of the codes with kerning between some of them"""
+    random = numpy.random.default_rng(len(codes) * bpp)
+
+    glyphs = []
+
+    for code in codes:
+        (height, width) = (int(random.integers(1, 20)), int(random.integers(1, 20)))
+
+        data = random.integers(0, 1 << bpp, (height, width), numpy.uint8)
+        data[random.random((height, width)) < 0.5] = 0
+
+        glyph = LFCGlyph(bpp, code, width, height, width + 1, int(random.integers(0, 8)), 0, data)
+        glyph.adjust_bitmap_width()
+
+        glyphs.append(glyph)
+
+    # Kerning beyond a signed byte, as at large font heights
+    glyphs[0].kerning = {codes[1]: -3, codes[-1]: 300}
+    glyphs[-1].kerning = {codes[0]: -1000, codes[2]: 2}
+
+    return glyphs
+
+
+def written_blob(tmp_path, glyphs, bpp, indexing, compress=False):
+    """Function that indexes and writes the glyphs to a blob and returns the indexing mode and path"""
+    if compress:
+        LFCCompressor().compress(glyphs)
+
+    calculate_bitmap_indices(glyphs)
+
+    indexer = LFCIndexer()
+    indexer.index(glyphs, indexing)
+
+    options = types.SimpleNamespace(bpp=bpp, compress=compress, layout='rows')
+
+    blob_path = tmp_path / 'font.bin'
+    blob_path.write_bytes(
+        LFCPublisher().generate_binary_file(options, glyphs, indexer.indexing_mode, indexer.indices))
+
+    return indexer.indexing_mode, blob_path
+
+
+@pytest.mark.parametrize('compress', [False, True])
+@pytest.mark.parametrize('bpp', [1, 4, 8])
+@pytest.mark.parametrize('indexing_mode, codes, indexing', INDEXING_CASES)
+def test_blob_round_trip(tmp_path, indexing_mode, codes, indexing, bpp, compress):
+    glyphs = font_glyphs(codes, bpp)
+
+    (written_indexing_mode, blob_path) = written_blob(tmp_path, glyphs, bpp, indexing, compress)
+
+    assert written_indexing_mode == indexing_mode
+
+    with LFCBlobReader(blob_path) as reader:
+        reader.validate()
+
+        assert reader.indexing_mode == indexing_mode
+        assert reader.codes() == codes
+
+        for glyph in glyphs:
+            decoded = reader.glyph(glyph.code)
+
+            assert (decoded.width, decoded.height, decoded.advance, decoded.y_offset) == \
+                   (glyph.width, glyph.height, glyph.advance, glyph.y_offset)
+            assert decoded.data.tolist() == glyph.data.tolist()
+
+        assert reader.kerning(codes[0], codes[1]) == -3
+        assert reader.kerning(codes[0], codes[-1]) == 300
+        assert reader.kerning(codes[-1], codes[0]) == -1000
+        assert reader.kerning(codes[1], codes[0]) == 0
+
+
+@pytest.mark.parametrize('indexing_mode, codes, indexing', INDEXING_CASES)
+def test_missing_characters_are_not_found(tmp_path, indexing_mode, codes, indexing):
+    (_, blob_path) = written_blob(tmp_path, font_glyphs(codes, 4), 4, indexing)
+
+    with LFCBlobReader(blob_path) as reader:
+        for code in [0x1f, 0x22, 0x44, 0x7f, 0x3b4, 0x10ffff]:
+            if code not in codes:
+                assert reader.glyph_index(code) == 0
+                assert reader.glyph(code) is None
+
+
+def test_truncated_blob_is_rejected(tmp_path):
+    (_, blob_path) = written_blob(tmp_path, font_glyphs(UNICODE_CODES, 4), 4, 'segmented')
+    blob_path.write_bytes(blob_path.read_bytes()[:-8])
+
+    with pytest.raises(ValueError, match='truncated'):
+        LFCBlobReader(blob_path)
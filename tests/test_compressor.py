@@ -0,0 +1,93 @@
+"""Tests that round-trip compressed glyph bitmaps through the reference decoder"""
+
+import numpy
+import pytest
+from lfc_glyph import LFCGlyph
+from lfc_compressor import LFCCompressor, compress_pixels, decompress_bitmap, COMPRESSION_LITERAL, \
+                           COMPRESSION_MAX_TOKEN_PIXELS
+
+BPPS = [1, 2, 4, 8]
+
+def round_trip(pixels, bpp):
+    """Function that compresses pixels and decodes them again"""
+    pixels = numpy.asarray(pixels, numpy.uint8)
+
+    return decompress_bitmap(compress_pixels(pixels, bpp), bpp, pixels.size)
+
+
+def literal_pixels(pixel_count, bpp):
+    """Function that returns pixels without runs, so they are all stored as literals"""
+    full_intensity = (1 << bpp) - 1
+
+    # Neighbouring pixels always differ, at 1 bpp this alternates between zero and full intensity
+    return [pixel % full_intensity + 1 if bpp > 1 else pixel % 2 for pixel in range(pixel_count)]
+
+
+@pytest.mark.parametrize('bpp', BPPS)
+def test_all_zero_glyph(bpp):
+    pixels = numpy.zeros((12, 16), numpy.uint8)
+
+    assert round_trip(pixels, bpp) == pixels.ravel().tolist()
+
+
+@pytest.mark.parametrize('bpp', BPPS)
+def test_all_full_glyph(bpp):
+    pixels = numpy.full((12, 16), (1 << bpp) - 1, numpy.uint8)
+
+    assert round_trip(pixels, bpp) == pixels.ravel().tolist()
+
+
+@pytest.mark.parametrize('bpp', BPPS)
+def test_literal_run_longer_than_a_token(bpp):
+    pixels = literal_pixels(3 * COMPRESSION_MAX_TOKEN_PIXELS + 5, bpp)
+    compressed_bitmap = compress_pixels(numpy.asarray(pixels, numpy.uint8), bpp)
+
+    # The run is split into full literal tokens and a shorter one
+    assert compressed_bitmap[0] == (COMPRESSION_LITERAL << 6) | (COMPRESSION_MAX_TOKEN_PIXELS - 1)
+    assert decompress_bitmap(compressed_bitmap, bpp, len(pixels)) == pixels
+
+
+@pytest.mark.parametrize('bpp', [1, 2, 4])
+@pytest.mark.parametrize('pixel_count', [1, 3, 5, 7, 13])
+def test_literal_with_trailing_partial_byte(bpp, pixel_count):
+    pixels = literal_pixels(pixel_count, bpp)
+
+    assert pixel_count * bpp % 8 != 0
+    assert round_trip(pixels, bpp) == pixels
+
+
+@pytest.mark.parametrize('bpp', BPPS)
+def test_literals_between_runs(bpp):
+    full_intensity = (1 << bpp) - 1
+
+    # Zero and full runs, repeated values and literals ending in a partial byte in one glyph
+    pixels = [0] * 70 + literal_pixels(11, bpp) + [full_intensity] * 130 + [1] * 40 + literal_pixels(3, bpp)
+
+    assert round_trip(pixels, bpp) == pixels
+
+
+@pytest.mark.parametrize('bpp', BPPS)
+def test_compressor_round_trips_every_glyph(bpp):
+    random = numpy.random.default_rng(bpp)
+
+    glyphs = []
+
+    for (code, (height, width)) in enumerate([(0, 0), (9, 8), (16, 16), (24, 32), (40, 24)], 32):
+        # Sparse glyphs with runs of zero and full intensity like rasterized outlines
+        data = random.integers(0, 1 << bpp, (height, width), numpy.uint8)
+        data[random.random((height, width)) < 0.5] = 0
+        data[random.random((height, width)) < 0.2] = (1 << bpp) - 1
+
+        glyphs.append(LFCGlyph(bpp, code, width, height, width, 0, 0, data))
+
+    glyphs.append(LFCGlyph(bpp, 127, 16, 12, 16, 0, 0, numpy.zeros((12, 16), numpy.uint8)))
+
+    LFCCompressor().compress(glyphs)
+
+    assert any(glyph.compressed_bitmap is not None for glyph in glyphs)
+
+    for glyph in glyphs:
+        if glyph.compressed_bitmap is not None:
+            decoded = decompress_bitmap(glyph.compressed_bitmap, bpp, glyph.data.size)
+
+            assert decoded == glyph.data.ravel().tolist()
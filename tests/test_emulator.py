@@ -0,0 +1,179 @@
+"""Tests that count the memory reads and steps of emulated glyph lookups"""
+
+import types
+import numpy
+import pytest
+from lfc_glyph import LFCGlyph, calculate_bitmap_indices
+from lfc_indexer import LFCIndexer
+from lfc_compressor import LFCCompressor
+from lfc_emulator import LFCEmulator
+
+CODES = [0x20, 0x41, 0x42, 0x43, 0x44, 0xe9]
+
+# Every glyph is 8x4 pixels at 4 bpp, 16 bitmap bytes
+GLYPH_BITMAP_SIZE = 16
+GLYPH_PIXEL_COUNT = 32
+
+# A fixed metadata record: width, height, advance and y_offset of 2 bytes and a 4 byte bitmap_index
+METADATA_RECORD_SIZE = 12
+
+def emulator_options(**values):
+    """Function that returns the options the emulator reads, without any encoding options"""
+    options = {
+        'atlas': None,
+        'compress': False,
+        'compact_metadata': False,
+        'kerning': False,
+        'layout': 'rows',
+        'shards': None,
+        'declared_characters': [range(0x20, 0x100)],
+    }
+    options.update(values)
+
+    return types.SimpleNamespace(**options)
+
+
+def emulator_for(indexing, codes=None, glyph_kerning=None, **values):
+    """Function that indexes glyphs of the codes and returns an emulator of their font"""
+    random = numpy.random.default_rng(0)
+
+    glyphs = [
+        LFCGlyph(4, code, 8, 4, 9, 0, 0, random.integers(0, 16, (4, 8), numpy.uint8))
+        for code in codes or CODES
+    ]
+
+    for glyph in glyphs:
+        glyph.kerning = (glyph_kerning or {}).get(glyph.code, {})
+
+    if values.get('compress'):
+        LFCCompressor().compress(glyphs)
+
+    calculate_bitmap_indices(glyphs)
+
+    indexer = LFCIndexer()
+    indexer.index(glyphs, indexing)
+
+    return LFCEmulator(emulator_options(**values), glyphs, indexer.indexing_mode, indexer.indices)
+
+
+def glyph_cost(lookup_reads, lookup_bytes, lookup_steps, text_bytes=1):
+    """Function that returns the counts of drawing a packed glyph after its lookup"""
+    return {
+        'text_reads': text_bytes,
+        'text_bytes': text_bytes,
+        'decode_steps': text_bytes,
+        'lookup_reads': lookup_reads,
+        'lookup_bytes': lookup_bytes,
+        'lookup_steps': lookup_steps,
+        'metadata_reads': 1,
+        'metadata_bytes': METADATA_RECORD_SIZE,
+        'bitmap_reads': GLYPH_BITMAP_SIZE,
+        'bitmap_bytes': GLYPH_BITMAP_SIZE,
+        'unpack_steps': GLYPH_PIXEL_COUNT,
+    }
+
+
+@pytest.mark.parametrize('indexing, expected', [
+    # A single byte entry of the dense table
+    ('dense', glyph_cost(1, 1, 1)),
+    # Three probes of the 4 byte codes: 0x43, 0x41 and 0x42
+    ('sorted', glyph_cost(3, 12, 3)),
+    # Two probes of the 8 byte segments starting at 0x41 and 0xe9, and the found segment again
+    ('segmented', glyph_cost(3, 24, 3)),
+])
+def test_counts_of_a_glyph(indexing, expected):
+    emulator = emulator_for(indexing)
+    emulator.emulate(['B'])
+
+    assert dict(emulator.counts) == expected
+    assert emulator.glyph_count == 1
+    assert emulator.reads() == sum(value for (key, value) in expected.items() if key.endswith('_reads'))
+    assert emulator.bytes_read() == sum(value for (key, value) in expected.items() if key.endswith('_bytes'))
+
+
+def test_utf8_characters_read_every_byte():
+    emulator = emulator_for('dense')
+    emulator.emulate(['é'])
+
+    assert emulator.counts['text_reads'] == 2
+    assert emulator.counts['decode_steps'] == 2
+
+
+def test_counts_are_multiplied_by_the_occurrences():
+    emulator = emulator_for('sorted')
+    emulator.emulate(['BAB', 'B\n'])
+
+    single_emulator = emulator_for('sorted')
+    single_emulator.emulate(['A'])
+
+    # Three Bs and an A, line breaks are never drawn
+    assert emulator.glyph_count == 4
+    assert emulator.counts['metadata_reads'] == 4
+    assert emulator.counts['lookup_reads'] == 3 * 3 + single_emulator.counts['lookup_reads']
+    assert emulator.per_glyph('bitmap_bytes') == GLYPH_BITMAP_SIZE
+
+
+def test_missing_characters_pay_for_their_lookup():
+    emulator = emulator_for('sorted')
+    emulator.emulate(['Z'])
+
+    assert emulator.glyph_count == 0
+    assert emulator.missing_count == 1
+    assert emulator.counts['lookup_reads'] == 3
+    assert emulator.counts['metadata_reads'] == 0
+    assert emulator.counts['bitmap_reads'] == 0
+
+
+def test_unicode_strings_hold_glyph_indices():
+    emulator = emulator_for(None, [0x41, 0x42, 0x3b1])
+    emulator.emulate(['α'])
+
+    assert emulator.counts['text_reads'] == 1
+    assert emulator.counts['decode_steps'] == 0
+    assert emulator.counts['lookup_reads'] == 1
+
+
+def test_compressed_glyphs_read_their_token_stream():
+    emulator = emulator_for('dense', compress=True)
+    emulator.emulate(['B'])
+
+    glyph = emulator.glyphs[CODES.index(0x42)]
+    bitmap_size = glyph.bitmap_size()
+
+    assert emulator.counts['bitmap_reads'] == bitmap_size
+    assert emulator.counts['bitmap_bytes'] == bitmap_size
+
+
+def test_compact_metadata_reads_a_smaller_record():
+    emulator = emulator_for('dense', compact_metadata=True)
+    emulator.emulate(['B'])
+
+    assert emulator.counts['metadata_bytes'] == emulator.metadata_record_size < METADATA_RECORD_SIZE
+
+
+def test_shards_are_searched_from_the_last_one():
+    emulator = emulator_for('dense', shards=4)
+
+    # The declared characters 0x20-0xff make blocks of 56 code points, 0x20-0x57 holds all but 0xe9
+    assert emulator.shard_offsets == [0] + [5 * GLYPH_BITMAP_SIZE] * 3
+
+    emulator.emulate([' '])
+
+    # Every shard offset is read, the last three start after the bitmap of the space
+    assert emulator.counts['shards_reads'] == 4
+    assert emulator.counts['shards_bytes'] == 16
+    assert emulator.counts['unpack_steps'] == GLYPH_PIXEL_COUNT + 4
+
+
+def test_kerning_pairs_are_searched_between_drawn_neighbours():
+    glyph_kerning = {0x41: {0x42: -1, 0x43: -2}, 0x42: {0x41: 1}}
+    emulator = emulator_for('dense', glyph_kerning=glyph_kerning, kerning=True)
+
+    assert emulator.kerning_pairs == [(2, 3, -1), (2, 4, -2), (3, 2, 1)]
+
+    emulator.emulate(['AB', 'A'])
+
+    # The pair (2, 3) is found after probing (2, 4) in the middle of the pairs, single glyphs have no pair
+    assert emulator.counts['kerning_steps'] == 2
+    assert emulator.counts['kerning_reads'] == 2
+    assert emulator.counts['kerning_bytes'] == 2 * 6
@@ -0,0 +1,121 @@
+"""Tests that compare the glyph trimming against the list based trimming of previous versions"""
+
+import numpy
+import pytest
+from lfc_glyph import LFCGlyph
+
+def legacy_trim_zero_axes(data, width, height):
+    """Function that trims a flat pixel list like previous versions and returns it with its size"""
+    data = list(data)
+
+    # Leading zero rows
+    zero_row_count = 0
+
+    for row in range(0, len(data), width):
+        if not any(data[row : row + width]):
+            zero_row_count += 1
+        else:
+            break
+
+    data = data[zero_row_count * width:]
+    height -= zero_row_count
+
+    # Trailing zero rows
+    zero_row_count = 0
+
+    for row in range(len(data) - 1, width, -width):
+        if not any(data[row - width : row]):
+            zero_row_count += 1
+        else:
+            break
+
+    data = data[:len(data) - zero_row_count * width]
+    height -= zero_row_count
+
+    # Leading and trailing zero columns, popped one pixel at a time
+    for trailing in [0, 1]:
+        columns = range(width - 1, -1, -1) if trailing else range(width)
+        zero_column_count = 0
+
+        for column in columns:
+            if all(data[row * width + column] == 0 for row in range(height)):
+                zero_column_count += 1
+            else:
+                break
+
+        for _ in range(zero_column_count):
+            width -= 1
+
+            for row in range(height):
+                data.pop(row * (width - zero_column_count + 1) + width * trailing)
+
+    return data, width, height
+
+
+def sparse_glyph_pixels(random, height, width, leading_zero_columns, trailing_zero_columns):
+    """Function that returns sparse pixels with runs of zero columns on both sides"""
+    pixels = random.integers(0, 16, (height, width), numpy.uint8)
+    pixels[random.random((height, width)) < 0.6] = 0
+
+    pixels[:, :leading_zero_columns] = 0
+    pixels[:, width - trailing_zero_columns:] = 0
+
+    # Keep the columns next to the runs inked, so the runs have exactly the given widths
+    pixels[0, leading_zero_columns] = 15
+    pixels[-1, width - trailing_zero_columns - 1] = 15
+
+    return pixels
+
+
+def trimmed_glyph(pixels):
+    """Function that returns a 4 bpp glyph of the pixels with its zero axes trimmed"""
+    (height, width) = pixels.shape
+
+    glyph = LFCGlyph(4, 65, width, height, width, 0, 0, pixels)
+    glyph.trim_zero_axes()
+
+    return glyph
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_trimming_matches_previous_versions(seed):
+    random = numpy.random.default_rng(seed)
+
+    height = int(random.integers(2, 40))
+    width = int(random.integers(8, 64))
+    leading_zero_columns = int(random.integers(0, width // 4))
+    trailing_zero_columns = int(random.integers(2, width // 4 + 2))
+
+    pixels = sparse_glyph_pixels(random, height, width, leading_zero_columns, trailing_zero_columns)
+
+    (data, legacy_width, legacy_height) = legacy_trim_zero_axes(pixels.ravel().tolist(), width, height)
+    glyph = trimmed_glyph(pixels)
+
+    assert (glyph.width, glyph.height) == (legacy_width, legacy_height)
+    assert glyph.data.ravel().tolist() == data
+
+
+@pytest.mark.parametrize('zero_columns', [(2, 0), (0, 2), (3, 5), (7, 2)])
+def test_multi_column_runs_match_previous_versions(zero_columns):
+    random = numpy.random.default_rng(sum(zero_columns))
+    pixels = sparse_glyph_pixels(random, 24, 32, *zero_columns)
+
+    (data, width, height) = legacy_trim_zero_axes(pixels.ravel().tolist(), 32, 24)
+    glyph = trimmed_glyph(pixels)
+
+    assert (glyph.width, glyph.height) == (width, height)
+    assert glyph.data.ravel().tolist() == data
+
+
+def test_runs_previous_versions_failed_on_are_cropped():
+    pixels = numpy.zeros((6, 8), numpy.uint8)
+    pixels[:, 6:] = 9
+
+    # Previous versions popped past the end of this glyph's six leading zero columns
+    with pytest.raises(IndexError):
+        legacy_trim_zero_axes(pixels.ravel().tolist(), 8, 6)
+
+    glyph = trimmed_glyph(pixels)
+
+    assert glyph.width == 2
+    assert glyph.data.tolist() == pixels[:, 6:].tolist()
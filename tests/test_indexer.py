@@ -0,0 +1,86 @@
+"""Tests that look glyphs up in the segmented and sorted lookup tables"""
+
+import bisect
+import pytest
+from lfc_glyph import LFCGlyph
+from lfc_indexer import LFCIndexer
+from lfc_indexing_mode import IndexingMode
+
+CODES = [0x20, 0x21, 0x22, 0x41, 0x42, 0xe9, 0x3b1, 0x3b2, 0x3b3, 0x3b4, 0x20ac, 0x1f600]
+
+def glyphs_of(codes):
+    """Function that returns a single pixel glyph per code"""
+    return [LFCGlyph(1, code, 1, 1, 1, 0, 0, [1]) for code in codes]
+
+
+def segmented_lookup(segments, code):
+    """Function that looks a code up in the segments like Lumina, returning 0 for a missing glyph"""
+    position = bisect.bisect_right(segments, code, key=lambda segment: segment[0]) - 1
+
+    if position < 0:
+        return 0
+
+    (first_code, count, first_index) = segments[position]
+
+    return first_index + code - first_code if code < first_code + count else 0
+
+
+def sorted_lookup(codes, code):
+    """Function that binary searches a code in the sorted codes, returning 0 for a missing glyph"""
+    position = bisect.bisect_left(codes, code)
+
+    return position + 1 if position < len(codes) and codes[position] == code else 0
+
+
+def indexed(codes, indexing):
+    """Function that indexes glyphs of the codes with an indexing mode"""
+    indexer = LFCIndexer()
+    indexer.index(glyphs_of(codes), indexing)
+
+    return indexer
+
+
+@pytest.mark.parametrize('indexing, lookup', [('segmented', segmented_lookup), ('sorted', sorted_lookup)])
+def test_every_glyph_is_found(indexing, lookup):
+    indexer = indexed(CODES, indexing)
+
+    for (index, code) in enumerate(CODES, 1):
+        assert lookup(indexer.indices, code) == index
+
+
+@pytest.mark.parametrize('indexing, lookup', [('segmented', segmented_lookup), ('sorted', sorted_lookup)])
+def test_missing_codes_are_not_found(indexing, lookup):
+    indexer = indexed(CODES, indexing)
+
+    for code in [0, 0x1f, 0x23, 0x40, 0x43, 0xe8, 0x3b5, 0x20ab, 0x1f601, 0x10ffff]:
+        assert lookup(indexer.indices, code) == 0
+
+
+def test_segments_of_consecutive_codes():
+    indexer = indexed(CODES, 'segmented')
+
+    assert indexer.indexing_mode == IndexingMode.SEGMENTED
+    assert indexer.indices == [
+        (0x20, 3, 1), (0x41, 2, 4), (0xe9, 1, 6), (0x3b1, 4, 7), (0x20ac, 1, 11), (0x1f600, 1, 12)]
+    assert indexer.table_size() == 6 * 8
+
+
+def test_segments_of_unordered_codes_are_sorted():
+    codes = [0x3b1, 0x3b2, 0x41, 0x42, 0x43, 0x20]
+    indexer = indexed(codes, 'segmented')
+
+    assert [segment[0] for segment in indexer.indices] == [0x20, 0x41, 0x3b1]
+
+    for (index, code) in enumerate(codes, 1):
+        assert segmented_lookup(indexer.indices, code) == index
+
+
+def test_sorted_indexing_requires_ascending_codes():
+    with pytest.raises(ValueError, match='ascending order'):
+        indexed([0x41, 0x20], 'sorted')
+
+
+@pytest.mark.parametrize('indexing', ['segmented', 'sorted'])
+def test_duplicate_characters_are_rejected(indexing):
+    with pytest.raises(ValueError, match='Duplicate character: 0x41'):
+        indexed([0x40, 0x41, 0x41, 0x42], indexing)
@@ -0,0 +1,84 @@
+"""Tests that decode compact glyph metadata with the reference decoder"""
+
+import numpy
+import pytest
+from lfc_glyph import LFCGlyph
+from lfc_metadata import LFCMetadataPacker, metadata_fields, metadata_records, unpack_metadata_record, \
+                         fixed_record_size
+
+def metadata_glyphs(glyph_count, seed):
+    """Function that returns glyphs with varied metadata, negative offsets and compressed bitmaps"""
+    random = numpy.random.default_rng(seed)
+
+    glyphs = []
+    bitmap_index = 0
+
+    for code in range(32, 32 + glyph_count):
+        (height, width) = (int(random.integers(0, 40)), int(random.integers(0, 40)))
+
+        glyph = LFCGlyph(4, code, width, height, width + int(random.integers(-2, 3)),
+                         int(random.integers(-6, 30)), bitmap_index, numpy.zeros((height, width)))
+
+        glyph.atlas_x = int(random.integers(0, 1000))
+        glyph.atlas_y = int(random.integers(0, 64))
+        glyph.atlas_page = int(random.integers(0, 3))
+
+        if random.random() < 0.3:
+            glyph.compressed_bitmap = b'\x00'
+
+        glyphs.append(glyph)
+        bitmap_index += width * height // 2
+
+    return glyphs
+
+
+def decoded_records(glyphs, compression, atlas):
+    """Function that packs the metadata of the glyphs and decodes every record again"""
+    packer = LFCMetadataPacker()
+    data = packer.pack(glyphs, compression, atlas)
+
+    assert len(data) == packer.record_size * (len(glyphs) + 1)
+
+    return [
+        unpack_metadata_record(data, index, packer.layout, packer.record_size)
+        for index in range(len(glyphs) + 1)
+    ], packer
+
+
+@pytest.mark.parametrize('atlas', [False, True])
+@pytest.mark.parametrize('compression', [False, True])
+@pytest.mark.parametrize('seed', range(5))
+def test_every_record_decodes_to_its_fields(seed, compression, atlas):
+    glyphs = metadata_glyphs(95, seed)
+
+    (records, _) = decoded_records(glyphs, compression, atlas)
+
+    assert records == metadata_records(glyphs, metadata_fields(compression, atlas))
+
+
+def test_reserved_record_holds_the_widest_glyph():
+    glyphs = metadata_glyphs(20, 7)
+
+    (records, _) = decoded_records(glyphs, False, False)
+
+    assert records[0] == {
+        'width': 0, 'height': 0, 'advance': max(glyph.width for glyph in glyphs), 'y_offset': 0,
+        'bitmap_index': 0}
+
+
+def test_fields_with_a_single_value_take_no_bits():
+    glyphs = [LFCGlyph(1, code, 8, 12, 8, 0, 0, numpy.zeros((12, 8))) for code in range(32, 40)]
+
+    (records, packer) = decoded_records(glyphs, False, False)
+
+    assert packer.layout['y_offset'][1] == 0
+    assert records == metadata_records(glyphs, metadata_fields())
+
+
+def test_compact_records_are_smaller_than_fixed_records():
+    glyphs = metadata_glyphs(95, 0)
+
+    (_, packer) = decoded_records(glyphs, True, False)
+
+    assert packer.fixed_size == fixed_record_size(metadata_fields(True)) * 96
+    assert packer.compact_size < packer.fixed_size
@@ -0,0 +1,30 @@
+"""Tests that the conversion server answers malformed requests and keeps running"""
+
+import io
+import json
+import pytest
+from lfc_server import LFCServer
+
+@pytest.mark.parametrize('line', ['[1]', '"x"', '3', 'null', 'true'])
+def test_request_that_is_not_an_object(line):
+    response = json.loads(LFCServer().handle_line(line))
+
+    assert response == {'id': None, 'ok': False, 'error': 'Invalid request: expected a JSON object'}
+
+
+def test_invalid_json_request():
+    response = json.loads(LFCServer().handle_line('{"status": '))
+
+    assert response['ok'] is False
+    assert response['error'].startswith('Invalid request: ')
+
+
+def test_server_keeps_answering_after_invalid_requests():
+    output_stream = io.StringIO()
+
+    LFCServer().serve_stream(io.StringIO('[1]\n{oops\n{"id": 7, "status": true}\n'), output_stream)
+
+    responses = [json.loads(line) for line in output_stream.getvalue().splitlines()]
+
+    assert [response['ok'] for response in responses] == [False, False, True]
+    assert responses[2]['id'] == 7